@@ -1,135 +1,188 @@
-import sys
-import requests
-import nltk
+"""Analyze Wikipedia categories from the command line.
+
+    python analyze_wiki_category.py 'Large language models' [subcategory_depth]
+    python analyze_wiki_category.py --batch categories.txt --depth 1 > results.jsonl
+    cat categories.txt | python analyze_wiki_category.py --batch - --output results.jsonl
+
+Batch mode reads one category per line (blank lines and lines starting with
+'#' are skipped) and writes one JSON object per category. All categories
+share one HTTP session, one analyzer setup and the page store, so a page
+that belongs to several categories is downloaded and tokenized once. Results
+go through the same cache as the web app.
+"""
+import argparse
 import json
 import os
-from datetime import datetime, timedelta
-from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+from cache_manager import CacheManager
+from category_analysis import analyze_category, category_cache_key
+from config import Config
+from page_store import PageStore
+from text_analyzer import prepare_analyzer, select_top_words
+from wiki_api import get_client, normalize_category
+from word_index import WordIndex
+
+
+def read_categories(lines: Iterator[str]) -> Iterator[str]:
+    """Yield normalized category names, skipping blanks, comments and repeats."""
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        category = normalize_category(line)
+        if category and category not in seen:
+            seen.add(category)
+            yield category
+
+
+class CategoryAnalyzer:
+    def __init__(self, cache_manager: CacheManager, page_store: PageStore,
+                 analyzer: Optional[str] = None):
+        """Analyze categories through the shared cache and page store.
+
+        Args:
+            cache_manager (CacheManager): Cache for finished analyses
+            page_store (PageStore): Per-page word counts shared between categories
+            analyzer (str, optional): Analyzer name, Config.TEXT_ANALYZER by default
+        """
+        self.cache_manager = cache_manager
+        self.page_store = page_store
+        self.analyzer = analyzer
+        # Check the analyzer's resources once for the whole run
+        prepare_analyzer(analyzer)
+
+    def analyze(self, category: str, depth: int = 0, top_k: int = 50,
+                refresh: bool = False) -> Dict[str, Any]:
+        """Analyze one category, serving it from the cache when possible.
 
-def download_nltk_data():
+        Args:
+            category (str): Normalized category name
+            depth (int): Subcategory depth
+            top_k (int): Number of ranked words in the result
+            refresh (bool): Ignore a cached analysis
+
+        Returns:
+            dict: JSON-serializable result with 'top_words', or 'error'
+        """
+        started = time.perf_counter()
+        cache_key = category_cache_key(category, depth, self.analyzer)
+        result: Dict[str, Any] = {'category': category, 'depth': depth}
+
+        top_words = None if refresh else self.cache_manager.get_top(cache_key, top_k)
+        if top_words is not None:
+            result.update(cached=True, top_words=top_words)
+        else:
+            analysis = analyze_category(category, depth, cache_key, self.page_store,
+                                        analyzer=self.analyzer)
+            if analysis is None:
+                result['error'] = 'No pages found in category'
+            else:
+                frequencies = analysis['frequencies']
+                self.cache_manager.set(cache_key, frequencies)
+                result.update(cached=False, top_words=select_top_words(frequencies, top_k),
+                              vocabulary_size=len(frequencies),
+                              total_words=sum(frequencies.values()),
+                              pages=len(analysis['processed_pages']),
+                              fetched_pages=analysis['fetched_pages'])
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+
+def run_batch(analyzer: CategoryAnalyzer, categories: Iterator[str], output: TextIO,
+              depth: int = 0, top_k: int = 50, refresh: bool = False) -> Dict[str, int]:
+    """Analyze categories one after another, writing a JSON line for each.
+
+    A failing category is reported in its line and does not stop the run.
+
+    Returns:
+        dict: Number of categories analyzed, served from the cache and failed
+    """
+    summary = {'analyzed': 0, 'cached': 0, 'failed': 0}
+    for category in categories:
+        try:
+            result = analyzer.analyze(category, depth, top_k, refresh)
+        except Exception as e:
+            result = {'category': category, 'depth': depth, 'error': str(e)}
+        if 'error' in result:
+            summary['failed'] += 1
+        elif result['cached']:
+            summary['cached'] += 1
+        else:
+            summary['analyzed'] += 1
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+        print(f"{category}: {result.get('error') or 'ok'}", file=sys.stderr)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze word frequencies of Wikipedia categories.')
+    parser.add_argument('category', nargs='?', help='Category to analyze')
+    parser.add_argument('subcategory_depth', nargs='?', type=int, help='Subcategory depth')
+    parser.add_argument('--batch', metavar='FILE', help="File with one category per line, '-' for stdin")
+    parser.add_argument('--output', default='-', help="JSON Lines output for --batch, '-' for stdout")
+    parser.add_argument('--depth', type=int, default=0, help='Subcategory depth')
+    parser.add_argument('--top-k', type=int, default=50, help='Ranked words per category')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached analyses')
+    parser.add_argument('--cache-dir', default=Config.CACHE_DIR, help='Cache directory')
+    parser.add_argument('--offline', action='store_true',
+                        help='Answer API requests from the API cache only, like WIKI_OFFLINE')
+    args = parser.parse_args(argv)
+    if (args.category is None) == (args.batch is None):
+        parser.error('give either a category or --batch')
+    if args.offline:
+        get_client().offline = True
+    depth = min(args.subcategory_depth if args.subcategory_depth is not None else args.depth,
+                Config.CATEGORY_MAX_DEPTH)
+
+    cache_manager = CacheManager(cache_dir=args.cache_dir, expiration_hours=Config.CACHE_EXPIRATION_HOURS,
+                                 memory_max_entries=0, cache_format=Config.CACHE_FORMAT,
+                                 compression=Config.CACHE_COMPRESSION, max_bytes=Config.CACHE_MAX_BYTES,
+                                 max_stale_hours=Config.CACHE_MAX_STALE_HOURS)
+    # Stores live next to the cache unless configured explicitly
+    in_cache_dir = os.path.abspath(args.cache_dir) != os.path.abspath(Config.CACHE_DIR)
+    page_store = PageStore(os.path.join(args.cache_dir, 'pages.sqlite3') if in_cache_dir
+                           else Config.PAGE_STORE_PATH)
+    word_index = WordIndex(os.path.join(args.cache_dir, 'index.sqlite3') if in_cache_dir
+                           else Config.WORD_INDEX_PATH)
+    cache_manager.add_listener(word_index.add)
+    cache_manager.add_delete_listener(word_index.remove)
     try:
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('punkt')
-        nltk.download('stopwords')
-
-def get_cache_path(category):
-    # Create cache directory if it doesn't exist
-    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
-    os.makedirs(cache_dir, exist_ok=True)
-    return os.path.join(cache_dir, f"{category.replace(' ', '_')}.json")
-
-def load_cache(category):
-    cache_path = get_cache_path(category)
-    if not os.path.exists(cache_path):
-        return None
-        
-    with open(cache_path, 'r', encoding='utf-8') as f:
-        cache_data = json.load(f)
-        
-    # Check if cache is older than 24 hours
-    cache_time = datetime.fromisoformat(cache_data['timestamp'])
-    if datetime.now() - cache_time > timedelta(hours=24):
-        return None
-        
-    return cache_data['frequencies']
-
-def save_cache(category, frequencies):
-    cache_path = get_cache_path(category)
-    cache_data = {
-        'timestamp': datetime.now().isoformat(),
-        'frequencies': frequencies
-    }
-    
-    with open(cache_path, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=2)
-
-def get_category_members(category):
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
-    
-    PARAMS = {
-        "action": "query",
-        "list": "categorymembers",
-        "cmtitle": f"Category:{category}",
-        "cmlimit": "500",
-        "format": "json"
-    }
-    
-    response = S.get(url=URL, params=PARAMS)
-    data = response.json()
-    return [page['title'] for page in data['query']['categorymembers'] if page['ns'] == 0]
-
-def get_page_content(title):
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
-    
-    PARAMS = {
-        "action": "query",
-        "prop": "extracts",
-        "exlimit": "1",
-        "titles": title,
-        "explaintext": "1",
-        "format": "json"
-    }
-    
-    response = S.get(url=URL, params=PARAMS)
-    data = response.json()
-    page = next(iter(data['query']['pages'].values()))
-    return page.get('extract', '')
-
-def analyze_text(text):
-    # Tokenize and convert to lowercase
-    tokens = word_tokenize(text.lower())
-    
-    # Remove stopwords and non-alphabetic tokens
-    stop_words = set(stopwords.words('english'))
-    words = [word for word in tokens if word.isalpha() and word not in stop_words]
-    
-    # Count frequencies
-    return Counter(words)
-
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_wiki_category.py 'category_name'")
-        sys.exit(1)
-    
-    category = sys.argv[1]
-    print(f"Analyzing category: {category}")
-    
-    # Check cache first
-    cached_frequencies = load_cache(category)
-    if cached_frequencies is not None:
-        print("Using cached results...")
-        total_frequencies = Counter(cached_frequencies)
-    else:
-        print("Cache not found or expired. Fetching fresh data...")
-        # Download required NLTK data
-        download_nltk_data()
-        
-        # Get all pages in the category
-        pages = get_category_members(category)
-        print(f"Found {len(pages)} pages in category")
-        
-        # Analyze each page
-        total_frequencies = Counter()
-        
-        for page_title in pages:
-            print(f"Processing: {page_title}")
-            content = get_page_content(page_title)
-            frequencies = analyze_text(content)
-            total_frequencies.update(frequencies)
-        
-        # Save results to cache
-        save_cache(category, total_frequencies)
-    
-    # Print top 50 most common words
-    print("\nMost common words and their frequencies:")
-    for word, count in total_frequencies.most_common(50):
-        print(f"{word}: {count}")
+        analyzer = CategoryAnalyzer(cache_manager, page_store)
+        if args.batch is None:
+            category = normalize_category(args.category)
+            print(f"Analyzing category: {category}")
+            result = analyzer.analyze(category, depth, args.top_k, args.refresh)
+            if 'error' in result:
+                print(result['error'])
+                sys.exit(1)
+            print("Using cached results..." if result['cached'] else
+                  f"Analyzed {result['pages']} pages ({result['fetched_pages']} downloaded)")
+            print("\nMost common words and their frequencies:")
+            for word, count in result['top_words']:
+                print(f"{word}: {count}")
+            return
+
+        source = sys.stdin if args.batch == '-' else open(args.batch, 'r', encoding='utf-8')
+        output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            summary = run_batch(analyzer, read_categories(source), output, depth, args.top_k,
+                                args.refresh)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+        print(f"Done: {summary['analyzed']} analyzed, {summary['cached']} cached, "
+              f"{summary['failed']} failed", file=sys.stderr)
+    finally:
+        word_index.close()
+        page_store.close()
+
 
 if __name__ == "__main__":
     main()
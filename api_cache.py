@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+# Evicting down to this fraction of the cap leaves room for a run of writes
+_EVICT_TO = 0.9
+# Buffered access times are written once this many keys or seconds accumulate
+_FLUSH_KEYS = 256
+_FLUSH_SECONDS = 30.0
+
+
+def request_key(api_url: str, params: Dict[str, Any]) -> str:
+    """Get the key a request is cached under: a hash of its endpoint and parameters.
+
+    Parameter order and value types do not matter, so the same query built
+    in different places maps to one entry.
+    """
+    canonical = json.dumps([api_url, {name: str(value) for name, value in params.items()}],
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ApiCache:
+    def __init__(self, path: str, ttl_hours: float, max_bytes: int = 0):
+        """Open the cache of raw Wikipedia API payloads.
+
+        Payloads are stored zlib-compressed under `request_key`, separately
+        from the analysis cache, so changing how text is analyzed does not
+        mean downloading it again. As in the analysis cache index, access
+        times are buffered in memory and written in batches, so hits do not
+        pay for a database write.
+
+        Args:
+            path (str): SQLite database file, created if missing
+            ttl_hours (float): Age after which a payload is fetched again when online
+            max_bytes (int): Least recently used payloads are evicted above this, 0 disables
+        """
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by the threads of a process, like PageStore
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+        # Key -> last access time, not yet written
+        self._accessed: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+        # Total payload size, other processes' writes included as of the last flush
+        self._size = self._total_size()
+
+    def _total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _flush(self) -> None:
+        """Write buffered access times and re-read the total size; the lock must be held."""
+        accessed, self._accessed = self._accessed, {}
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(at, key) for key, at in accessed.items()])
+        self._size = self._total_size()
+        self._flushed_at = time.monotonic()
+
+    def _flush_due(self) -> bool:
+        return (len(self._accessed) >= _FLUSH_KEYS
+                or time.monotonic() - self._flushed_at >= _FLUSH_SECONDS)
+
+    def get(self, api_url: str, params: Dict[str, Any], fresh: bool = True) -> Optional[Dict[str, Any]]:
+        """Get the stored payload of a request.
+
+        Args:
+            api_url (str): API endpoint
+            params (dict): Query string parameters
+            fresh (bool): Ignore payloads older than the TTL
+
+        Returns:
+            Optional[dict]: Decoded payload, or None if not stored
+        """
+        key = request_key(api_url, params)
+        with self._lock:
+            row = self._conn.execute("SELECT payload, fetched_at FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None or (fresh and row[1] < time.time() - self.ttl):
+                return None
+            self._accessed[key] = time.time()
+            if self._flush_due():
+                self._flush()
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, api_url: str, params: Dict[str, Any], data: Dict[str, Any]) -> None:
+        """Store the payload of a request, evicting old payloads if over the size cap.
+
+        Args:
+            api_url (str): API endpoint
+            params (dict): Query string parameters
+            data (dict): Decoded payload
+        """
+        payload = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        key = request_key(api_url, params)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, payload, size, fetched_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, payload, len(payload), now, now))
+            self._accessed.pop(key, None)
+            self._size += len(payload) - (row[0] if row else 0)
+            if (self.max_bytes and self._size > self.max_bytes) or self._flush_due():
+                self._flush()
+            if self.max_bytes and self._size > self.max_bytes:
+                with self._conn:
+                    self._evict(int(self.max_bytes * _EVICT_TO))
+
+    def _evict(self, target: int) -> None:
+        """Delete least recently used payloads until at most `target` bytes remain."""
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def flush(self) -> None:
+        """Write buffered access times."""
+        with self._lock:
+            self._flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of stored payloads and their compressed size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {'entries': entries, 'bytes': size}
+
+    def close(self) -> None:
+        """Write buffered access times and close the database connection."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
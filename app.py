@@ -1,20 +1,111 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context, url_for
 from flask_cors import CORS
-import requests
-import nltk
-from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+from werkzeug.http import parse_accept_header, parse_etags
+from werkzeug.routing import PathConverter
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import json
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+import metrics
 from cache_manager import CacheManager
+from category_analysis import analyze_category, category_cache_key, parse_cache_key
+from config import Config
+from jobs import JobQueue, JobQueueFull
+from page_store import PageStore
+from prewarm import PrewarmScheduler
+from response_cache import ENCODINGS, ResponseCache
+from singleflight import SingleFlight
+from text_analyzer import analyzer_fingerprint, prepare_analyzer, select_top_words
+from wiki_api import normalize_category
+from word_index import METHODS, WordIndex
+
+class CategoryConverter(PathConverter):
+    """A category name in a path, other than the routes under /analyze/."""
+    RESERVED = ('stream',)
+    regex = rf"(?!(?:{'|'.join(RESERVED)})/?$){PathConverter.regex}"
 
 app = Flask(__name__, static_url_path='/static', static_folder='static')
+app.url_map.converters['category'] = CategoryConverter
 CORS(app)
 
+# Check the analyzer's resources once at boot, not in the first request;
+# NLTK itself is only imported if the NLTK analyzer is selected
+prepare_analyzer()
+
 # Initialize cache manager
-cache_manager = CacheManager(cache_dir='cache', expiration_hours=24)
+cache_manager = CacheManager(cache_dir='cache', expiration_hours=24,
+                             memory_max_entries=Config.CACHE_MEMORY_MAX_ENTRIES,
+                             memory_max_bytes=Config.CACHE_MEMORY_MAX_BYTES,
+                             cache_format=Config.CACHE_FORMAT,
+                             compression=Config.CACHE_COMPRESSION,
+                             max_bytes=Config.CACHE_MAX_BYTES,
+                             max_stale_hours=Config.CACHE_MAX_STALE_HOURS)
+# Expired entries are found through the cache's index and removed in short
+# slices on a background thread instead of waiting for /cache/cleanup
+cache_manager.start_background_cleanup(Config.CACHE_CLEANUP_INTERVAL_SECONDS,
+                                       Config.CACHE_CLEANUP_SLICE_SECONDS)
+
+# Concurrent cold-cache requests for one category share a single crawl,
+# across threads here and across worker processes through lock files
+analysis_flights = SingleFlight(lock_dir=cache_manager.cache_dir.rstrip(os.sep) + '.locks')
+
+# Word counts per page revision, shared by every category and refresh
+page_store = PageStore(Config.PAGE_STORE_PATH)
+
+# Vocabulary, document frequencies and per-category count vectors across
+# every analyzed category, updated in the background as analyses are cached
+word_index = WordIndex(Config.WORD_INDEX_PATH)
+_cache_updates = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-updates')
+cache_manager.add_listener(lambda key, value: _cache_updates.submit(word_index.add, key, value))
+cache_manager.add_delete_listener(lambda key: _cache_updates.submit(word_index.remove, key))
+
+# GET /analyze/<category> bodies, compressed once each time an analysis is cached
+response_cache = ResponseCache(Config.RESPONSE_CACHE_DIR)
+cache_manager.add_listener(lambda key, value: _cache_updates.submit(
+    _render_response, key, value, cache_manager.index.written_at(key)))
+cache_manager.add_delete_listener(response_cache.delete)
+
+# Background workers for POST /analyze?async=1 and /cache/cleanup
+analysis_jobs = JobQueue(workers=Config.JOB_WORKERS, max_queued=Config.JOB_QUEUE_SIZE,
+                         result_ttl=Config.JOB_RESULT_TTL_SECONDS)
+
+# Popular categories are re-analyzed off-peak so they never expire in use
+prewarm = PrewarmScheduler(cache_manager, lambda key: _refresh_analysis(key, 'prewarm'),
+                           top_n=Config.PREWARM_TOP_N, request_budget=Config.PREWARM_REQUEST_BUDGET,
+                           start_hour=Config.PREWARM_START_HOUR, end_hour=Config.PREWARM_END_HOUR,
+                           check_interval=Config.PREWARM_CHECK_SECONDS)
+if Config.PREWARM_TOP_N:
+    prewarm.start()
+
+# Endpoints that get a per-request phase breakdown
+_TIMED_ENDPOINTS = {'analyze', 'analyze_stream'}
+
+@app.before_request
+def _start_timings():
+    if request.endpoint in _TIMED_ENDPOINTS:
+        g.timings, g.timings_token = metrics.start_request()
+
+@app.after_request
+def _add_server_timing(response):
+    timings = g.get('timings')
+    if timings is not None and not response.is_streamed:
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+@app.teardown_request
+def _finish_timings(exc):
+    timings = g.pop('timings', None)
+    if timings is not None:
+        metrics.finish_request(timings, g.pop('timings_token'))
+
+@app.route('/metrics')
+def get_metrics():
+    """Expose counters and latency histograms in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/cache/stats')
 def get_cache_stats():
@@ -23,142 +114,446 @@ def get_cache_stats():
 
 @app.route('/cache/cleanup')
 def cleanup_cache():
-    """Clean up expired cache entries."""
-    cleaned = cache_manager.cleanup()
+    """Clean up expired cache entries and old page rows on the job queue.
+
+    Answers 202 with a job id right away; the job's result holds the
+    counts of removed entries and rows. Concurrent calls share one job.
+    """
+    def run(job):
+        cleaned = cache_manager.cleanup()
+        pruned = page_store.prune(Config.PAGE_STORE_RETENTION_HOURS)
+        return {
+            'cleaned_entries': cleaned,
+            'pruned_page_rows': pruned,
+            'stats': cache_manager.get_stats()
+        }
+
+    return _submit_job('cache-cleanup', run)
+
+@app.route('/index/stats')
+def get_index_stats():
+    """Get the number of categories and words in the word index."""
+    return jsonify(word_index.get_stats())
+
+@app.route('/index/rebuild', methods=['POST'])
+def rebuild_index():
+    """Index every cached analysis, e.g. ones cached before the index existed."""
+    indexed = 0
+    for key, value in cache_manager.iter_entries():
+        # Analyses counted under an earlier analyzer configuration stay out
+        if key != category_cache_key(*parse_cache_key(key)):
+            continue
+        word_index.add(key, value)
+        indexed += 1
+    return jsonify({'indexed': indexed, 'stats': word_index.get_stats()})
+
+@app.route('/index/distinctive')
+def distinctive_words():
+    """Rank the words that set an analyzed category apart from the others.
+
+    Takes category and depth like /analyze, top_k, min_count and method
+    ('tfidf' or 'loglik').
+    """
+    try:
+        options = _analysis_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    method = request.args.get('method', 'tfidf')
+    if method not in METHODS:
+        return jsonify({'error': f"method must be one of {', '.join(METHODS)}"}), 400
+
+    words = word_index.distinctive_words(options['cache_key'], options['top_k'], method,
+                                         options['min_count'])
+    if words is None:
+        return jsonify({'error': 'Category has not been analyzed'}), 404
     return jsonify({
-        'cleaned_entries': cleaned,
-        'stats': cache_manager.get_stats()
+        'category': options['category'],
+        'depth': options['depth'],
+        'method': method,
+        'words': [{'word': word, 'count': count, 'score': score} for word, count, score in words]
     })
 
-def download_nltk_data():
+@app.route('/index/words/<word>')
+def word_categories(word):
+    """List the analyzed categories that use a word most."""
     try:
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('punkt')
-        nltk.download('stopwords')
-
-def get_cache_path(category):
-    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
-    os.makedirs(cache_dir, exist_ok=True)
-    return os.path.join(cache_dir, f"{category.replace(' ', '_')}.json")
-
-def load_cache(category):
-    cache_path = get_cache_path(category)
-    if not os.path.exists(cache_path):
-        return None
-        
-    with open(cache_path, 'r', encoding='utf-8') as f:
-        cache_data = json.load(f)
-        
-    cache_time = datetime.fromisoformat(cache_data['timestamp'])
-    if datetime.now() - cache_time > timedelta(hours=24):
-        return None
-        
-    return cache_data['frequencies']
-
-def save_cache(category, frequencies):
-    cache_path = get_cache_path(category)
-    cache_data = {
-        'timestamp': datetime.now().isoformat(),
-        'frequencies': frequencies
-    }
-    
-    with open(cache_path, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        limit = _int_param(request.args, 'limit', 10, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    categories = []
+    # Analyses counted under an earlier analyzer configuration are left out
+    for key, count, share in word_index.top_categories(word.lower(), limit, analyzer_fingerprint()):
+        category, depth = parse_cache_key(key)
+        categories.append({'category': category, 'depth': depth, 'count': count, 'share': share})
+    return jsonify({'word': word.lower(), 'categories': categories})
 
-def get_category_members(category):
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
-    
-    PARAMS = {
-        "action": "query",
-        "list": "categorymembers",
-        "cmtitle": f"Category:{category}",
-        "cmlimit": "500",
-        "format": "json"
+@app.route('/')
+def home():
+    return render_template('index.html')
+
+def _int_param(params, name, default, minimum=0):
+    """Read an integer request parameter that must be at least `minimum`."""
+    value = params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+def _frequencies_payload(frequencies, top_k, min_count, min_length, full):
+    """Build the word frequency part of an /analyze response."""
+    top_words = select_top_words(frequencies, top_k, min_count, min_length)
+    return {
+        # Only the selected words unless the client asks for everything
+        'frequencies': frequencies if full else dict(top_words),
+        'top_words': top_words,
+        'vocabulary_size': len(frequencies),
+        'total_words': sum(frequencies.values())
     }
-    
-    response = S.get(url=URL, params=PARAMS)
-    data = response.json()
-    return [page['title'] for page in data['query']['categorymembers'] if page['ns'] == 0]
 
-def get_page_content(title):
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
-    
-    PARAMS = {
-        "action": "query",
-        "prop": "extracts",
-        "exlimit": "1",
-        "titles": title,
-        "explaintext": "1",
-        "format": "json"
+def _json_body():
+    """Get the decoded JSON body of the request, {} if there is none."""
+    body = request.get_json(silent=True)
+    return {} if body is None else body
+
+def _analysis_options(params):
+    """Validate the body of an analysis request.
+
+    Raises:
+        ValueError: If the body is not an object or a parameter is missing or invalid
+    """
+    if not isinstance(params, dict):
+        raise ValueError('Request body must be a JSON object')
+    category = normalize_category(params.get('category') or '')
+    if not category:
+        raise ValueError('Category is required')
+
+    depth = min(_int_param(params, 'depth', Config.CATEGORY_DEPTH), Config.CATEGORY_MAX_DEPTH)
+    return {
+        'category': category,
+        'depth': depth,
+        'cache_key': category_cache_key(category, depth),
+        'top_k': _int_param(params, 'top_k', Config.MAX_WORDS, minimum=1),
+        'min_count': _int_param(params, 'min_count', 1, minimum=1),
+        'min_length': _int_param(params, 'min_length', Config.MIN_WORD_LENGTH),
+        'full': str(params.get('full', '')).lower() in ('true', '1', 't')
     }
-    
-    response = S.get(url=URL, params=PARAMS)
-    data = response.json()
-    page = next(iter(data['query']['pages'].values()))
-    return page.get('extract', '')
 
-def analyze_text(text):
-    tokens = word_tokenize(text.lower())
-    stop_words = set(stopwords.words('english'))
-    words = [word for word in tokens if word.isalpha() and word not in stop_words]
-    return Counter(words)
+def _run_analysis(options, mode, progress=None):
+    """Get an analysis from the cache or crawl it, sharing concurrent crawls."""
+    cached = _cached_analysis(options['cache_key'], allow_stale=True)
+    if cached is not None:
+        metrics.ANALYZE_REQUESTS.inc(mode=mode, cache='stale' if cached['stale'] else 'hit')
+        return cached
+    metrics.ANALYZE_REQUESTS.inc(mode=mode, cache='miss')
+    # Whatever finer phases do not cover, mostly waiting for a crawl already in flight
+    with metrics.phase('crawl'):
+        return analysis_flights.do(
+            options['cache_key'],
+            lambda: _crawl_category(options['category'], options['depth'], options['cache_key'],
+                                    progress=progress),
+            recheck=lambda: _cached_analysis(options['cache_key'])
+        )
 
-@app.route('/')
-def home():
-    return render_template('index.html')
+def _analysis_response(cached, options):
+    """Build the /analyze response body for a finished analysis."""
+    response = _frequencies_payload(cached['frequencies'], options['top_k'],
+                                    options['min_count'], options['min_length'], options['full'])
+    if cached['cached']:
+        # In-memory counters only; the full stats read the disk and are at /cache/stats
+        response.update(cached=True, stale=cached.get('stale', False),
+                        cache_stats=cache_manager.memory.get_stats())
+    else:
+        response.update(cached=False, processed_pages=cached['processed_pages'],
+                        fetched_pages=cached['fetched_pages'], error_bound=cached.get('error_bound', 0))
+    return response
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    category = request.json.get('category')
-    if not category:
-        return jsonify({'error': 'Category is required'}), 400
+    try:
+        options = _analysis_options(_json_body())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Check cache first
-    cached_data = cache_manager.get(category)
-    if cached_data is not None:
-        return jsonify({
-            'frequencies': cached_data,
-            'cached': True,
-            'cache_stats': cache_manager.get_stats()
-        })
+    if str(request.args.get('async', '')).lower() in ('true', '1', 't'):
+        return _submit_analysis_job(options)
 
     try:
-        # Download required NLTK data
-        download_nltk_data()
-        
-        # Get all pages in the category
-        pages = get_category_members(category)
-        if not pages:
-            return jsonify({'error': 'No pages found in category'}), 404
-        
-        # Analyze each page
-        total_frequencies = Counter()
-        processed_pages = []
-        
-        for page_title in pages:
-            content = get_page_content(page_title)
-            frequencies = analyze_text(content)
-            total_frequencies.update(frequencies)
-            processed_pages.append(page_title)
-        
-        # Convert Counter to dict for JSON serialization
-        result = dict(total_frequencies)
-        
-        # Save to cache
-        cache_manager.set(category, result)
-        
-        return jsonify({
-            'frequencies': result,
-            'processed_pages': processed_pages,
-            'cached': False
-        })
-        
+        cached = _run_analysis(options, 'sync')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    if cached is None:
+        return jsonify({'error': 'No pages found in category'}), 404
+
+    response = _analysis_response(cached, options)
+    response['timings'] = g.timings.as_dict()
+    return jsonify(response)
+
+@app.route('/analyze/<category:category>')
+def get_analysis(category):
+    """Get the full analysis of a category as a cacheable resource.
+
+    Takes depth as a query parameter. The body holds every frequency and
+    the default top words; it is rendered and compressed once per cache
+    entry and served as stored bytes. Its strong ETag changes whenever the
+    entry is rewritten, and a matching If-None-Match gets a 304 without
+    the body being read.
+    """
+    try:
+        options = _analysis_options({'category': category,
+                                     'depth': request.args.get('depth', Config.CATEGORY_DEPTH)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cache_key = options['cache_key']
+
+    info = cache_manager.entry_info(cache_key)
+    if info is None:
+        try:
+            cached = _run_analysis(options, 'get')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        if cached is None:
+            return jsonify({'error': 'No pages found in category'}), 404
+        info = cache_manager.entry_info(cache_key)
+        if info is None:
+            # Evicted already; nothing to validate against
+            return jsonify(_analysis_document(cache_key, cached['frequencies'], time.time()))
+    else:
+        metrics.ANALYZE_REQUESTS.inc(mode='get', cache='stale' if info[1] else 'hit')
+    return _stored_analysis(cache_key, info, request.headers.get('Accept-Encoding'),
+                            request.headers.get('If-None-Match'))
+
+def _stored_analysis(cache_key, info, accept_encoding, if_none_match):
+    """Answer GET /analyze/<category> from a cache entry's stored body.
+
+    Needs no request context, so other servers can call it too.
+
+    Args:
+        cache_key (str): Cache key of the analysis
+        info (tuple): (written_at, is_stale) from `cache_manager.entry_info`
+        accept_encoding (str): Accept-Encoding header, or None
+        if_none_match (str): If-None-Match header, or None
+
+    Returns:
+        Response: The full response, a 304 or an error
+    """
+    written_at, stale = info
+    if stale:
+        _queue_refresh(cache_key)
+
+    codings = ENCODINGS + ('identity',)
+    encoding = parse_accept_header(accept_encoding).best_match(codings, default='identity')
+    requested = parse_etags(if_none_match)
+    if any(requested.contains_weak(ResponseCache.etag(cache_key, written_at, coding)) for coding in codings):
+        response = Response(status=304)
+    else:
+        body = response_cache.get(cache_key, written_at, encoding)
+        if body is None:
+            entry = cache_manager.get_entry(cache_key)
+            if entry is None:
+                return Response(json.dumps({'error': 'Category analysis expired, please retry'}),
+                                status=503, mimetype='application/json')
+            rendered = _render_response(cache_key, entry[0], written_at)
+            body = rendered if encoding == 'identity' else response_cache.get(cache_key, written_at, encoding)
+            if body is None:
+                # Rewritten meanwhile; send this version uncompressed
+                body, encoding = rendered, 'identity'
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(ResponseCache.etag(cache_key, written_at, encoding))
+    response.headers['Vary'] = 'Accept-Encoding'
+    fresh_for = int(written_at + cache_manager.expiration_hours * 3600 - time.time())
+    response.headers['Cache-Control'] = f"public, max-age={fresh_for}" if not stale else 'no-cache'
+    return response
+
+def _analysis_document(cache_key, frequencies, written_at):
+    """Build the GET /analyze/<category> body for a cached analysis."""
+    category, depth = parse_cache_key(cache_key)
+    document = {'category': category, 'depth': depth,
+                'analyzed_at': datetime.fromtimestamp(written_at, timezone.utc).isoformat()}
+    document.update(_frequencies_payload(frequencies, Config.MAX_WORDS, 1, Config.MIN_WORD_LENGTH,
+                                         full=True))
+    return document
+
+def _render_response(cache_key, frequencies, written_at):
+    """Render and store the compressed GET body of a cache entry version.
+
+    Returns:
+        bytes: The uncompressed body
+    """
+    if written_at is None:
+        # Gone from the cache before the body was rendered
+        return None
+    document = _analysis_document(cache_key, frequencies, written_at)
+    body = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    response_cache.put(cache_key, written_at, body)
+    return body
+
+def _submit_analysis_job(options):
+    """Queue an analysis and answer with its job id right away."""
+    def run(job):
+        timings, token = metrics.start_request()
+        try:
+            cached = _run_analysis(options, 'async',
+                                   progress=lambda stats, totals: job.progress.update(stats))
+            if cached is None:
+                raise LookupError('No pages found in category')
+            response = _analysis_response(cached, options)
+        finally:
+            metrics.finish_request(timings, token)
+        response['timings'] = timings.as_dict()
+        return response
+
+    # Identical requests share one job
+    return _submit_job(json.dumps(options, sort_keys=True), run)
+
+def _submit_job(key, run):
+    """Queue `run` on the job queue and answer 202 with the job's URL."""
+    try:
+        job, _ = analysis_jobs.submit(key, run)
+    except JobQueueFull as e:
+        response = jsonify({'error': f"Too many queued jobs: {e}"})
+        response.headers['Retry-After'] = str(Config.JOB_RETRY_AFTER_SECONDS)
+        return response, 429
+
+    response = jsonify({'job_id': job.id, 'status': job.status,
+                        'status_url': url_for('get_job', job_id=job.id)})
+    response.headers['Location'] = url_for('get_job', job_id=job.id)
+    return response, 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Get the status, progress and result of a background job."""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Analyze a category, streaming progress as newline-delimited JSON.
+
+    Each line is an event object with a 'type': 'progress' (page counts),
+    'snapshot' (top words so far), then either 'result' (the /analyze
+    response body) or 'error'. Blank lines are keep-alives.
+    """
+    try:
+        options = _analysis_options(_json_body())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return Response(stream_with_context(_analysis_events(options)),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _event_line(event_type, **fields):
+    return json.dumps({'type': event_type, **fields}) + '\n'
+
+def _analysis_events(options):
+    """Run an analysis on a background thread and yield its events as they happen."""
+    events = queue.Queue()
+    last_report = 0.0
+
+    def report(stats, totals):
+        # Runs on the crawl thread, which owns `totals`
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < Config.STREAM_SNAPSHOT_INTERVAL:
+            return
+        last_report = now
+        events.put(('event', _event_line('progress', **stats)))
+        if totals:
+            top_words = select_top_words(totals, options['top_k'], options['min_count'],
+                                         options['min_length'])
+            events.put(('event', _event_line('snapshot', top_words=top_words,
+                                             analyzed=stats['analyzed'])))
+
+    def run():
+        # The crawl finishes and is cached even if the client goes away
+        try:
+            events.put(('done', _run_analysis(options, 'stream', progress=report)))
+        except Exception as e:
+            events.put(('error', e))
+
+    # The crawl thread charges its phases to this request's timings
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name='analysis-stream', daemon=True).start()
+
+    while True:
+        try:
+            kind, payload = events.get(timeout=Config.STREAM_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            yield '\n'
+            continue
+        if kind == 'event':
+            yield payload
+        elif kind == 'error':
+            yield _event_line('error', error=str(payload), status=500)
+            return
+        elif payload is None:
+            yield _event_line('error', error='No pages found in category', status=404)
+            return
+        else:
+            timings = metrics.current()
+            yield _event_line('result', **_analysis_response(payload, options),
+                              timings=timings.as_dict() if timings else {})
+            return
+
+def _cached_analysis(cache_key, allow_stale=False):
+    """Look up a finished analysis in the cache.
+
+    With `allow_stale`, an expired entry that is still within the cache's
+    stale window is returned too, and one background refresh is queued.
+    """
+    with metrics.phase('cache_lookup'):
+        entry = cache_manager.get_entry(cache_key)
+    if entry is None:
+        return None
+    cached_data, stale = entry
+    if stale:
+        if not allow_stale:
+            return None
+        _queue_refresh(cache_key)
+    return {'frequencies': cached_data, 'cached': True, 'stale': stale}
+
+def _refresh_analysis(cache_key, trigger):
+    """Re-analyze a cached category, sharing a crawl already in flight."""
+    category, depth = parse_cache_key(cache_key)
+    # A popular entry counted by an earlier analyzer configuration is warmed under the current one
+    cache_key = category_cache_key(category, depth)
+    metrics.CACHE_REFRESHES.inc(trigger=trigger)
+    analysis_flights.do(cache_key, lambda: _crawl_category(category, depth, cache_key))
+
+def _queue_refresh(cache_key):
+    """Refresh a stale entry in the background; repeated calls share one job."""
+    try:
+        analysis_jobs.submit(f"refresh:{cache_key}", lambda job: _refresh_analysis(cache_key, 'stale'))
+    except JobQueueFull:
+        # Served stale until a later request finds room in the queue
+        pass
+
+def _crawl_category(category, depth, cache_key, progress=None):
+    """Analyze a category and cache the result.
+
+    Only pages whose revision changed since they were last analyzed, for
+    this or any other category, are downloaded and tokenized again.
+    """
+    # Download required NLTK data if the NLTK analyzer is selected
+    prepare_analyzer()
+    
+    result = analyze_category(category, depth, cache_key, page_store, progress=progress)
+    if result is None:
+        return None
+    
+    # Save to cache
+    with metrics.phase('cache_write'):
+        cache_manager.set(cache_key, result['frequencies'])
+    
+    result['cached'] = False
+    return result
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,220 @@
+"""Serve the app over ASGI, so one process can hold many requests open.
+
+    python serve.py --workers 4
+    uvicorn asgi:application --workers 4
+
+POST /analyze and GET /analyze/<category> run on the event loop. Cache
+reads and response encoding happen on a thread pool, and crawls on a
+bounded pool of their own that all requests for a category share, so an
+analysis waiting for its crawl costs a coroutine rather than a thread.
+Large tokenization jobs move to worker processes as they do under Flask
+(see PARALLEL_ANALYSIS_THRESHOLD). Every other route is the Flask app,
+run on threads through a2wsgi.
+
+Calls to the Wikipedia API are not asynchronous: a crawl still makes
+blocking requests calls, one crawl per thread of the crawl pool. What
+runs on the event loop is the waiting, not the upstream I/O, so
+ASGI_CRAWL_THREADS bounds how many categories are crawled at once and
+further cold categories queue for a thread.
+"""
+import asyncio
+import contextvars
+import json
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+
+import app as flask_app
+import metrics
+import parallel_analyzer
+from config import Config
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Cache reads, response building and encoding
+_io = ThreadPoolExecutor(max_workers=Config.ASGI_THREADS, thread_name_prefix='asgi-io')
+_crawler = ThreadPoolExecutor(max_workers=Config.ASGI_CRAWL_THREADS, thread_name_prefix='asgi-crawl')
+
+# Crawls in flight by cache key; later requests for the key await the same one
+_crawls: Dict[str, asyncio.Future] = {}
+
+# Flask routes, on threads of their own so long streams cannot starve cache reads
+_flask = WSGIMiddleware(flask_app.app, workers=Config.ASGI_THREADS)
+
+
+def _offload(executor: Executor, fn: Callable, *args) -> asyncio.Future:
+    """Run `fn` on an executor in a copy of the current context, so it charges the request's timings."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, partial(context.run, fn, *args))
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _send_response(send: Send, status: int, headers: Iterable[Tuple[str, str]],
+                         body: bytes = b'', head: bool = False) -> None:
+    raw_headers = [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                   for name, value in headers]
+    # What flask-cors adds to the Flask routes
+    raw_headers.append((b'access-control-allow-origin', b'*'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+async def _send_json(send: Send, status: int, payload: Dict[str, Any],
+                     headers: Optional[List[Tuple[str, str]]] = None) -> None:
+    # A full frequency map takes a while to encode
+    body = await _offload(_io, lambda: json.dumps(payload, sort_keys=True).encode('utf-8'))
+    await _send_response(send, status, [('content-type', 'application/json'),
+                                        ('content-length', str(len(body)))] + (headers or []), body)
+
+
+async def _analysis(options: Dict[str, Any], mode: str) -> Optional[Dict[str, Any]]:
+    """Get an analysis from the cache, or wait for a crawl shared with other requests."""
+    cache_key = options['cache_key']
+    cached = await _offload(_io, flask_app._cached_analysis, cache_key, True)
+    if cached is not None:
+        metrics.ANALYZE_REQUESTS.inc(mode=mode, cache='stale' if cached['stale'] else 'hit')
+        return cached
+    metrics.ANALYZE_REQUESTS.inc(mode=mode, cache='miss')
+
+    crawl = _crawls.get(cache_key)
+    if crawl is None:
+        # Not in the requester's context, which stops collecting once its response is sent
+        crawl = asyncio.get_running_loop().run_in_executor(
+            _crawler, contextvars.Context().run, _shared_crawl, options)
+        _crawls[cache_key] = crawl
+        crawl.add_done_callback(lambda _: _crawls.pop(cache_key, None))
+    with metrics.phase('crawl'):
+        # A client going away must not cancel the crawl for everyone else
+        return await asyncio.shield(crawl)
+
+
+def _shared_crawl(options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Crawl a category for every request waiting on it, with timings of its own."""
+    cache_key = options['cache_key']
+    timings, _ = metrics.start_request()
+    try:
+        # The flight group still coalesces with other processes and the Flask routes
+        return flask_app.analysis_flights.do(
+            cache_key,
+            lambda: flask_app._crawl_category(options['category'], options['depth'], cache_key),
+            lambda: flask_app._cached_analysis(cache_key))
+    finally:
+        metrics.observe_phases(timings)
+
+
+async def _analyze(receive: Receive, send: Send) -> None:
+    """POST /analyze without ?async, like the Flask route."""
+    timings, token = metrics.start_request()
+    try:
+        try:
+            params = json.loads(await _read_body(receive) or b'{}')
+            options = flask_app._analysis_options(params)
+        except ValueError as e:
+            await _send_json(send, 400, {'error': str(e)})
+            return
+
+        try:
+            cached = await _analysis(options, 'sync')
+        except Exception as e:
+            await _send_json(send, 500, {'error': str(e)})
+            return
+        if cached is None:
+            await _send_json(send, 404, {'error': 'No pages found in category'})
+            return
+
+        response = await _offload(_io, flask_app._analysis_response, cached, options)
+        response['timings'] = timings.as_dict()
+        await _send_json(send, 200, response, [('server-timing', timings.server_timing())])
+    finally:
+        metrics.finish_request(timings, token)
+
+
+async def _get_analysis(scope: Scope, category: str, query: Dict[str, str], send: Send) -> None:
+    """GET /analyze/<category>, like the Flask route."""
+    try:
+        options = flask_app._analysis_options({'category': category,
+                                               'depth': query.get('depth', Config.CATEGORY_DEPTH)})
+    except ValueError as e:
+        await _send_json(send, 400, {'error': str(e)})
+        return
+    cache_key = options['cache_key']
+
+    info = await _offload(_io, flask_app.cache_manager.entry_info, cache_key)
+    if info is None:
+        try:
+            cached = await _analysis(options, 'get')
+        except Exception as e:
+            await _send_json(send, 500, {'error': str(e)})
+            return
+        if cached is None:
+            await _send_json(send, 404, {'error': 'No pages found in category'})
+            return
+        info = await _offload(_io, flask_app.cache_manager.entry_info, cache_key)
+        if info is None:
+            await _send_json(send, 200, flask_app._analysis_document(cache_key, cached['frequencies'],
+                                                                     time.time()))
+            return
+    else:
+        metrics.ANALYZE_REQUESTS.inc(mode='get', cache='stale' if info[1] else 'hit')
+
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+               for name, value in scope.get('headers', [])}
+    response = await _offload(_io, flask_app._stored_analysis, cache_key, info,
+                              headers.get('accept-encoding'), headers.get('if-none-match'))
+    await _send_response(send, response.status_code, response.headers.items(), response.get_data(),
+                         head=scope['method'] == 'HEAD')
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, _stop_background_work)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _stop_background_work() -> None:
+    flask_app.prewarm.stop()
+    flask_app.cache_manager.stop_background_cleanup()
+    flask_app.cache_manager.index.flush()
+    parallel_analyzer.shutdown()
+
+
+async def application(scope: Scope, receive: Receive, send: Send) -> None:
+    """ASGI entry point."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    if (method == 'POST' and path == '/analyze'
+            and query.get('async', '').lower() not in ('true', '1', 't')):
+        await _analyze(receive, send)
+    elif (method in ('GET', 'HEAD') and path.startswith('/analyze/')
+            and path[len('/analyze/'):].rstrip('/') not in flask_app.CategoryConverter.RESERVED):
+        await _get_analysis(scope, path[len('/analyze/'):], query, send)
+    else:
+        await _flask(scope, receive, send)
@@ -0,0 +1,272 @@
+"""Reproducible performance benchmarks against the offline Wikipedia stand-in.
+
+    python benchmark.py --output benchmark-results.json
+    python benchmark.py --only analyze_text cache_manager --pages 50
+
+Each benchmark runs in its own process so peak RSS is measured per benchmark.
+Results are written as JSON for comparison between releases.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {}
+
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _summary(samples: List[float], elapsed: float, **extra) -> Dict[str, Any]:
+    """Summarize per-operation timings in seconds."""
+    return {
+        'operations': len(samples),
+        'throughput_per_s': len(samples) / elapsed if elapsed else None,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': _percentile(samples, 0.50) * 1000,
+        'p99_ms': _percentile(samples, 0.99) * 1000,
+        **extra
+    }
+
+
+def _timed(operation: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        began = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - began)
+    return _summary(samples, time.perf_counter() - start)
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextlib.contextmanager
+def _offline_app(args):
+    """Point the app at a fake API server and empty temporary caches."""
+    from fake_wiki_api import FakeWikiAPI, synthetic_dataset
+    import app as app_module
+    import wiki_api
+    from cache_manager import CacheManager
+    from page_store import PageStore
+
+    dataset = synthetic_dataset(categories=args.categories, pages_per_category=args.pages)
+    tmp_dir = tempfile.mkdtemp(prefix='wiki-bench-')
+    api = FakeWikiAPI(dataset, latency=args.latency, throttle_rate=args.throttle_rate)
+    api.start()
+    client = wiki_api.WikiClient(api_url=api.url, requests_per_second=0, backoff_factor=0.01)
+    cache = CacheManager(cache_dir=os.path.join(tmp_dir, 'cache'), expiration_hours=24,
+                         cache_format='binary')
+    store = PageStore(os.path.join(tmp_dir, 'pages.sqlite3'))
+    try:
+        with mock.patch.object(wiki_api, '_client', client), \
+                mock.patch.object(app_module, 'cache_manager', cache), \
+                mock.patch.object(app_module, 'page_store', store):
+            yield app_module.app.test_client(), dataset, api, tmp_dir
+    finally:
+        store.close()
+        client.close()
+        api.stop()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _post_analyze(client, category):
+    response = client.post('/analyze', json={'category': category})
+    if response.status_code != 200:
+        raise RuntimeError(f"/analyze {category!r} returned {response.status_code}")
+
+
+@benchmark('analyze_cold')
+def bench_analyze_cold(args):
+    """/analyze with empty caches, one request per category."""
+    with _offline_app(args) as (client, dataset, api, _):
+        categories = [name for name in dataset['categories'] if 'subtopics' not in name]
+        samples = []
+        start = time.perf_counter()
+        for category in categories:
+            began = time.perf_counter()
+            _post_analyze(client, category)
+            samples.append(time.perf_counter() - began)
+        return _summary(samples, time.perf_counter() - start,
+                        api_requests=api.requests, api_throttled=api.throttled)
+
+
+@benchmark('analyze_warm')
+def bench_analyze_warm(args):
+    """/analyze served from the cache after one cold request per category."""
+    with _offline_app(args) as (client, dataset, _, _):
+        categories = [name for name in dataset['categories'] if 'subtopics' not in name]
+        for category in categories:
+            _post_analyze(client, category)
+        samples = []
+        start = time.perf_counter()
+        for index in range(args.repeat):
+            began = time.perf_counter()
+            _post_analyze(client, categories[index % len(categories)])
+            samples.append(time.perf_counter() - began)
+        return _summary(samples, time.perf_counter() - start)
+
+
+@benchmark('cli_main')
+def bench_cli_main(args):
+    """The command line tool for one category with an empty cache."""
+    import analyze_wiki_category
+    with _offline_app(args) as (_, dataset, _, tmp_dir):
+        category = next(iter(dataset['categories']))
+        argv = [category, '--cache-dir', os.path.join(tmp_dir, 'cli-cache')]
+        with contextlib.redirect_stdout(io.StringIO()):
+            return _timed(lambda: analyze_wiki_category.main(argv), 1)
+
+
+@benchmark('cli_batch')
+def bench_cli_batch(args):
+    """The command line batch mode for every category, cold then warm."""
+    import analyze_wiki_category
+    with _offline_app(args) as (_, dataset, api, tmp_dir):
+        categories_file = os.path.join(tmp_dir, 'categories.txt')
+        with open(categories_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(dataset['categories']))
+        argv = ['--batch', categories_file, '--output', os.path.join(tmp_dir, 'results.jsonl'),
+                '--cache-dir', os.path.join(tmp_dir, 'cli-cache')]
+        with contextlib.redirect_stderr(io.StringIO()):
+            results = {'cold': _timed(lambda: analyze_wiki_category.main(argv), 1)}
+            results['cold']['api_requests'] = api.requests
+            results['warm'] = _timed(lambda: analyze_wiki_category.main(argv), 1)
+        results['categories'] = len(dataset['categories'])
+        return results
+
+
+@benchmark('analyze_text')
+def bench_analyze_text(args):
+    """analyze_text on a fixed synthetic corpus."""
+    from fake_wiki_api import synthetic_dataset
+    from text_analyzer import analyze_text
+    pages = synthetic_dataset(categories=1, pages_per_category=args.pages)['pages']
+    corpus = ' '.join(page['extract'] for page in pages.values())
+    result = _timed(lambda: analyze_text(corpus, args.analyzer), args.repeat)
+    result.update(analyzer=args.analyzer, corpus_chars=len(corpus),
+                  chars_per_s=len(corpus) * result['throughput_per_s'])
+    return result
+
+
+@benchmark('cache_manager')
+def bench_cache_manager(args):
+    """CacheManager set, get (disk and memory tier) and cleanup."""
+    from cache_manager import CacheManager
+    from fake_wiki_api import synthetic_dataset
+    from text_analyzer import analyze_text
+    pages = synthetic_dataset(categories=1, pages_per_category=args.pages)['pages']
+    value = dict(analyze_text(' '.join(page['extract'] for page in pages.values()), 'fast'))
+    tmp_dir = tempfile.mkdtemp(prefix='wiki-bench-')
+    try:
+        cache = CacheManager(cache_dir=tmp_dir, cache_format='binary', memory_max_entries=0)
+        keys = [f"key {index}" for index in range(args.repeat)]
+        key_iter = iter(keys)
+        results = {'set': _timed(lambda: cache.set(next(key_iter), value), len(keys))}
+        key_iter = iter(keys)
+        results['get'] = _timed(lambda: cache.get(next(key_iter)), len(keys))
+        memory_cache = CacheManager(cache_dir=tmp_dir, cache_format='binary')
+        memory_cache.get(keys[0])
+        results['get_memory'] = _timed(lambda: memory_cache.get(keys[0]), args.repeat)
+        results['cleanup'] = _timed(lambda: cache.cleanup(max_age_hours=1), 3)
+        results['entry_words'] = len(value)
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_one(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    result = BENCHMARKS[name](args)
+    result['peak_rss_kb'] = _peak_rss_kb()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the performance benchmarks.')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--output', default='benchmark-results.json', help="JSON results file, '-' for stdout")
+    parser.add_argument('--pages', type=int, default=200, help='Synthetic pages per category')
+    parser.add_argument('--categories', type=int, default=3, help='Synthetic categories')
+    parser.add_argument('--repeat', type=int, default=50, help='Iterations for repeated operations')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every API response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of API requests answered with 429')
+    parser.add_argument('--analyzer', default='fast', help='Analyzer for the analyze_text benchmark')
+    parser.add_argument('--in-process', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    names = args.only or list(BENCHMARKS)
+
+    if args.in_process:
+        # Child mode: run the benchmarks here and print their results
+        json.dump({name: run_one(name, args) for name in names}, sys.stdout)
+        return
+
+    results = {}
+    child_args = [arg for arg in sys.argv[1:]]
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *child_args, '--only', name,
+             '--in-process', '--output', '-'],
+            capture_output=True, text=True, check=True
+        )
+        results.update(json.loads(child.stdout))
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {name: value for name, value in vars(args).items()
+                       if name not in ('only', 'output', 'in_process')},
+        'benchmarks': results
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
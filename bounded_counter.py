@@ -0,0 +1,66 @@
+import sys
+from collections import Counter
+from typing import Mapping
+
+
+class BoundedCounter(Counter):
+    """Word counts that hold at most `max_words` distinct words.
+
+    When an update pushes the vocabulary past `max_words`, the tail is pruned:
+    every word counted no more often than the word at rank
+    `max_words * keep_fraction` is dropped, and that count is added to
+    `error`. A word that is pruned and seen again starts over from zero, so
+
+        count <= true count <= count + error
+
+    for every word, and any word no longer held was seen at most `error`
+    times. The top of the ranking is exact as long as its counts stay above
+    `error`. With `max_words` 0 nothing is pruned and counts are exact.
+
+    New words are interned, so the analyses of many categories in one
+    process share a single copy of each word.
+    """
+
+    def __init__(self, max_words: int = 0, keep_fraction: float = 0.75):
+        self.max_words = max_words
+        self.keep_fraction = keep_fraction
+        self.error = 0
+        self.pruned_words = 0
+        super().__init__()
+
+    def update(self, iterable=None, /, **kwds) -> None:
+        if isinstance(iterable, Mapping) and not kwds:
+            get = self.get
+            for word, count in iterable.items():
+                current = get(word)
+                if current is None:
+                    self[sys.intern(word)] = count
+                else:
+                    self[word] = current + count
+        else:
+            super().update(iterable, **kwds)
+        if self.max_words and len(self) > self.max_words:
+            self.prune()
+
+    def prune(self) -> None:
+        """Drop the least frequent words down to `max_words * keep_fraction`."""
+        keep = int(self.max_words * self.keep_fraction)
+        if len(self) <= keep:
+            return
+        threshold = sorted(self.values(), reverse=True)[keep]
+        tail = [word for word, count in self.items() if count <= threshold]
+        for word in tail:
+            del self[word]
+        self.error += threshold
+        self.pruned_words += len(tail)
+
+    @property
+    def approximate(self) -> bool:
+        """Whether any counts were lost to pruning."""
+        return self.error > 0
+
+    def copy(self) -> Counter:
+        return Counter(self)
+
+    def __reduce__(self):
+        return Counter, (dict(self),)
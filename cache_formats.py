@@ -0,0 +1,213 @@
+import json
+import lzma
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+# Compression codecs for the binary format, keyed by the code in its header.
+COMPRESSIONS = {'none': 0, 'zlib': 1, 'lzma': 2}
+
+_MAGIC = b'WCF1'
+# compression code, timestamp, key length, entry count, compressed counts length
+_HEADER = struct.Struct('<BdIIQ')
+_READ_SIZE = 64 * 1024
+_MAX_COUNT = 2 ** 32 - 1
+
+
+class JsonFormat:
+    """Cache entries as a single JSON document (the original layout)."""
+
+    name = 'json'
+    extension = '.json'
+    has_header = False
+
+    def can_store(self, value: Any) -> bool:
+        return True
+
+    def write(self, f: BinaryIO, key: str, timestamp: float, value: Any) -> None:
+        cache_data = {
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+            'data': value,
+            'key': key
+        }
+        f.write(json.dumps(cache_data, separators=(',', ':')).encode('utf-8'))
+
+    def read(self, f: BinaryIO) -> Tuple[float, str, Any]:
+        cache_data = json.load(f)
+        timestamp = datetime.fromisoformat(cache_data['timestamp']).timestamp()
+        return timestamp, cache_data['key'], cache_data['data']
+
+    def read_header(self, f: BinaryIO) -> Tuple[float, str]:
+        # JSON has no separate header, so the whole document is parsed
+        timestamp, key, _ = self.read(f)
+        return timestamp, key
+
+    def iter_items(self, f: BinaryIO) -> Iterator[Tuple[str, int]]:
+        _, _, value = self.read(f)
+        return iter(sorted(value.items(), key=lambda item: item[1], reverse=True))
+
+
+class _Section:
+    """Incrementally decompress one section of a binary cache file."""
+
+    def __init__(self, f: BinaryIO, offset: int, length: Optional[int], compression: int):
+        self.f = f
+        self.offset = offset
+        self.remaining = length
+        self.buffer = b''
+        if compression == COMPRESSIONS['zlib']:
+            self.decompressor = zlib.decompressobj()
+        elif compression == COMPRESSIONS['lzma']:
+            self.decompressor = lzma.LZMADecompressor()
+        else:
+            self.decompressor = None
+
+    def fill(self) -> bool:
+        """Decompress the next block into the buffer; False once exhausted."""
+        size = _READ_SIZE if self.remaining is None else min(_READ_SIZE, self.remaining)
+        if size == 0:
+            return False
+        self.f.seek(self.offset)
+        data = self.f.read(size)
+        if not data:
+            return False
+        self.offset += len(data)
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        self.buffer += self.decompressor.decompress(data) if self.decompressor else data
+        return True
+
+
+class BinaryFormat:
+    """Compact cache entries for word frequency tables.
+
+    Layout: a magic number, a fixed header (compression, timestamp, key
+    length, entry count, counts section length) and the key, followed by
+    the counts as a uint32 array and the words joined by newlines. Both
+    sections are sorted by descending count and compressed independently,
+    so expiry checks only read the header and top-K reads can stop after
+    the first few blocks.
+    """
+
+    name = 'binary'
+    extension = '.bin'
+    has_header = True
+
+    def __init__(self, compression: str = 'zlib'):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, expected one of {tuple(COMPRESSIONS)}")
+        self.compression = COMPRESSIONS[compression]
+
+    def can_store(self, value: Any) -> bool:
+        return isinstance(value, dict) and all(
+            isinstance(word, str) and '\n' not in word
+            and isinstance(count, int) and 0 <= count <= _MAX_COUNT
+            for word, count in value.items()
+        )
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == COMPRESSIONS['zlib']:
+            return zlib.compress(data, 6)
+        if self.compression == COMPRESSIONS['lzma']:
+            return lzma.compress(data)
+        return data
+
+    @staticmethod
+    def _decompress(compression: int, data: bytes) -> bytes:
+        if compression == COMPRESSIONS['zlib']:
+            return zlib.decompress(data)
+        if compression == COMPRESSIONS['lzma']:
+            return lzma.decompress(data)
+        return data
+
+    def write(self, f: BinaryIO, key: str, timestamp: float, value: Dict[str, int]) -> None:
+        items = sorted(value.items(), key=lambda item: (-item[1], item[0]))
+        counts = array('I', (count for _, count in items))
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        counts_data = self._compress(counts.tobytes())
+        words_data = self._compress('\n'.join(word for word, _ in items).encode('utf-8'))
+        key_data = key.encode('utf-8')
+
+        f.write(_MAGIC)
+        f.write(_HEADER.pack(self.compression, timestamp, len(key_data), len(items), len(counts_data)))
+        f.write(key_data)
+        f.write(counts_data)
+        f.write(words_data)
+
+    def _read_fixed_header(self, f: BinaryIO) -> Tuple[int, float, str, int, int]:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError('Not a binary cache entry')
+        compression, timestamp, key_length, entries, counts_length = _HEADER.unpack(
+            f.read(_HEADER.size))
+        key = f.read(key_length).decode('utf-8')
+        return compression, timestamp, key, entries, counts_length
+
+    def read_header(self, f: BinaryIO) -> Tuple[float, str]:
+        _, timestamp, key, _, _ = self._read_fixed_header(f)
+        return timestamp, key
+
+    def iter_items(self, f: BinaryIO) -> Iterator[Tuple[str, int]]:
+        """Yield (word, count) pairs by descending count, decompressing lazily."""
+        compression, _, _, entries, counts_length = self._read_fixed_header(f)
+        counts_offset = f.tell()
+        counts = _Section(f, counts_offset, counts_length, compression)
+        words = _Section(f, counts_offset + counts_length, None, compression)
+
+        produced = 0
+        pending_words = []
+        while produced < entries:
+            while not pending_words:
+                if not words.fill():
+                    # The last word has no trailing newline
+                    pending_words, words.buffer = [words.buffer], b''
+                    break
+                *complete, words.buffer = words.buffer.split(b'\n')
+                pending_words = complete
+            while len(counts.buffer) < 4 and counts.fill():
+                pass
+
+            available = min(len(pending_words), len(counts.buffer) // 4)
+            block = array('I', counts.buffer[:available * 4])
+            if sys.byteorder != 'little':
+                block.byteswap()
+            counts.buffer = counts.buffer[available * 4:]
+            for word, count in zip(pending_words[:available], block):
+                yield word.decode('utf-8'), count
+            pending_words = pending_words[available:]
+            produced += available
+            if available == 0:
+                raise ValueError('Truncated binary cache entry')
+
+    def read(self, f: BinaryIO) -> Tuple[float, str, Dict[str, int]]:
+        compression, timestamp, key, entries, counts_length = self._read_fixed_header(f)
+        counts = array('I', self._decompress(compression, f.read(counts_length)))
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        words = self._decompress(compression, f.read()).decode('utf-8').split('\n') if entries else []
+        if len(counts) != entries or len(words) != entries:
+            raise ValueError('Truncated binary cache entry')
+        return timestamp, key, dict(zip(words, counts))
+
+
+FORMATS = {'json': JsonFormat, 'binary': BinaryFormat}
+
+
+def get_format(name: str, compression: str = 'zlib'):
+    """Create a cache format by name.
+
+    Args:
+        name (str): 'json' or 'binary'
+        compression (str): Compression used by the binary format
+
+    Returns:
+        The format instance
+    """
+    if name == 'binary':
+        return BinaryFormat(compression)
+    if name == 'json':
+        return JsonFormat()
+    raise ValueError(f"Unknown cache format {name!r}, expected one of {tuple(FORMATS)}")
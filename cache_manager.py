@@ -1,22 +1,339 @@
 import os
 import json
 import time
-from datetime import datetime, timedelta
+import threading
+import heapq
+import lzma
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
 import hashlib
-from typing import Optional, Dict, Any
+import sqlite3
+import tempfile
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+from cache_formats import BinaryFormat, JsonFormat, get_format
+
+# Errors that mean a cache file is missing, partially written or unreadable
+_READ_ERRORS = (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError,
+                UnicodeDecodeError, EOFError, struct.error, zlib.error, lzma.LZMAError)
+
+# Prefix of files being written; they only become entries once renamed
+_TEMP_PREFIX = '.tmp-'
+
+# SQLite index of the entries on disk, kept inside the cache directory
+_INDEX_FILENAME = 'entries.sqlite3'
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    written_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_by_written_at ON entries (written_at);
+CREATE INDEX IF NOT EXISTS entries_by_accessed_at ON entries (accessed_at);
+"""
+
+def _estimate_size(value: Any) -> int:
+    """Estimate the bytes a decoded value holds in memory.
+    
+    Counts the containers together with every key and item, so a frequency
+    table is charged for its strings and ints rather than for its much
+    smaller compressed size on disk.
+    
+    Args:
+        value (Any): Decoded cache value
+        
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+class MemoryCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        """Initialize a bounded in-process LRU cache.
+        
+        Args:
+            max_entries (int): Maximum number of entries, 0 disables the cache
+            max_bytes (int): Maximum approximate size of all entries in bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[float, Any, int]]' = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _remove(self, key: str) -> None:
+        """Remove an entry; the lock must be held."""
+        _, _, size = self._entries.pop(key)
+        self._size_bytes -= size
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value and mark it as most recently used.
+        
+        Args:
+            key (str): Cache key
+            
+        Returns:
+            Optional[Any]: Cached value if present and not expired, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if time.time() >= expires_at:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any, size: int, expires_at: float) -> None:
+        """Store a value, evicting least recently used entries to make room.
+        
+        Args:
+            key (str): Cache key
+            value (Any): Value to store
+            size (int): Approximate in-memory size of the value in bytes
+            expires_at (float): Unix time after which the value is stale
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            while self._entries and (len(self._entries) >= self.max_entries
+                                     or self._size_bytes + size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (expires_at, value, size)
+            self._size_bytes += size
+    
+    def delete(self, key: str) -> None:
+        """Drop a value if present.
+        
+        Args:
+            key (str): Cache key
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memory tier statistics.
+        
+        Returns:
+            dict: Entry count, size, limits and hit/miss/eviction counters
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+class EntryIndex:
+    def __init__(self, path: str):
+        """Open the index of cache entries on disk.
+        
+        Entries are indexed by write time, so expired ones are found without
+        reading any cache file, and by last access, for size-bounded LRU
+        eviction. Hit counts, decayed over time, tell which keys are popular.
+        The index is shared by every process using the directory. Accesses
+        are buffered in memory and written in batches, so reads do not pay
+        for a database write.
+        
+        Args:
+            path (str): SQLite database file, created if missing
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(_INDEX_SCHEMA)
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(entries)')]
+            if 'hits' not in columns:
+                self._conn.execute("ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        # Whether the directory has never been indexed
+        self.is_new = self._conn.execute('PRAGMA user_version').fetchone()[0] == 0
+        # Key -> (last access time, accesses since the last flush)
+        self._accessed: Dict[str, Tuple[float, int]] = {}
+    
+    def mark_indexed(self) -> None:
+        """Record that every existing entry has been added to the index."""
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA user_version = 1')
+        self.is_new = False
+    
+    def record(self, key: str, filename: str, written_at: float, size: int) -> None:
+        """Add or replace the entry for a key, keeping its hit count."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO entries (key, filename, written_at, accessed_at, size) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET filename = excluded.filename, "
+                "written_at = excluded.written_at, accessed_at = excluded.accessed_at, size = excluded.size",
+                (key, filename, written_at, time.time(), size))
+    
+    def touch(self, key: str) -> None:
+        """Note that an entry was read."""
+        with self._lock:
+            _, hits = self._accessed.get(key, (0.0, 0))
+            self._accessed[key] = (time.time(), hits + 1)
+    
+    def _flush(self) -> None:
+        """Write buffered accesses; the lock must be held."""
+        if self._accessed:
+            accessed, self._accessed = self._accessed, {}
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = MAX(accessed_at, ?), hits = hits + ? WHERE key = ?",
+                    [(at, hits, key) for key, (at, hits) in accessed.items()])
+    
+    def remove(self, key: str, written_before: Optional[float] = None) -> bool:
+        """Drop the entry for a key, only if written before `written_before` when given.
+        
+        Returns:
+            bool: True if an entry was dropped
+        """
+        with self._lock, self._conn:
+            if written_before is None:
+                cursor = self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            else:
+                cursor = self._conn.execute("DELETE FROM entries WHERE key = ? AND written_at < ?",
+                                            (key, written_before))
+            return cursor.rowcount > 0
+    
+    def written_at(self, key: str) -> Optional[float]:
+        """Get the write time of a key's entry, or None if it is not indexed."""
+        with self._lock:
+            row = self._conn.execute("SELECT written_at FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+    
+    def written_before(self, cutoff: float, limit: int) -> List[Tuple[str, str]]:
+        """Get up to `limit` (key, filename) pairs of entries written before `cutoff`, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, filename FROM entries WHERE written_at < ? ORDER BY written_at LIMIT ?",
+                (cutoff, limit)).fetchall()
+    
+    def least_recently_used(self, limit: int) -> List[Tuple[str, str, int]]:
+        """Get up to `limit` (key, filename, size) triples, least recently used first."""
+        with self._lock:
+            self._flush()
+            return self._conn.execute(
+                "SELECT key, filename, size FROM entries ORDER BY accessed_at LIMIT ?",
+                (limit,)).fetchall()
+    
+    def popular(self, limit: int) -> List[Tuple[str, float, int]]:
+        """Get up to `limit` (key, written_at, hits) triples of the most read entries."""
+        with self._lock:
+            self._flush()
+            return self._conn.execute(
+                "SELECT key, written_at, hits FROM entries WHERE hits > 0 ORDER BY hits DESC LIMIT ?",
+                (limit,)).fetchall()
+    
+    def decay_hits(self, factor: float = 0.5) -> None:
+        """Scale every hit count down, so popularity follows recent use."""
+        with self._lock, self._conn:
+            self._flush()
+            self._conn.execute("UPDATE entries SET hits = CAST(hits * ? AS INTEGER)", (factor,))
+    
+    def size_bytes(self) -> int:
+        """Get the total size of the indexed entries."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    
+    def flush(self) -> None:
+        """Write buffered access times."""
+        with self._lock:
+            self._flush()
+    
+    def close(self) -> None:
+        """Write buffered access times and close the database."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
 
 class CacheManager:
-    def __init__(self, cache_dir: str = 'cache', expiration_hours: int = 24):
+    # Seconds a directory scan for get_stats is reused
+    STATS_TTL = 2.0
+    
+    def __init__(self, cache_dir: str = 'cache', expiration_hours: int = 24,
+                 memory_max_entries: int = 256, memory_max_bytes: int = 64 * 1024 * 1024,
+                 cache_format: str = 'json', compression: str = 'zlib', max_bytes: int = 0,
+                 max_stale_hours: float = 0):
         """Initialize the cache manager.
         
         Args:
             cache_dir (str): Directory to store cache files
             expiration_hours (int): Number of hours before cache expires
+            memory_max_entries (int): Entries kept in the in-memory tier, 0 disables it
+            memory_max_bytes (int): Approximate bytes kept in the in-memory tier
+            cache_format (str): 'json' or 'binary' for new entries; both are always readable
+            compression (str): 'zlib', 'lzma' or 'none' for the binary format
+            max_bytes (int): Size of the entries on disk above which the least
+                recently used are evicted, 0 for no limit
+            max_stale_hours (float): Hours after expiring that an entry is kept
+                and can still be read with get_entry while it is refreshed
         """
         self.cache_dir = os.path.join(os.path.dirname(__file__), cache_dir)
         self.expiration_hours = expiration_hours
+        self.max_stale_hours = max_stale_hours
+        self.memory = MemoryCache(memory_max_entries, memory_max_bytes)
+        self.format = get_format(cache_format, compression)
+        # Formats to look for, the configured one first
+        self._formats = [self.format] + [fmt for fmt in (BinaryFormat(compression), JsonFormat())
+                                         if fmt.extension != self.format.extension]
+        self._stats: Optional[Tuple[float, int, int]] = None
+        self._stats_lock = threading.Lock()
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._delete_listeners: List[Callable[[str], None]] = []
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._cleaner: Optional[threading.Thread] = None
+        self._stop_cleaner = threading.Event()
         self._ensure_cache_dir()
+        self.index = EntryIndex(os.path.join(self.cache_dir, _INDEX_FILENAME))
+        if self.index.is_new:
+            self._index_existing()
         
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Call `callback(key, value)` after each value is written by set.
+        
+        Callbacks run in the writing thread, so slow work should be handed
+        off to a worker.
+        """
+        self._listeners.append(callback)
+    
+    def add_delete_listener(self, callback: Callable[[str], None]) -> None:
+        """Call `callback(key)` after an entry is deleted, evicted or cleaned up."""
+        self._delete_listeners.append(callback)
+    
+    def _notify_delete(self, key: str) -> None:
+        for callback in self._delete_listeners:
+            callback(key)
+    
     def _ensure_cache_dir(self) -> None:
         """Create cache directory if it doesn't exist."""
         os.makedirs(self.cache_dir, exist_ok=True)
@@ -26,23 +343,83 @@ class CacheManager:
         if not os.path.exists(metadata_file):
             self._save_metadata({
                 'created_at': datetime.now().isoformat(),
-                'last_cleanup': datetime.now().isoformat(),
-                'total_entries': 0,
-                'size_bytes': 0
+                'last_cleanup': datetime.now().isoformat()
             })
     
-    def _get_cache_path(self, key: str) -> str:
+    def _index_existing(self) -> None:
+        """Add the entries already on disk to a new index; runs once per directory."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                cache_format = self._format_for(entry.name)
+                if cache_format is None:
+                    continue
+                try:
+                    with open(entry.path, 'rb') as f:
+                        timestamp, key = cache_format.read_header(f)
+                    self.index.record(key, entry.name, timestamp, entry.stat().st_size)
+                except _READ_ERRORS:
+                    continue
+        self.index.mark_indexed()
+    
+    def _get_cache_path(self, key: str, cache_format=None) -> str:
         """Get the file path for a cache key.
         
         Args:
             key (str): Cache key
+            cache_format (optional): Format whose file extension to use, defaults to the configured one
             
         Returns:
             str: Path to cache file
         """
         # Create a hash of the key to use as filename
         hashed_key = hashlib.md5(key.encode()).hexdigest()
-        return os.path.join(self.cache_dir, f"{hashed_key}.json")
+        extension = (cache_format or self.format).extension
+        return os.path.join(self.cache_dir, f"{hashed_key}{extension}")
+    
+    def _format_for(self, filename: str):
+        """Get the format a cache file was written in, or None if it is not an entry."""
+        if filename == 'metadata.json' or filename.startswith(_TEMP_PREFIX):
+            return None
+        for cache_format in self._formats:
+            if filename.endswith(cache_format.extension):
+                return cache_format
+        return None
+    
+    def _is_expired(self, timestamp: float, max_age_hours: Optional[float] = None) -> bool:
+        """Check whether an entry written at `timestamp` has expired."""
+        max_age = max_age_hours or self.expiration_hours
+        return time.time() - timestamp > max_age * 3600
+    
+    def _is_dead(self, timestamp: float) -> bool:
+        """Check whether an entry written at `timestamp` is too old to serve even stale."""
+        return self._is_expired(timestamp, self.expiration_hours + self.max_stale_hours)
+    
+    def _write_atomic(self, path: str, write: Callable[[Any], None]) -> int:
+        """Write a file so readers only ever see the old or the new version.
+        
+        The data goes to a temporary file in the cache directory, which is
+        then renamed over `path`.
+        
+        Args:
+            path (str): Destination file
+            write (callable): Writes the contents to the binary file object it is given
+            
+        Returns:
+            int: Size of the written file in bytes
+        """
+        fd, temp_path = tempfile.mkstemp(prefix=_TEMP_PREFIX, dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                size = f.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return size
     
     def _save_metadata(self, metadata: Dict[str, Any]) -> None:
         """Save cache metadata.
@@ -51,8 +428,8 @@ class CacheManager:
             metadata (dict): Metadata to save
         """
         metadata_file = os.path.join(self.cache_dir, 'metadata.json')
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
+        data = json.dumps(metadata, indent=2).encode('utf-8')
+        self._write_atomic(metadata_file, lambda f: f.write(data))
     
     def _load_metadata(self) -> Dict[str, Any]:
         """Load cache metadata.
@@ -64,77 +441,221 @@ class CacheManager:
         try:
             with open(metadata_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except FileNotFoundError:
+        except (FileNotFoundError, json.JSONDecodeError):
             return {
                 'created_at': datetime.now().isoformat(),
-                'last_cleanup': datetime.now().isoformat(),
-                'total_entries': 0,
-                'size_bytes': 0
+                'last_cleanup': datetime.now().isoformat()
             }
     
-    def _update_metadata(self, size_change: int = 0, entries_change: int = 0) -> None:
-        """Update cache metadata.
+    def _scan_entries(self) -> Tuple[int, int]:
+        """Count the entries on disk and their total size.
         
-        Args:
-            size_change (int): Change in cache size in bytes
-            entries_change (int): Change in number of entries
+        The directory is the source of truth, so the result stays correct
+        whichever thread or process wrote the files. A scan is reused for
+        STATS_TTL seconds unless this process changes the cache meanwhile.
+        
+        Returns:
+            tuple: (number of entries, size in bytes)
         """
-        metadata = self._load_metadata()
-        metadata['total_entries'] += entries_change
-        metadata['size_bytes'] += size_change
-        self._save_metadata(metadata)
+        with self._stats_lock:
+            if self._stats is not None and time.monotonic() - self._stats[0] < self.STATS_TTL:
+                return self._stats[1], self._stats[2]
+        
+        scanned_at = time.monotonic()
+        entries = 0
+        size_bytes = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if self._format_for(entry.name) is None:
+                    continue
+                try:
+                    size_bytes += entry.stat().st_size
+                    entries += 1
+                except FileNotFoundError:
+                    continue
+        
+        with self._stats_lock:
+            self._stats = (scanned_at, entries, size_bytes)
+        return entries, size_bytes
+    
+    def _invalidate_stats(self) -> None:
+        """Make the next get_stats rescan the directory."""
+        with self._stats_lock:
+            self._stats = None
     
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         """Get value from cache.
         
+        Hot entries are served from the in-memory tier without touching the
+        disk; misses read the file and populate the memory tier.
+        
         Args:
             key (str): Cache key
             
         Returns:
             Optional[dict]: Cached value if exists and not expired, None otherwise
         """
-        cache_path = self._get_cache_path(key)
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+    
+    def get_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """Get a value from cache along with whether it has expired.
         
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+        Expired entries are returned until they are `max_stale_hours` past
+        expiry, so callers can serve them while refreshing. Only unexpired
+        values enter the in-memory tier.
+        
+        Args:
+            key (str): Cache key
+            
+        Returns:
+            Optional[tuple]: (value, is_stale), or None if missing or too old
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self.index.touch(key)
+            return value, False
+        
+        for cache_format in self._formats:
+            cache_path = self._get_cache_path(key, cache_format)
+            try:
+                with open(cache_path, 'rb') as f:
+                    if cache_format.has_header:
+                        # Check if cache has expired before decoding the body
+                        timestamp, _ = cache_format.read_header(f)
+                        if self._is_dead(timestamp):
+                            self.delete(key)
+                            return None
+                        f.seek(0)
+                    timestamp, _, value = cache_format.read(f)
+                    if self._is_dead(timestamp):
+                        self.delete(key)
+                        return None
                 
-            # Check if cache has expired
-            cache_time = datetime.fromisoformat(cache_data['timestamp'])
-            if datetime.now() - cache_time > timedelta(hours=self.expiration_hours):
-                self.delete(key)
-                return None
+                stale = self._is_expired(timestamp)
+                if not stale:
+                    expires_at = timestamp + self.expiration_hours * 3600
+                    self.memory.set(key, value, _estimate_size(value), expires_at)
+                self.index.touch(key)
+                return value, stale
                 
-            return cache_data['data']
+            except _READ_ERRORS:
+                continue
+        return None
+    
+    def entry_info(self, key: str) -> Optional[Tuple[float, bool]]:
+        """Get when an entry was written without reading it.
+        
+        Looks the key up in the index only, so it is cheap enough to
+        validate responses derived from the entry. Counts as a read.
+        
+        Args:
+            key (str): Cache key
             
-        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        Returns:
+            Optional[tuple]: (written_at, is_stale), or None if missing or too old
+        """
+        written_at = self.index.written_at(key)
+        if written_at is None or self._is_dead(written_at):
             return None
+        self.index.touch(key)
+        return written_at, self._is_expired(written_at)
+    
+    def get_top(self, key: str, top_k: int,
+                predicate: Optional[Callable[[str, int], bool]] = None) -> Optional[List[Tuple[str, int]]]:
+        """Get the most frequent entries of a cached frequency table.
+        
+        Binary entries are stored sorted by count, so only as much of the
+        file as is needed to find `top_k` matching words gets decompressed.
+        
+        Args:
+            key (str): Cache key
+            top_k (int): Number of (word, count) pairs to return
+            predicate (callable, optional): Only keep pairs for which predicate(word, count) is true
+            
+        Returns:
+            Optional[list]: (word, count) pairs, most frequent first, or None if not cached
+        """
+        predicate = predicate or (lambda word, count: True)
+        value = self.memory.get(key)
+        if value is not None:
+            self.index.touch(key)
+            matching = ((word, count) for word, count in value.items() if predicate(word, count))
+            return heapq.nlargest(top_k, matching, key=lambda item: item[1])
+        
+        for cache_format in self._formats:
+            try:
+                with open(self._get_cache_path(key, cache_format), 'rb') as f:
+                    timestamp, _ = cache_format.read_header(f)
+                    if self._is_dead(timestamp):
+                        self.delete(key)
+                        return None
+                    if self._is_expired(timestamp):
+                        return None
+                    f.seek(0)
+                    matching = ((word, count) for word, count in cache_format.iter_items(f)
+                                if predicate(word, count))
+                    top = list(islice(matching, top_k))
+                self.index.touch(key)
+                return top
+            except _READ_ERRORS:
+                continue
+        return None
     
     def set(self, key: str, value: Dict[str, Any]) -> None:
         """Set value in cache.
         
+        The value is written to disk and kept in the in-memory tier.
+        Values the configured format cannot hold are written as JSON.
+        
         Args:
             key (str): Cache key
             value (dict): Value to cache
         """
-        cache_path = self._get_cache_path(key)
-        cache_data = {
-            'timestamp': datetime.now().isoformat(),
-            'data': value,
-            'key': key
-        }
+        cache_format = self.format if self.format.can_store(value) else JsonFormat()
+        cache_path = self._get_cache_path(key, cache_format)
+        now = time.time()
         
-        # Calculate size change
-        old_size = os.path.getsize(cache_path) if os.path.exists(cache_path) else 0
+        new_size = self._write_atomic(cache_path, lambda f: cache_format.write(f, key, now, value))
         
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2)
-            
-        new_size = os.path.getsize(cache_path)
-        self._update_metadata(
-            size_change=new_size - old_size,
-            entries_change=0 if os.path.exists(cache_path) else 1
-        )
+        # Drop a copy in another format so it cannot shadow the new entry
+        for other_format in self._formats:
+            other_path = self._get_cache_path(key, other_format)
+            if other_path != cache_path:
+                try:
+                    os.remove(other_path)
+                except FileNotFoundError:
+                    pass
+        self.index.record(key, os.path.basename(cache_path), now, new_size)
+        self._invalidate_stats()
+        if self.max_bytes:
+            self._evict(keep=key)
+        
+        expires_at = now + self.expiration_hours * 3600
+        self.memory.set(key, value, _estimate_size(value), expires_at)
+        for callback in self._listeners:
+            callback(key, value)
+    
+    def iter_entries(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Read every unexpired entry on disk, bypassing the memory tier.
+        
+        Returns:
+            Iterator[tuple]: (key, value) pairs in no particular order
+        """
+        with os.scandir(self.cache_dir) as it:
+            entries = [(entry.path, self._format_for(entry.name)) for entry in it]
+        for path, cache_format in entries:
+            if cache_format is None:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    timestamp, key, value = cache_format.read(f)
+            except _READ_ERRORS:
+                continue
+            if not self._is_expired(timestamp):
+                yield key, value
     
     def delete(self, key: str) -> bool:
         """Delete value from cache.
@@ -145,60 +666,177 @@ class CacheManager:
         Returns:
             bool: True if value was deleted, False otherwise
         """
-        cache_path = self._get_cache_path(key)
-        try:
-            size = os.path.getsize(cache_path)
-            os.remove(cache_path)
-            self._update_metadata(size_change=-size, entries_change=-1)
-            return True
-        except FileNotFoundError:
-            return False
-    
-    def cleanup(self, max_age_hours: Optional[int] = None) -> int:
+        self.memory.delete(key)
+        self.index.remove(key)
+        deleted = False
+        for cache_format in self._formats:
+            cache_path = self._get_cache_path(key, cache_format)
+            try:
+                os.remove(cache_path)
+                deleted = True
+            except FileNotFoundError:
+                continue
+        self._invalidate_stats()
+        self._notify_delete(key)
+        return deleted
+    
+    def _evict(self, keep: str) -> None:
+        """Remove least recently used entries once the cache is over max_bytes.
+        
+        Entries are removed until the cache is a tenth below the limit, so a
+        full cache does not evict on every write.
+        
+        Args:
+            keep (str): Key of the entry just written, which is never evicted
+        """
+        total = self.index.size_bytes()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        while total > target:
+            evicted = False
+            for key, filename, size in self.index.least_recently_used(50):
+                if total <= target:
+                    break
+                if key == keep:
+                    continue
+                self.memory.delete(key)
+                self.index.remove(key)
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except FileNotFoundError:
+                    pass
+                self._notify_delete(key)
+                total -= size
+                self.evictions += 1
+                evicted = True
+            if not evicted:
+                break
+        self._invalidate_stats()
+    
+    def _remove_expired(self, cutoff: float, deadline: Optional[float] = None) -> Tuple[int, bool]:
+        """Remove entries written before `cutoff`, found through the index.
+        
+        Args:
+            cutoff (float): Unix time before which entries have expired
+            deadline (float, optional): time.monotonic() value at which to stop
+            
+        Returns:
+            tuple: (number of entries removed, whether no expired entries are left)
+        """
+        removed = 0
+        while deadline is None or time.monotonic() < deadline:
+            batch = self.index.written_before(cutoff, 100)
+            if not batch:
+                return removed, True
+            for key, filename in batch:
+                # Skipped if another process rewrote the entry meanwhile
+                if not self.index.remove(key, written_before=cutoff):
+                    continue
+                self.memory.delete(key)
+                self._notify_delete(key)
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            self._invalidate_stats()
+        return removed, False
+    
+    def cleanup(self, max_age_hours: Optional[int] = None, time_budget: Optional[float] = None) -> int:
         """Clean up expired cache entries.
         
+        Expired entries are looked up in the index, so no cache file is
+        read. Without a time budget, temporary files left behind by
+        interrupted writes are removed too.
+        
         Args:
-            max_age_hours (int, optional): Override default expiration time
+            max_age_hours (int, optional): Override the default age at which entries
+                are removed, expiration_hours plus max_stale_hours
+            time_budget (float, optional): Seconds after which to stop, leaving
+                the remaining entries for a later call
             
         Returns:
             int: Number of entries cleaned up
         """
-        max_age = max_age_hours or self.expiration_hours
-        cleaned = 0
+        cutoff = time.time() - (max_age_hours or self.expiration_hours + self.max_stale_hours) * 3600
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        cleaned, finished = self._remove_expired(cutoff, deadline)
         
-        for filename in os.listdir(self.cache_dir):
-            if filename == 'metadata.json':
-                continue
-                
-            file_path = os.path.join(self.cache_dir, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                
-                cache_time = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.now() - cache_time > timedelta(hours=max_age):
-                    size = os.path.getsize(file_path)
-                    os.remove(file_path)
-                    self._update_metadata(size_change=-size, entries_change=-1)
-                    cleaned += 1
-                    
-            except (FileNotFoundError, json.JSONDecodeError, KeyError):
-                continue
+        if time_budget is None:
+            # Writes finish in well under an hour, so old ones were abandoned
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.startswith(_TEMP_PREFIX):
+                        continue
+                    try:
+                        if time.time() - entry.stat().st_mtime > 3600:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
         
-        # Update last cleanup time
-        metadata = self._load_metadata()
-        metadata['last_cleanup'] = datetime.now().isoformat()
-        self._save_metadata(metadata)
+        if finished:
+            # Update last cleanup time
+            metadata = self._load_metadata()
+            metadata['last_cleanup'] = datetime.now().isoformat()
+            self._save_metadata(metadata)
         
         return cleaned
     
+    def start_background_cleanup(self, interval: float = 300, time_slice: float = 0.05) -> None:
+        """Remove expired entries on a daemon thread.
+        
+        Every `interval` seconds, expired entries are removed in slices of
+        at most `time_slice` seconds, pausing as long between slices, and
+        buffered access times are written to the index.
+        
+        Args:
+            interval (float): Seconds between cleanup passes
+            time_slice (float): Longest stretch of work at a time
+        """
+        if self._cleaner is not None:
+            return
+        
+        def run():
+            while not self._stop_cleaner.wait(interval):
+                try:
+                    finished = False
+                    while not finished:
+                        cutoff = time.time() - (self.expiration_hours + self.max_stale_hours) * 3600
+                        _, finished = self._remove_expired(cutoff, time.monotonic() + time_slice)
+                        if self._stop_cleaner.wait(time_slice):
+                            return
+                    self.index.flush()
+                except (OSError, sqlite3.Error):
+                    # Retried on the next pass
+                    continue
+        
+        self._stop_cleaner.clear()
+        self._cleaner = threading.Thread(target=run, name='cache-cleanup', daemon=True)
+        self._cleaner.start()
+    
+    def stop_background_cleanup(self) -> None:
+        """Stop the background cleanup thread and wait for it."""
+        if self._cleaner is not None:
+            self._stop_cleaner.set()
+            self._cleaner.join()
+            self._cleaner = None
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics.
         
+        Entry counts and sizes come from a scan of the cache directory.
+        
         Returns:
             dict: Cache statistics
         """
         metadata = self._load_metadata()
+        metadata['total_entries'], metadata['size_bytes'] = self._scan_entries()
         metadata['cache_dir'] = self.cache_dir
         metadata['expiration_hours'] = self.expiration_hours
+        metadata['max_stale_hours'] = self.max_stale_hours
+        metadata['format'] = self.format.name
+        metadata['max_bytes'] = self.max_bytes
+        metadata['evictions'] = self.evictions
+        metadata['memory'] = self.memory.get_stats()
         return metadata
@@ -0,0 +1,246 @@
+from collections import Counter
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import metrics
+from bounded_counter import BoundedCounter
+from config import Config
+from page_store import PageStore
+from parallel_analyzer import iter_text_frequencies
+from text_analyzer import analyzer_fingerprint
+from wiki_api import (MAX_TITLES_PER_REQUEST, iter_category_members, iter_page_revisions,
+                      iter_pages_content)
+
+# Page counts are written to the store in batches of this many pages
+_STORE_BATCH = 200
+
+
+def category_cache_key(category: str, depth: int, analyzer: Optional[str] = None) -> str:
+    """Get the key an analysis of `category` down to `depth` is cached under.
+
+    Keys end in the analyzer's fingerprint, so after a configuration change
+    every analysis misses and is counted again, from cached text.
+    """
+    key = category if depth == 0 else f"{category}|depth={depth}"
+    return f"{key}|analyzer={analyzer_fingerprint(analyzer)}"
+
+
+def parse_cache_key(cache_key: str) -> Tuple[str, int]:
+    """Get the (category, depth) an analysis cache key was made from."""
+    key, separator, _ = cache_key.rpartition('|analyzer=')
+    key = key if separator else cache_key
+    category, separator, depth = key.rpartition('|depth=')
+    if separator and depth.isdigit():
+        return category, int(depth)
+    return key, 0
+
+
+def _subtract(totals: Counter, counts: Dict[str, int]) -> None:
+    """Remove a page's counts from the totals in place, dropping emptied words."""
+    for word, count in counts.items():
+        remaining = totals[word] - count
+        if remaining > 0:
+            totals[word] = remaining
+        else:
+            del totals[word]
+
+
+def _recount(store: PageStore, pages: Dict[str, int], analyzer: str,
+             words: Optional[Counter] = None, max_words: int = 0) -> BoundedCounter:
+    """Total the stored counts of pages, streaming them from the store.
+
+    With `words`, only those words are counted, which turns pruned
+    approximate counts back into exact ones.
+    """
+    totals = BoundedCounter(max_words)
+    for _, counts in store.iter_pages({title: revid for title, revid in pages.items() if revid},
+                                      analyzer):
+        if words is not None:
+            counts = {word: count for word, count in counts.items() if word in words}
+        totals.update(counts)
+    return totals
+
+
+def total_pages(store: PageStore, pages: Dict[str, int], analyzer: str,
+                max_words: Optional[int] = None, tolerance: Optional[int] = None
+                ) -> Tuple[Counter, int]:
+    """Total the stored counts of pages within the vocabulary budget.
+
+    Like the end of `analyze_category`: if pruning leaves an error bound
+    above `tolerance`, the words that were kept are recounted exactly.
+
+    Args:
+        store (PageStore): Page store holding the counts
+        pages (dict): Mapping of title to revision id
+        analyzer (str): Fingerprint of the analyzer the counts were produced with
+        max_words (int, optional): Vocabulary budget, Config.AGGREGATION_MAX_WORDS by default
+        tolerance (int, optional): Error bound allowed without a recount,
+            Config.AGGREGATION_TOLERANCE by default
+
+    Returns:
+        tuple: (frequencies, error_bound)
+    """
+    max_words = Config.AGGREGATION_MAX_WORDS if max_words is None else max_words
+    tolerance = Config.AGGREGATION_TOLERANCE if tolerance is None else tolerance
+    totals = _recount(store, pages, analyzer, max_words=max_words)
+    error_bound = totals.error
+    if totals.approximate and error_bound > tolerance:
+        totals = _recount(store, pages, analyzer, words=totals)
+    return totals, error_bound
+
+
+def analyze_category(category: str, depth: int, cache_key: str, store: PageStore,
+                     analyzer: Optional[str] = None,
+                     progress: Optional[Callable[[Dict[str, int], Counter], None]] = None,
+                     max_words: Optional[int] = None, tolerance: Optional[int] = None
+                     ) -> Optional[Dict[str, Any]]:
+    """Compute the word frequencies of a category, reusing earlier work.
+
+    Only the current revision ids of the category's pages are requested up
+    front. Pages whose revision is already in the page store (from this or
+    any other category) are not downloaded again, and when the category was
+    analyzed before, its previous totals are adjusted by subtracting the
+    counts of changed or removed pages and adding those of new revisions.
+    Every stage streams, so downloads start while the category tree and
+    revision ids are still being fetched.
+
+    At most `max_words` distinct words are held while merging; see
+    `BoundedCounter` for the error bound that pruning the tail introduces.
+    If that bound ends up above `tolerance`, the words that were kept are
+    recounted exactly from the page store, so every returned word has its
+    exact count and any word left out occurs at most 'error_bound' times.
+
+    Args:
+        category (str): Category name without the `Category:` prefix
+        depth (int): Subcategory levels to include
+        cache_key (str): Key the totals are recorded under
+        store (PageStore): Page and manifest store
+        analyzer (str, optional): Analyzer passed to `analyze_text`; counts are
+            stored under its `analyzer_fingerprint`
+        progress (callable, optional): Called as progress(stats, totals) whenever
+            pages are discovered or analyzed, with 'discovered', 'fetched' and
+            'analyzed' page counts and the running totals. It runs on the
+            calling thread and must not keep a reference to `totals`.
+        max_words (int, optional): Vocabulary budget, Config.AGGREGATION_MAX_WORDS by default
+        tolerance (int, optional): Error bound allowed without a recount,
+            Config.AGGREGATION_TOLERANCE by default
+
+    Returns:
+        Optional[dict]: 'frequencies', 'processed_pages', 'fetched_pages' and
+        'error_bound' (0 when the counts are complete), or None if the
+        category has no pages
+    """
+    analyzer = analyzer or Config.TEXT_ANALYZER
+    fingerprint = analyzer_fingerprint(analyzer)
+    max_words = Config.AGGREGATION_MAX_WORDS if max_words is None else max_words
+    tolerance = Config.AGGREGATION_TOLERANCE if tolerance is None else tolerance
+    report = progress or (lambda stats, totals: None)
+    stats = {'discovered': 0, 'fetched': 0, 'analyzed': 0}
+
+    with metrics.phase('page_store'):
+        manifest = store.get_manifest(cache_key, fingerprint)
+    old_pages = manifest[0] if manifest is not None else {}
+    totals = BoundedCounter(max_words)
+    if manifest is not None:
+        totals.update(manifest[1])
+    # Cleared if an old page revision was pruned, which means the totals
+    # must be rebuilt from the page counts at the end
+    adjustable = True
+    revisions: Dict[str, int] = {}
+    to_fetch: Dict[str, int] = {}
+
+    def pages_to_fetch() -> Iterator[str]:
+        """Classify pages as their revision ids arrive, yielding those to download."""
+        nonlocal adjustable
+        members = metrics.timed_iter('members', iter_category_members(category, max_depth=depth))
+        revision_results = metrics.timed_iter('revisions', iter_page_revisions(members))
+        while True:
+            batch = list(islice(revision_results, MAX_TITLES_PER_REQUEST))
+            if not batch:
+                break
+            revisions.update(batch)
+            stats['discovered'] += len(batch)
+
+            outdated = {title: old_pages[title] for title, revid in batch
+                        if old_pages.get(title) and old_pages[title] != revid}
+            added = {title: revid for title, revid in batch
+                     if revid and old_pages.get(title) != revid}
+            with metrics.phase('page_store'):
+                old_counts = store.get_pages(outdated, fingerprint)
+                # Reuse pages other categories have already analyzed at this revision
+                stored = store.get_pages(added, fingerprint)
+            if len(old_counts) < len(outdated):
+                adjustable = False
+
+            with metrics.phase('merge'):
+                for counts in old_counts.values():
+                    _subtract(totals, counts)
+                for counts in stored.values():
+                    totals.update(counts)
+            stats['analyzed'] += len(stored)
+            metrics.PAGES.inc(len(batch) - len(added), source='unchanged')
+            metrics.PAGES.inc(len(stored), source='page_store')
+            report(stats, totals)
+
+            for title, revid in added.items():
+                if title not in stored:
+                    to_fetch[title] = revid
+                    yield title
+
+    def count_fetched(pages: Iterator[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        for title, text in pages:
+            stats['fetched'] += 1
+            metrics.PAGES.inc(source='fetched')
+            metrics.TOKENIZED_CHARS.inc(len(text))
+            yield title, text
+
+    # Download and analyze the rest, recording each page for later refreshes
+    batch = []
+    pages = count_fetched(metrics.timed_iter('fetch', iter_pages_content(pages_to_fetch(), to_fetch)))
+    for title, counts in metrics.timed_iter('tokenize', iter_text_frequencies(pages, analyzer)):
+        with metrics.phase('merge'):
+            totals.update(counts)
+        batch.append((title, to_fetch[title], counts))
+        if len(batch) >= _STORE_BATCH:
+            with metrics.phase('page_store'):
+                store.put_pages(batch, fingerprint)
+            batch = []
+        stats['analyzed'] += 1
+        report(stats, totals)
+    if batch:
+        with metrics.phase('page_store'):
+            store.put_pages(batch, fingerprint)
+
+    if not revisions:
+        return None
+
+    removed = {title: revid for title, revid in old_pages.items()
+               if revid and title not in revisions}
+    with metrics.phase('page_store'):
+        removed_counts = store.get_pages(removed, fingerprint)
+    if len(removed_counts) < len(removed):
+        adjustable = False
+
+    with metrics.phase('merge'):
+        for counts in removed_counts.values():
+            _subtract(totals, counts)
+        if not adjustable:
+            totals = _recount(store, revisions, fingerprint, max_words=max_words)
+        error_bound = totals.error
+        if totals.approximate and error_bound > tolerance:
+            totals = _recount(store, revisions, fingerprint, words=totals)
+        # Counter is a dict already; a copy would double the peak memory
+        frequencies = totals
+
+    with metrics.phase('page_store'):
+        if error_bound:
+            # Pruned totals cannot be adjusted on the next refresh
+            store.delete_manifest(cache_key, fingerprint)
+        else:
+            store.put_manifest(cache_key, fingerprint, revisions, frequencies)
+    return {
+        'frequencies': frequencies,
+        'processed_pages': list(revisions),
+        'fetched_pages': len(to_fetch),
+        'error_bound': error_bound
+    }
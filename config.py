@@ -8,14 +8,67 @@ class Config:
     # Cache Configuration
     CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
     CACHE_EXPIRATION_HOURS = 24
+    CACHE_MEMORY_MAX_ENTRIES = int(os.environ.get('CACHE_MEMORY_MAX_ENTRIES', 256))  # In-process LRU tier, 0 disables
+    CACHE_MEMORY_MAX_BYTES = int(os.environ.get('CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024))  # Estimated size of decoded values, not of files
+    CACHE_FORMAT = os.environ.get('CACHE_FORMAT', 'binary')  # 'binary' or 'json' for new entries
+    CACHE_COMPRESSION = os.environ.get('CACHE_COMPRESSION', 'zlib')  # 'zlib', 'lzma' or 'none'
+    CACHE_MAX_STALE_HOURS = float(os.environ.get('CACHE_MAX_STALE_HOURS', 72))  # Expired entries are served for this long while refreshed in the background
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 2 * 1024 ** 3))  # Least recently used entries are evicted above this, 0 disables
+    CACHE_CLEANUP_INTERVAL_SECONDS = 300  # Seconds between background removals of expired entries
+    CACHE_CLEANUP_SLICE_SECONDS = 0.05  # Longest stretch of background cleanup work at a time
+    PAGE_STORE_PATH = os.environ.get('PAGE_STORE_PATH') or os.path.join(CACHE_DIR, 'pages.sqlite3')  # Per-page word counts
+    PAGE_STORE_RETENTION_HOURS = 7 * 24  # Superseded page revisions and unused manifests are pruned after this
+    WORD_INDEX_PATH = os.environ.get('WORD_INDEX_PATH') or os.path.join(CACHE_DIR, 'index.sqlite3')  # Cross-category word index
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or os.path.join(CACHE_DIR, 'responses')  # Precompressed GET /analyze/<category> bodies
     
     # Wikipedia API Configuration
-    WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
-    WIKI_API_LIMIT = 500  # Maximum number of articles to fetch per category
-    
+    WIKI_API_URL = os.environ.get('WIKI_API_URL') or "https://en.wikipedia.org/w/api.php"  # fake_wiki_api.py serves an offline stand-in
+    WIKI_API_LIMIT = 500  # Category members requested per API call (500 is the API maximum)
+    CATEGORY_DEPTH = int(os.environ.get('CATEGORY_DEPTH', 0))  # Default subcategory depth to crawl
+    CATEGORY_MAX_DEPTH = int(os.environ.get('CATEGORY_MAX_DEPTH', 3))  # Deepest crawl a request may ask for
+    CATEGORY_MAX_PAGES = int(os.environ.get('CATEGORY_MAX_PAGES', 5000))  # Hard page budget per crawl
+    WIKI_USER_AGENT = os.environ.get('WIKI_USER_AGENT') or 'wikipedia-analyzer/0.1 (https://github.com/yourusername/wikipedia_analysis)'
+    WIKI_FETCH_WORKERS = int(os.environ.get('WIKI_FETCH_WORKERS', 8))  # Concurrent API requests
+    WIKI_REQUESTS_PER_SECOND = float(os.environ.get('WIKI_REQUESTS_PER_SECOND', 10))  # Per host, 0 disables
+    WIKI_MAX_RETRIES = 5  # Retries for 429 and 5xx responses
+    WIKI_BACKOFF_FACTOR = 0.5  # Seconds, doubled on every retry
+    WIKI_TIMEOUT = 30  # Seconds per request
+    WIKI_OFFLINE = os.environ.get('WIKI_OFFLINE', 'False').lower() in ('true', '1', 't')  # Serve API requests from API_CACHE_PATH only, never the network
+    API_CACHE_PATH = os.environ.get('API_CACHE_PATH', os.path.join(CACHE_DIR, 'api.sqlite3'))  # Raw API payloads, '' disables
+    API_CACHE_TTL_HOURS = float(os.environ.get('API_CACHE_TTL_HOURS', 7 * 24))  # Category listings and unversioned page texts are fetched again after this
+    API_CACHE_MAX_BYTES = int(os.environ.get('API_CACHE_MAX_BYTES', 4 * 1024 ** 3))  # Least recently used payloads are evicted above this, 0 disables
+
+    # Text Analysis Configuration
+    TEXT_ANALYZER = os.environ.get('TEXT_ANALYZER', 'fast')  # 'fast' (regex) or 'nltk' (word_tokenize)
+    PARALLEL_ANALYSIS_THRESHOLD = int(os.environ.get('PARALLEL_ANALYSIS_THRESHOLD', 5_000_000))  # Characters, 0 disables
+    PARALLEL_ANALYSIS_WORKERS = int(os.environ.get('PARALLEL_ANALYSIS_WORKERS', 0))  # 0 uses every CPU
+    PARALLEL_ANALYSIS_CHUNK_CHARS = 1_000_000  # Characters sent to a worker at a time
+    AGGREGATION_MAX_WORDS = int(os.environ.get('AGGREGATION_MAX_WORDS', 500_000))  # Distinct words held while merging a category, 0 is unbounded
+    AGGREGATION_TOLERANCE = int(os.environ.get('AGGREGATION_TOLERANCE', 0))  # Under-count allowed after pruning before kept words are recounted exactly
+    NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR') or os.path.join(os.path.dirname(__file__), 'nltk_data')  # Bundled resources, searched first
+    NLTK_DOWNLOAD = os.environ.get('NLTK_DOWNLOAD', 'True').lower() in ('true', '1', 't')  # Allow downloading missing resources
+
     # Word Cloud Configuration
     MAX_WORDS = 50  # Maximum number of words to show in cloud
     MIN_WORD_LENGTH = 3  # Minimum length of words to include
+    STREAM_SNAPSHOT_INTERVAL = 0.5  # Seconds between progress events on /analyze/stream
+    STREAM_KEEPALIVE_SECONDS = 10  # Idle seconds before /analyze/stream sends a blank line
+
+    # Background Job Configuration
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Analyses run at once for POST /analyze?async=1
+    JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 32))  # Waiting jobs before requests get a 429
+    JOB_RESULT_TTL_SECONDS = 3600  # How long finished jobs can be looked up
+    JOB_RETRY_AFTER_SECONDS = 30  # Retry-After sent with a 429
+    PREWARM_TOP_N = int(os.environ.get('PREWARM_TOP_N', 100))  # Most read categories re-analyzed off-peak, 0 disables
+    PREWARM_REQUEST_BUDGET = int(os.environ.get('PREWARM_REQUEST_BUDGET', 20000))  # Wikipedia API requests per pre-warm pass, 0 is unlimited
+    PREWARM_START_HOUR = int(os.environ.get('PREWARM_START_HOUR', 2))  # Local hour the off-peak window opens
+    PREWARM_END_HOUR = int(os.environ.get('PREWARM_END_HOUR', 6))  # Local hour it closes
+    PREWARM_CHECK_SECONDS = 600  # How often the scheduler looks for an open window
+
+    # ASGI Server Configuration (asgi.py)
+    ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 0))  # Server processes, 0 uses every CPU
+    ASGI_CRAWL_THREADS = int(os.environ.get('ASGI_CRAWL_THREADS', 16))  # Categories crawled at once per process, blocking a thread each; further ones queue
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))  # Threads for cache I/O, and as many again for the Flask routes
     
     # Development/Production Configs
     @staticmethod
@@ -0,0 +1,495 @@
+"""Fill the cache from local Wikipedia dumps instead of the live API.
+
+    python dump_ingest.py enwiki-latest-pages-articles-multistream.xml.bz2 \\
+        --index enwiki-latest-pages-articles-multistream-index.txt.bz2 \\
+        --categorylinks enwiki-latest-categorylinks.sql.gz
+    python dump_ingest.py extracts.jsonl.gz --categorylinks categorylinks.tsv --depth 1
+
+The pages come from a `pages-articles` XML dump (bz2, gzip or plain) or a
+plaintext dump with one JSON object per line carrying 'id', 'revid',
+'title' and 'text' (and optionally 'categories'), as written by
+WikiExtractor's --json mode. With the multistream index, the bz2 streams
+are decompressed and parsed on a process pool; without it the dump is read
+sequentially. Wikitext is reduced to plain text before counting, on the
+same pool, so parsing and tokenizing together use at most --workers
+processes.
+
+Category membership comes from the `categorylinks` SQL dump, or a file of
+tab-separated page id and category lines. Without either, the
+[[Category:...]] links in the wikitext are used, which misses categories
+added by templates.
+
+Per-page counts go into the page store under their revision ids, exactly as
+a live analysis stores them, so later refreshes over the API only download
+pages that changed since the dump. Then every category is totalled from the
+page store and written to the cache.
+"""
+import argparse
+import bz2
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from analyze_wiki_category import read_categories
+from cache_manager import CacheManager
+from category_analysis import category_cache_key, total_pages
+from config import Config
+from page_store import PageStore
+from parallel_analyzer import get_pool, iter_text_frequencies
+from text_analyzer import analyzer_fingerprint, prepare_analyzer
+from wiki_api import normalize_category
+from wikitext import strip_wikitext
+from word_index import WordIndex
+
+# Bytes read at a time from a dump without a multistream index
+_READ_SIZE = 1024 * 1024
+
+# Rows written to the page store and the membership tables at a time
+_BATCH = 500
+
+
+class DumpPage(NamedTuple):
+    page_id: int
+    namespace: int
+    title: str
+    revid: int
+    text: str
+    # Categories linked from the page's own text
+    categories: Tuple[str, ...]
+
+
+def _open(path: str, mode: str = 'rt', errors: Optional[str] = None):
+    """Open a file, decompressing .bz2 and .gz transparently."""
+    encoding = 'utf-8' if 't' in mode else None
+    if path.endswith('.bz2'):
+        return bz2.open(path, mode, encoding=encoding, errors=errors)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding=encoding, errors=errors)
+    return open(path, mode, encoding=encoding, errors=errors)
+
+
+# Category links in a page's own wikitext
+_CATEGORY_LINK = re.compile(r'\[\[\s*category\s*:\s*([^\]|]+)', re.I)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+
+def _parse_page(element: ElementTree.Element) -> Optional[DumpPage]:
+    """Turn a <page> element into a DumpPage, or None for redirects."""
+    fields = {}
+    revid, text = 0, ''
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'redirect':
+            return None
+        if name == 'revision':
+            for part in child:
+                part_name = _local_name(part.tag)
+                if part_name == 'id':
+                    revid = int(part.text)
+                elif part_name == 'text':
+                    text = part.text or ''
+        else:
+            fields[name] = child.text
+    return DumpPage(int(fields['id']), int(fields.get('ns') or 0), fields['title'], revid,
+                    strip_wikitext(text),
+                    tuple(normalize_category(name) for name in _CATEGORY_LINK.findall(text)))
+
+
+def _parse_stream(data: bytes) -> List[DumpPage]:
+    """Decompress one bz2 stream of a multistream dump and parse its pages."""
+    xml = bz2.decompress(data)
+    # The first stream opens <mediawiki> and holds <siteinfo>, the last closes it
+    start, end = xml.find(b'<page>'), xml.rfind(b'</page>')
+    if start < 0:
+        return []
+    root = ElementTree.fromstring(b'<pages>' + xml[start:end + len(b'</page>')] + b'</pages>')
+    return [page for page in map(_parse_page, root) if page is not None]
+
+
+def read_multistream_index(path: str) -> List[int]:
+    """Get the sorted byte offsets of the bz2 streams listed in a multistream index.
+
+    Index lines are `offset:page id:title`.
+    """
+    offsets = set()
+    with _open(path) as f:
+        for line in f:
+            offset, _, _ = line.partition(':')
+            if offset.strip().isdigit():
+                offsets.add(int(offset))
+    return sorted(offsets)
+
+
+def _iter_streams(path: str, offsets: List[int]) -> Iterator[bytes]:
+    """Yield the raw bytes of each bz2 stream, the last one running to the end of the file."""
+    with open(path, 'rb') as f:
+        for start, end in zip(offsets, offsets[1:] + [None]):
+            f.seek(start)
+            yield f.read() if end is None else f.read(end - start)
+
+
+def iter_xml_pages(path: str, index_path: Optional[str] = None,
+                   workers: Optional[int] = None) -> Iterator[DumpPage]:
+    """Stream the pages of a `pages-articles` XML dump.
+
+    With the multistream index of a bz2 dump, streams are decompressed and
+    parsed a bounded number at a time on the shared pool of `workers`
+    processes that also tokenizes pages, and pages come out in dump order.
+    Otherwise the dump is parsed incrementally on the calling thread.
+    Either way only a few streams' worth of pages is held in memory.
+
+    Args:
+        path (str): Dump file, .xml, .xml.bz2 or .xml.gz
+        index_path (str, optional): Multistream index of a bz2 dump
+        workers (int, optional): Worker processes for the multistream path
+
+    Yields:
+        DumpPage: Every page that is not a redirect
+    """
+    workers = workers or Config.PARALLEL_ANALYSIS_WORKERS or os.cpu_count() or 1
+    if index_path:
+        streams = _iter_streams(path, read_multistream_index(index_path))
+        if workers <= 1:
+            for data in streams:
+                yield from _parse_stream(data)
+            return
+        pool = get_pool(workers)
+        pending = deque()
+        try:
+            for data in streams:
+                pending.append(pool.submit(_parse_stream, data))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+        return
+
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    root = None
+    with _open(path, 'rb') as f:
+        while True:
+            data = f.read(_READ_SIZE)
+            if data:
+                parser.feed(data)
+            for event, element in parser.read_events():
+                if root is None and event == 'start':
+                    root = element
+                elif event == 'end' and _local_name(element.tag) == 'page':
+                    page = _parse_page(element)
+                    # Finished pages are dropped so memory stays flat
+                    root.clear()
+                    if page is not None:
+                        yield page
+            if not data:
+                break
+    parser.close()
+
+
+def iter_jsonl_pages(path: str) -> Iterator[DumpPage]:
+    """Stream the pages of a plaintext dump with one JSON object per line.
+
+    Objects need 'id', 'title' and 'text'; 'revid', 'ns' and a
+    'categories' list are used when present.
+    """
+    with _open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            yield DumpPage(int(item['id']), int(item.get('ns') or 0), item['title'],
+                           int(item.get('revid') or 0), item.get('text') or '',
+                           tuple(normalize_category(name) for name in item.get('categories') or ()))
+
+
+_SQL_STRING = r"'(?:[^'\\]|\\.)*'"
+# One row of the categorylinks INSERT statements: cl_from, cl_to, then the rest
+_CATEGORYLINK_ROW = re.compile(r"\((\d+),(" + _SQL_STRING + r")((?:,(?:" + _SQL_STRING
+                               + r"|[^,()']*))*)\)", re.S)
+_SQL_ESCAPE = re.compile(r'\\(.)', re.S)
+_SQL_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+
+def _unquote_sql(value: str) -> str:
+    return _SQL_ESCAPE.sub(lambda match: _SQL_ESCAPES.get(match.group(1), match.group(1)), value[1:-1])
+
+
+def iter_categorylinks(path: str) -> Iterator[Tuple[int, str]]:
+    """Stream (page id, category) pairs from category membership data.
+
+    Reads the `categorylinks` SQL dump (.sql, .sql.gz) or lines of
+    tab-separated page id and category name.
+    """
+    sql = '.sql' in os.path.basename(path)
+    # Sort keys in the SQL dump are binary
+    with _open(path, errors='replace' if sql else None) as f:
+        for line in f:
+            if sql:
+                if not line.startswith('INSERT INTO'):
+                    continue
+                for match in _CATEGORYLINK_ROW.finditer(line):
+                    yield int(match.group(1)), normalize_category(_unquote_sql(match.group(2)))
+            else:
+                page_id, _, rest = line.rstrip('\n').partition('\t')
+                if page_id.strip().isdigit():
+                    yield int(page_id), normalize_category(rest.partition('\t')[0])
+
+
+_WORK_SCHEMA = """
+CREATE TABLE pages (
+    id INTEGER PRIMARY KEY,
+    namespace INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    revid INTEGER NOT NULL
+);
+CREATE TABLE links (
+    category TEXT NOT NULL,
+    page_id INTEGER NOT NULL
+);
+"""
+
+
+class DumpIngester:
+    def __init__(self, cache_manager: CacheManager, page_store: PageStore,
+                 analyzer: Optional[str] = None):
+        """Analyze dump pages and write per-category results to the cache.
+
+        Page ids, titles and category links are kept in a temporary SQLite
+        database next to the page store rather than in memory.
+
+        Args:
+            cache_manager (CacheManager): Cache the category results are written to
+            page_store (PageStore): Store for per-page word counts
+            analyzer (str, optional): Analyzer name, Config.TEXT_ANALYZER by default
+        """
+        self.cache_manager = cache_manager
+        self.page_store = page_store
+        self.analyzer = analyzer or Config.TEXT_ANALYZER
+        prepare_analyzer(self.analyzer)
+        self.fingerprint = analyzer_fingerprint(self.analyzer)
+        fd, self._work_path = tempfile.mkstemp(
+            suffix='.sqlite3', prefix='.dump-', dir=os.path.dirname(os.path.abspath(page_store.path)))
+        os.close(fd)
+        self._conn = sqlite3.connect(self._work_path)
+        self._conn.execute('PRAGMA journal_mode=OFF')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.executescript(_WORK_SCHEMA)
+
+    def _add_links(self, links: Iterable[Tuple[str, int]]) -> None:
+        self._conn.executemany("INSERT INTO links (category, page_id) VALUES (?, ?)", links)
+
+    def load_pages(self, pages: Iterable[DumpPage], links_from_text: bool = True,
+                   workers: Optional[int] = None) -> Dict[str, int]:
+        """Count the words of every article and store the counts.
+
+        Article texts are analyzed on a process pool once there is enough
+        text, like a live crawl.
+
+        Args:
+            pages (Iterable[DumpPage]): Dump pages
+            links_from_text (bool): Take category membership from the pages'
+                own category links; pass False when loading categorylinks
+            workers (int, optional): Worker processes; pass the number the pages
+                are parsed with, so both share one pool
+
+        Returns:
+            dict: Number of 'pages' read, articles 'analyzed' and articles
+            'skipped' for lack of a revision id
+        """
+        summary = {'pages': 0, 'analyzed': 0, 'skipped': 0}
+        rows, links = [], []
+
+        def articles() -> Iterator[Tuple[Tuple[str, int], str]]:
+            for page in pages:
+                summary['pages'] += 1
+                rows.append((page.page_id, page.namespace, page.title, page.revid))
+                if links_from_text:
+                    links.extend((category, page.page_id) for category in page.categories)
+                if len(rows) >= _BATCH:
+                    self._conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", rows)
+                    self._add_links(links)
+                    rows.clear()
+                    links.clear()
+                if page.namespace != 0:
+                    continue
+                if not page.revid:
+                    summary['skipped'] += 1
+                    continue
+                yield (page.title, page.revid), page.text
+
+        batch = []
+        for (title, revid), counts in iter_text_frequencies(articles(), self.analyzer, workers=workers):
+            batch.append((title, revid, counts))
+            summary['analyzed'] += 1
+            if len(batch) >= _BATCH:
+                self.page_store.put_pages(batch, self.fingerprint)
+                batch = []
+        if batch:
+            self.page_store.put_pages(batch, self.fingerprint)
+        self._conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", rows)
+        self._add_links(links)
+        self._conn.commit()
+        return summary
+
+    def load_categorylinks(self, links: Iterable[Tuple[int, str]]) -> int:
+        """Record category membership as (page id, category) pairs.
+
+        Returns:
+            int: Number of links recorded
+        """
+        count = 0
+        batch = []
+        for page_id, category in links:
+            batch.append((category, page_id))
+            if len(batch) >= _BATCH:
+                self._add_links(batch)
+                count += len(batch)
+                batch = []
+        self._add_links(batch)
+        self._conn.commit()
+        return count + len(batch)
+
+    def categories(self) -> Iterator[str]:
+        """Yield every category that has a member, in name order."""
+        self._conn.execute("CREATE INDEX IF NOT EXISTS links_by_category ON links (category)")
+        for (category,) in self._conn.execute("SELECT DISTINCT category FROM links ORDER BY category"):
+            yield category
+
+    def members(self, category: str, depth: int = 0, max_pages: int = 0) -> Dict[str, int]:
+        """Get the articles of a category and its subcategories down to `depth`.
+
+        Subcategories are walked breadth-first like a live crawl.
+
+        Returns:
+            dict: Mapping of article title to revision id
+        """
+        self._conn.execute("CREATE INDEX IF NOT EXISTS links_by_category ON links (category)")
+        pages: Dict[str, int] = {}
+        queue = deque([(category, 0)])
+        visited = {category}
+        while queue:
+            name, level = queue.popleft()
+            rows = self._conn.execute(
+                "SELECT p.namespace, p.title, p.revid FROM links AS l JOIN pages AS p ON p.id = l.page_id "
+                "WHERE l.category = ? ORDER BY p.title", (name,))
+            for namespace, title, revid in rows:
+                if namespace == 14:
+                    subcategory = normalize_category(title.partition(':')[2])
+                    if level < depth and subcategory not in visited:
+                        visited.add(subcategory)
+                        queue.append((subcategory, level + 1))
+                elif namespace == 0 and revid:
+                    pages[title] = revid
+                    if max_pages and len(pages) >= max_pages:
+                        return pages
+        return pages
+
+    def write_categories(self, depth: int = 0, categories: Optional[Iterable[str]] = None,
+                         max_pages: Optional[int] = None) -> Dict[str, int]:
+        """Total each category from the page store and write it to the cache.
+
+        Args:
+            depth (int): Subcategory depth of every result
+            categories (Iterable[str], optional): Only these categories
+            max_pages (int, optional): Page budget per category,
+                Config.CATEGORY_MAX_PAGES by default, 0 for none
+
+        Returns:
+            dict: Number of categories 'written' and 'empty' ones without stored articles
+        """
+        max_pages = Config.CATEGORY_MAX_PAGES if max_pages is None else max_pages
+        summary = {'written': 0, 'empty': 0}
+        for category in categories if categories is not None else self.categories():
+            pages = self.members(category, depth, max_pages)
+            frequencies, error_bound = total_pages(self.page_store, pages, self.fingerprint)
+            if not frequencies:
+                summary['empty'] += 1
+                continue
+            cache_key = category_cache_key(category, depth, self.analyzer)
+            self.cache_manager.set(cache_key, frequencies)
+            if error_bound:
+                self.page_store.delete_manifest(cache_key, self.fingerprint)
+            else:
+                self.page_store.put_manifest(cache_key, self.fingerprint, pages, frequencies)
+            summary['written'] += 1
+        return summary
+
+    def close(self) -> None:
+        """Drop the temporary database."""
+        self._conn.close()
+        os.remove(self._work_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fill the cache from Wikipedia dumps.')
+    parser.add_argument('dump', help='pages-articles XML dump, or JSON Lines plaintext dump')
+    parser.add_argument('--index', help='Multistream index of a bz2 XML dump, for parallel decompression')
+    parser.add_argument('--categorylinks', help='categorylinks SQL dump, or page id/category TSV')
+    parser.add_argument('--depth', type=int, default=0, help='Subcategory depth of the results')
+    parser.add_argument('--categories', help='File with the categories to write, one per line')
+    parser.add_argument('--max-pages', type=int, default=Config.CATEGORY_MAX_PAGES,
+                        help='Page budget per category, 0 for none')
+    parser.add_argument('--workers', type=int, help='Worker processes for decompression and tokenizing')
+    parser.add_argument('--cache-dir', default=Config.CACHE_DIR, help='Cache directory')
+    args = parser.parse_args(argv)
+    depth = min(args.depth, Config.CATEGORY_MAX_DEPTH)
+
+    cache_manager = CacheManager(cache_dir=args.cache_dir, expiration_hours=Config.CACHE_EXPIRATION_HOURS,
+                                 memory_max_entries=0, cache_format=Config.CACHE_FORMAT,
+                                 compression=Config.CACHE_COMPRESSION, max_bytes=Config.CACHE_MAX_BYTES,
+                                 max_stale_hours=Config.CACHE_MAX_STALE_HOURS)
+    # Stores live next to the cache unless configured explicitly
+    in_cache_dir = os.path.abspath(args.cache_dir) != os.path.abspath(Config.CACHE_DIR)
+    page_store = PageStore(os.path.join(args.cache_dir, 'pages.sqlite3') if in_cache_dir
+                           else Config.PAGE_STORE_PATH)
+    word_index = WordIndex(os.path.join(args.cache_dir, 'index.sqlite3') if in_cache_dir
+                           else Config.WORD_INDEX_PATH)
+    cache_manager.add_listener(word_index.add)
+    cache_manager.add_delete_listener(word_index.remove)
+    try:
+        with DumpIngester(cache_manager, page_store) as ingester:
+            if '.xml' in os.path.basename(args.dump):
+                pages = iter_xml_pages(args.dump, args.index, args.workers)
+            else:
+                pages = iter_jsonl_pages(args.dump)
+            loaded = ingester.load_pages(pages, links_from_text=args.categorylinks is None,
+                                         workers=args.workers)
+            print(f"Analyzed {loaded['analyzed']} of {loaded['pages']} pages "
+                  f"({loaded['skipped']} without a revision id)", file=sys.stderr)
+            if args.categorylinks:
+                links = ingester.load_categorylinks(iter_categorylinks(args.categorylinks))
+                print(f"Loaded {links} category links", file=sys.stderr)
+
+            categories = None
+            if args.categories:
+                with open(args.categories, 'r', encoding='utf-8') as f:
+                    categories = list(read_categories(f))
+            written = ingester.write_categories(depth, categories, args.max_pages)
+            print(f"Done: {written['written']} categories cached, {written['empty']} empty",
+                  file=sys.stderr)
+    finally:
+        word_index.close()
+        page_store.close()
+
+
+if __name__ == "__main__":
+    main()
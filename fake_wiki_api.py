@@ -0,0 +1,306 @@
+"""Offline stand-in for the MediaWiki API used by wiki_api.
+
+Serves `list=categorymembers`, `prop=revisions`, `prop=extracts` and
+`prop=info` queries from a synthetic or recorded dataset, with optional latency and injected 429
+responses, so tests and benchmarks do not depend on Wikipedia.
+
+Run it directly and point the app at it:
+
+    python fake_wiki_api.py --port 8765 --latency 0.05 --throttle-rate 0.05
+    WIKI_API_URL=http://127.0.0.1:8765/w/api.php python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from text_analyzer import STOP_WORDS
+
+# Matches the limits of the real API: TextExtracts returns up to 20 extracts
+# per response with `exintro`, but only one whole-article extract
+_MAX_CATEGORY_MEMBERS = 500
+_MAX_EXTRACTS = 20
+_MAX_FULL_EXTRACTS = 1
+
+_SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'to', 'vi', 'ze', 'pra', 'sto',
+              'gen', 'dar', 'lin', 'mor', 'quen', 'tal', 'bre', 'fu', 'hex')
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_dataset(categories: int = 3, pages_per_category: int = 100,
+                      words_per_page: int = 400, vocabulary_size: int = 5000,
+                      seed: int = 0) -> Dict[str, Any]:
+    """Build a reproducible dataset of categories and page extracts.
+
+    Words follow a Zipf-like distribution and a third of the tokens are
+    stopwords, so the text resembles real extracts for the analyzers. The
+    first category also gets one subcategory, and neighbouring categories
+    share a few pages.
+
+    Args:
+        categories (int): Number of top-level categories
+        pages_per_category (int): Articles in each category
+        words_per_page (int): Tokens in each extract
+        vocabulary_size (int): Distinct non-stopwords
+        seed (int): Random seed
+
+    Returns:
+        dict: {'categories': {name: [member titles]}, 'pages': {title: {'revid', 'extract'}}}
+            where subcategory members are prefixed with 'Category:'
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(vocabulary_size, rng)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    stop_words = sorted(STOP_WORDS)
+
+    def extract() -> str:
+        words = rng.choices(vocabulary, weights, k=words_per_page)
+        for index in range(0, len(words), 3):
+            words[index] = rng.choice(stop_words)
+        sentences = [' '.join(words[start:start + 12]).capitalize() + '.'
+                     for start in range(0, len(words), 12)]
+        return ' '.join(sentences)
+
+    dataset = {'categories': {}, 'pages': {}}
+    names = ['Large language models'] + [f"Synthetic category {index}" for index in range(1, categories)]
+    for index, name in enumerate(names):
+        members = [f"{name} article {number}" for number in range(pages_per_category)]
+        if index > 0:
+            # Share a few pages with the previous category
+            members += [f"{names[index - 1]} article {number}" for number in range(5)]
+        dataset['categories'][name] = members
+    subcategory = f"{names[0]} subtopics"
+    dataset['categories'][names[0]].append(f"Category:{subcategory}")
+    dataset['categories'][subcategory] = [f"{subcategory} article {number}"
+                                          for number in range(pages_per_category // 4)]
+
+    for members in dataset['categories'].values():
+        for title in members:
+            if not title.startswith('Category:') and title not in dataset['pages']:
+                dataset['pages'][title] = {'revid': rng.randint(1, 10 ** 9), 'extract': extract()}
+    return dataset
+
+
+def _normalize(title: str) -> str:
+    title = title.replace('_', ' ').strip()
+    return title[:1].upper() + title[1:]
+
+
+class FakeWikiAPI:
+    def __init__(self, dataset: Optional[Dict[str, Any]] = None, latency: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 0, seed: int = 0):
+        """Create a stand-in API server; call start() to serve it.
+
+        Args:
+            dataset (dict, optional): Data in the shape returned by `synthetic_dataset`
+            latency (float): Seconds each response is delayed
+            throttle_rate (float): Fraction of requests answered with 429
+            retry_after (int): Retry-After seconds sent with a 429
+            seed (int): Seed for choosing throttled requests
+        """
+        self.dataset = dataset or synthetic_dataset()
+        self._page_ids = {title: index for index, title in enumerate(self.dataset['pages'], 1)}
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'FakeWikiAPI':
+        """Create a server for a dataset recorded as JSON."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve on a background thread.
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 picks a free one
+
+        Returns:
+            str: API endpoint URL
+        """
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-wiki-api',
+                                        daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+            throttle = self._rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if throttle:
+            self._send(handler, 429, {'error': {'code': 'ratelimited'}},
+                       {'Retry-After': str(self.retry_after)})
+            return
+
+        url = urlparse(handler.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if params.get('list') == 'categorymembers':
+            data = self._category_members(params)
+        elif params.get('prop') in ('revisions', 'extracts', 'info'):
+            data = self._pages(params)
+        else:
+            self._send(handler, 400, {'error': {'code': 'badvalue'}})
+            return
+        self._send(handler, 200, data)
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, data: Dict[str, Any],
+              headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(data).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json; charset=utf-8')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _category_members(self, params: Dict[str, str]) -> Dict[str, Any]:
+        name = params.get('cmtitle', '')
+        if name.startswith('Category:'):
+            name = name[len('Category:'):]
+        namespaces = params.get('cmnamespace', '0').split('|')
+        members = []
+        for title in self.dataset['categories'].get(name, []):
+            ns = '14' if title.startswith('Category:') else '0'
+            if ns in namespaces:
+                members.append({'ns': int(ns), 'title': title})
+
+        limit = min(int(params.get('cmlimit', 10)), _MAX_CATEGORY_MEMBERS)
+        offset = int(params.get('cmcontinue', 0))
+        data = {'batchcomplete': '', 'query': {'categorymembers': members[offset:offset + limit]}}
+        if offset + limit < len(members):
+            data['continue'] = {'cmcontinue': str(offset + limit), 'continue': '-||'}
+        return data
+
+    def _pages(self, params: Dict[str, str]) -> Dict[str, Any]:
+        titles = params.get('titles', '').split('|') if params.get('titles') else []
+        normalized = [{'from': title, 'to': _normalize(title)} for title in titles
+                      if _normalize(title) != title]
+        titles = [_normalize(title) for title in titles]
+
+        with_extracts = set()
+        data: Dict[str, Any] = {'query': {}}
+        if params['prop'] == 'extracts':
+            # The synthetic pages have no sections, so an intro is the whole text
+            max_extracts = _MAX_EXTRACTS if params.get('exintro') else _MAX_FULL_EXTRACTS
+            limit = min(int(params.get('exlimit', 1)), max_extracts)
+            if int(params.get('exlimit', 1)) > limit:
+                data['warnings'] = {'extracts': {
+                    '*': f'"exlimit" was too large for a whole article extracts request, lowered to {limit}.'}}
+            offset = int(params.get('excontinue', 0))
+            with_extracts = set(titles[offset:offset + limit])
+            if offset + limit < len(titles):
+                data['continue'] = {'excontinue': offset + limit, 'continue': '||'}
+        else:
+            data['batchcomplete'] = ''
+
+        pages = {}
+        for index, title in enumerate(titles):
+            page = self.dataset['pages'].get(title)
+            if page is None:
+                pages[str(-1 - index)] = {'ns': 0, 'title': title, 'missing': ''}
+                continue
+            pageid = self._page_ids[title]
+            entry = {'pageid': pageid, 'ns': 0, 'title': title}
+            if params['prop'] == 'info':
+                entry['lastrevid'] = page['revid']
+            elif params['prop'] == 'revisions':
+                # The page texts are plain sentences, which are valid wikitext
+                entry['revisions'] = [{'revid': page['revid'], 'parentid': 0, 'slots': {'main': {
+                    'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki', '*': page['extract']}}}]
+            elif title in with_extracts:
+                entry['extract'] = page['extract']
+            pages[str(pageid)] = entry
+        data['query']['pages'] = pages
+        if normalized:
+            data['query']['normalized'] = normalized
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve an offline stand-in for the Wikipedia API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--dataset', help='JSON dataset file; synthetic data is used if omitted')
+    parser.add_argument('--pages', type=int, default=100, help='Synthetic pages per category')
+    parser.add_argument('--categories', type=int, default=3, help='Synthetic categories')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--dump', help='Write the dataset to this file and exit')
+    args = parser.parse_args()
+
+    dataset = None
+    if args.dataset:
+        with open(args.dataset, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+    else:
+        dataset = synthetic_dataset(categories=args.categories, pages_per_category=args.pages)
+    if args.dump:
+        with open(args.dump, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f, ensure_ascii=False)
+        return
+
+    server = FakeWikiAPI(dataset, latency=args.latency, throttle_rate=args.throttle_rate)
+    print(f"Serving {len(dataset['pages'])} pages at {server.start(args.host, args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be queued."""
+
+
+class Job:
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.progress: Dict[str, int] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the job's state as a JSON-serializable dict."""
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    def __init__(self, workers: int = 2, max_queued: int = 32, result_ttl: float = 3600):
+        """Initialize a bounded pool of background workers.
+
+        Jobs live in this process only, so with several server processes a
+        job's status has to be requested from the process that created it.
+
+        Args:
+            workers (int): Jobs run at the same time
+            max_queued (int): Jobs allowed to wait for a worker before submissions are refused
+            result_ttl (float): Seconds a finished job is kept for status requests
+        """
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-job')
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, Job] = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+
+    def _purge(self) -> None:
+        """Forget finished jobs older than the TTL; the lock must be held."""
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, key: str, fn: Callable[[Job], Any]) -> Tuple[Job, bool]:
+        """Queue `fn` unless a job for the same key is already queued or running.
+
+        Args:
+            key (str): Identifies equivalent work
+            fn (callable): Called as fn(job) on a worker thread, may update
+                job.progress, and returns the job's result
+
+        Returns:
+            tuple: (job, whether it was newly created)
+
+        Raises:
+            JobQueueFull: If `max_queued` jobs are already waiting
+        """
+        with self._lock:
+            self._purge()
+            job = self._active.get(key)
+            if job is not None:
+                return job, False
+            if self._queued >= self.max_queued:
+                raise JobQueueFull(f"{self._queued} jobs are already queued")
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._queued += 1
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        with self._lock:
+            self._queued -= 1
+            job.status = 'running'
+        try:
+            result = fn(job)
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        else:
+            job.result = result
+            job.status = 'done'
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                del self._active[job.key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id, or None if it is unknown or has expired."""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of queued, running and retained jobs."""
+        with self._lock:
+            return {
+                'queued': self._queued,
+                'running': len(self._active) - self._queued,
+                'retained': len(self._jobs),
+                'max_queued': self.max_queued
+            }
@@ -0,0 +1,253 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Latency buckets in seconds, from cache hits to full crawls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """Sum the counter over every label set."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (not cumulative), sum, count
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            totals[0] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, totals) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {totals[0]:g}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+ANALYZE_REQUESTS = REGISTRY.register(Counter(
+    'wiki_analyze_requests_total', 'Analysis requests by mode (sync, stream, async, get) and cache result',
+    ('mode', 'cache')))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'wiki_analyze_phase_seconds', 'Time a request spent in each analysis phase', ('phase',)))
+API_REQUESTS = REGISTRY.register(Counter(
+    'wiki_api_requests_total', 'Wikipedia API responses by status code', ('status',)))
+API_RETRIES = REGISTRY.register(Counter(
+    'wiki_api_retries_total', 'Wikipedia API requests retried after throttling or errors', ('reason',)))
+API_RESPONSE_BYTES = REGISTRY.register(Counter(
+    'wiki_api_response_bytes_total', 'Bytes received from the Wikipedia API'))
+API_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'wiki_api_cache_lookups_total', 'Raw Wikipedia API payload lookups by result (hit, miss)', ('result',)))
+API_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'wiki_api_request_seconds', 'Latency of single Wikipedia API requests'))
+PAGES = REGISTRY.register(Counter(
+    'wiki_pages_total', 'Category pages by how their word counts were obtained', ('source',)))
+TOKENIZED_CHARS = REGISTRY.register(Counter(
+    'wiki_tokenized_chars_total', 'Characters of page text tokenized'))
+CACHE_REFRESHES = REGISTRY.register(Counter(
+    'wiki_cache_refreshes_total', 'Background re-analyses of cached categories by trigger (stale, prewarm)',
+    ('trigger',)))
+
+
+class Timings:
+    """Exclusive wall time per phase for one request.
+
+    Phases nest: entering a phase pauses the enclosing one, so time spent
+    pulling pages from the network inside tokenization is charged to the
+    fetch phase, not to tokenization.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._stack: List[str] = []
+        self._mark = self.started
+
+    def push(self, phase: str) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            current = self._stack[-1]
+            self.phases[current] = self.phases.get(current, 0.0) + now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+
+    def pop(self) -> None:
+        now = time.perf_counter()
+        phase = self._stack.pop()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        """Get phase and total durations in milliseconds."""
+        timings = {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+        timings['total'] = round(self.total() * 1000, 3)
+        return timings
+
+    def server_timing(self) -> str:
+        """Format the durations as a Server-Timing header value."""
+        return ', '.join(f"{phase};dur={duration}" for phase, duration in self.as_dict().items())
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar('timings', default=None)
+
+
+def start_request() -> Tuple[Timings, object]:
+    """Start collecting timings for the current context.
+
+    Returns:
+        tuple: (timings, token to pass to finish_request)
+    """
+    timings = Timings()
+    return timings, _current.set(timings)
+
+
+def finish_request(timings: Timings, token: object) -> None:
+    """Stop collecting timings and record them in the phase histogram."""
+    _current.reset(token)
+    observe_phases(timings)
+    PHASE_SECONDS.observe(timings.total(), phase='total')
+
+
+def observe_phases(timings: Timings) -> None:
+    """Record phase durations in the histogram, without a request total.
+
+    For work shared by several requests, such as a crawl they all wait on.
+    """
+    for phase, seconds in timings.phases.items():
+        PHASE_SECONDS.observe(seconds, phase=phase)
+
+
+def current() -> Optional[Timings]:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Charge the time spent in the block to `name` for the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.push(name)
+    try:
+        yield
+    finally:
+        timings.pop()
+
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """Charge the time spent producing each item of `iterable` to `name`."""
+    timings = _current.get()
+    if timings is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        timings.push(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings.pop()
+        yield item
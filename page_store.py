@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    title TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    counts BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (title, analyzer, revid)
+);
+CREATE TABLE IF NOT EXISTS manifests (
+    cache_key TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    pages BLOB NOT NULL,
+    totals BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (cache_key, analyzer)
+);
+"""
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _unpack(data: bytes):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class PageStore:
+    def __init__(self, path: str):
+        """Open the per-page word count store.
+
+        Pages are stored by title and revision, so a page shared by several
+        categories is analyzed once per revision. Each analyzed category also
+        gets a manifest of the page revisions its totals were built from,
+        which lets a refresh adjust the totals for changed pages only.
+
+        Args:
+            path (str): SQLite database file, created if missing
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by the threads of a process; other processes
+        # coordinate through SQLite's own locking
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def iter_pages(self, pages: Dict[str, int], analyzer: str) -> Iterator[Tuple[str, Counter]]:
+        """Read the stored word counts of specific page revisions a batch at a time.
+
+        Only one batch of counts is held in memory, so every page of a large
+        category can be streamed.
+
+        Args:
+            pages (dict): Mapping of title to revision id
+            analyzer (str): Analyzer the counts were produced with
+
+        Yields:
+            tuple: (title, Counter) for the revisions that are stored
+        """
+        items = list(pages.items())
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(items), 300):
+            batch = items[start:start + 300]
+            clause = ' OR '.join(['(title = ? AND revid = ?)'] * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT title, counts FROM pages WHERE analyzer = ? AND ({clause})",
+                    [analyzer] + [value for item in batch for value in item]
+                ).fetchall()
+            for title, counts in rows:
+                yield title, Counter(_unpack(counts))
+
+    def get_pages(self, pages: Dict[str, int], analyzer: str) -> Dict[str, Counter]:
+        """Get the stored word counts of specific page revisions.
+
+        Args:
+            pages (dict): Mapping of title to revision id
+            analyzer (str): Analyzer the counts were produced with
+
+        Returns:
+            dict: Mapping of title to Counter for the revisions that are stored
+        """
+        return dict(self.iter_pages(pages, analyzer))
+
+    def put_pages(self, pages: Iterable[Tuple[str, int, Dict[str, int]]], analyzer: str) -> None:
+        """Store word counts for page revisions.
+
+        Args:
+            pages (Iterable[tuple]): (title, revid, counts) triples
+            analyzer (str): Analyzer the counts were produced with
+        """
+        now = time.time()
+        rows = [(title, analyzer, revid, _pack(counts), now) for title, revid, counts in pages]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (title, analyzer, revid, counts, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get_manifest(self, cache_key: str, analyzer: str) -> Optional[Tuple[Dict[str, int], Counter]]:
+        """Get the page revisions and totals of the last analysis of a category.
+
+        Args:
+            cache_key (str): Key of the analysis
+            analyzer (str): Analyzer the totals were produced with
+
+        Returns:
+            Optional[tuple]: (mapping of title to revid, total Counter), or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages, totals FROM manifests WHERE cache_key = ? AND analyzer = ?",
+                (cache_key, analyzer)).fetchone()
+        if row is None:
+            return None
+        return _unpack(row[0]), Counter(_unpack(row[1]))
+
+    def put_manifest(self, cache_key: str, analyzer: str, pages: Dict[str, int],
+                     totals: Dict[str, int]) -> None:
+        """Record the page revisions and totals of an analysis.
+
+        Args:
+            cache_key (str): Key of the analysis
+            analyzer (str): Analyzer the totals were produced with
+            pages (dict): Mapping of title to the revid counted in the totals
+            totals (dict): Word frequencies over all the pages
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifests (cache_key, analyzer, pages, totals, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, analyzer, _pack(pages), _pack(totals), time.time()))
+
+    def delete_manifest(self, cache_key: str, analyzer: str) -> None:
+        """Forget the manifest of an analysis, so the next one starts from the page counts."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM manifests WHERE cache_key = ? AND analyzer = ?",
+                               (cache_key, analyzer))
+
+    def prune(self, max_age_hours: float) -> int:
+        """Drop superseded page revisions and manifests older than `max_age_hours`.
+
+        The latest stored revision of every page is kept whatever its age.
+
+        Args:
+            max_age_hours (float): Age after which old rows are removed
+
+        Returns:
+            int: Number of rows removed
+        """
+        cutoff = time.time() - max_age_hours * 3600
+        with self._lock, self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM pages WHERE updated_at < ? AND revid < "
+                "(SELECT MAX(revid) FROM pages AS latest "
+                " WHERE latest.title = pages.title AND latest.analyzer = pages.analyzer)",
+                (cutoff,)).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM manifests WHERE updated_at < ?", (cutoff,)).rowcount
+        return removed
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
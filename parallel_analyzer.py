@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from config import Config
+from text_analyzer import analyze_text
+
+# Worker pools shared by every crawl in the process, by number of workers
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_context():
+    """Get a start method that is safe from a process running other threads.
+
+    Forking the threaded web server would copy locks held by its other
+    threads into the workers, so workers come from a fork server instead.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Get the shared pool with `workers` processes, starting it on first use.
+
+    Args:
+        workers (int): Number of worker processes
+
+    Returns:
+        ProcessPoolExecutor: Pool reused by later calls in the process
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                         mp_context=_pool_context())
+        return pool
+
+
+def _discard_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool so the next crawl starts a new one."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown() -> None:
+    """Stop the shared worker pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _analyze_chunk(analyzer, items):
+    return [(key, analyze_text(text, analyzer)) for key, text in items]
+
+
+def iter_text_frequencies(items: Iterable[Tuple[Any, str]], analyzer: Optional[str] = None,
+                          parallel_threshold: Optional[int] = None, workers: Optional[int] = None,
+                          chunk_chars: Optional[int] = None) -> Iterator[Tuple[Any, Counter]]:
+    """Count the words of each text separately.
+
+    Texts are analyzed inline until their combined size reaches
+    `parallel_threshold` characters, then in chunks of about `chunk_chars`
+    characters on the shared process pool.
+
+    Args:
+        items (Iterable[tuple]): (key, text) pairs
+        analyzer (str, optional): Analyzer passed to `analyze_text`
+        parallel_threshold (int, optional): Text size that turns on the process pool, 0 disables it
+        workers (int, optional): Number of worker processes
+        chunk_chars (int, optional): Approximate characters per chunk sent to a worker
+
+    Yields:
+        tuple: (key, Counter) pairs, in input order until the pool starts
+    """
+    parallel_threshold = (Config.PARALLEL_ANALYSIS_THRESHOLD
+                          if parallel_threshold is None else parallel_threshold)
+    workers = workers or Config.PARALLEL_ANALYSIS_WORKERS or os.cpu_count() or 1
+    chunk_chars = chunk_chars or Config.PARALLEL_ANALYSIS_CHUNK_CHARS
+
+    items = iter(items)
+    total_chars = 0
+    for key, text in items:
+        yield key, analyze_text(text, analyzer)
+        total_chars += len(text)
+        if parallel_threshold and workers > 1 and total_chars >= parallel_threshold:
+            break
+    else:
+        return
+
+    pool = get_pool(workers)
+    pending = set()
+    try:
+        chunk, size = [], 0
+        for key, text in items:
+            chunk.append((key, text))
+            size += len(text)
+            if size < chunk_chars:
+                continue
+            pending.add(pool.submit(_analyze_chunk, analyzer, chunk))
+            chunk, size = [], 0
+            # Bounded so a fast producer cannot buffer the whole category in memory
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        if chunk:
+            pending.add(pool.submit(_analyze_chunk, analyzer, chunk))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    except BrokenProcessPool:
+        _discard_pool(workers, pool)
+        raise
+    finally:
+        # The pool outlives this crawl, so only its own queued chunks are dropped
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,100 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import metrics
+from cache_manager import CacheManager
+
+
+class PrewarmScheduler:
+    def __init__(self, cache_manager: CacheManager, refresh: Callable[[str], None],
+                 top_n: int = 100, request_budget: int = 0, start_hour: int = 2,
+                 end_hour: int = 6, check_interval: float = 600):
+        """Re-analyze the most read categories during an off-peak window.
+
+        Once per window, the `top_n` cache keys with the most (decayed) hits
+        are refreshed, most popular first, if their entry would expire
+        before the next window, so users of popular categories are served
+        from the cache all day. Hit counts are halved after every pass.
+
+        Args:
+            cache_manager (CacheManager): Cache whose index tracks hits per key
+            refresh (callable): Re-analyzes a cache key and writes the result to the cache
+            top_n (int): Most popular keys considered per window
+            request_budget (int): Wikipedia API requests a pass may make, 0 for no
+                limit. Every request the process makes during the pass counts.
+            start_hour (int): Local hour the window opens
+            end_hour (int): Local hour the window closes; may be before
+                `start_hour` for a window spanning midnight
+            check_interval (float): Seconds between checks for an open window
+        """
+        self.cache_manager = cache_manager
+        self.refresh = refresh
+        self.top_n = top_n
+        self.request_budget = request_budget
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.check_interval = check_interval
+        self.last_run: Optional[Dict[str, int]] = None
+        self._last_window: Optional[datetime] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def window_start(self, now: datetime) -> Optional[datetime]:
+        """Get the start of the window `now` falls in, or None outside the window."""
+        start = now.replace(hour=self.start_hour, minute=0, second=0, microsecond=0)
+        if start > now:
+            start -= timedelta(days=1)
+        length = (self.end_hour - self.start_hour) % 24 or 24
+        return start if now < start + timedelta(hours=length) else None
+
+    def run_once(self) -> Dict[str, int]:
+        """Refresh the popular keys that would expire before the next window.
+
+        Returns:
+            dict: Keys 'refreshed', 'failed' and 'deferred' (left for lack of
+            budget), and the 'requests' made to the API
+        """
+        # The next pass is a day away, so anything expiring sooner is due
+        horizon = time.time() + 24 * 3600 - self.cache_manager.expiration_hours * 3600
+        first_request = metrics.API_REQUESTS.total()
+        summary = {'refreshed': 0, 'failed': 0, 'deferred': 0, 'requests': 0}
+        for key, written_at, _ in self.cache_manager.index.popular(self.top_n):
+            if written_at >= horizon:
+                continue
+            if self.request_budget and summary['requests'] >= self.request_budget:
+                summary['deferred'] += 1
+                continue
+            try:
+                self.refresh(key)
+                summary['refreshed'] += 1
+            except Exception:
+                summary['failed'] += 1
+            summary['requests'] = int(metrics.API_REQUESTS.total() - first_request)
+        self.cache_manager.index.decay_hits(0.5)
+        self.last_run = summary
+        return summary
+
+    def start(self) -> None:
+        """Check for an open window on a daemon thread, running one pass per window."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(self.check_interval):
+                window = self.window_start(datetime.now())
+                if window is not None and window != self._last_window:
+                    self._last_window = window
+                    self.run_once()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='cache-prewarm', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the scheduler thread and wait for it."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import os
+import struct
+import tempfile
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings bodies are stored in, most preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Identity bodies are stored too, so uncompressed responses need no decompression
+_STORED = ENCODINGS + ('identity',)
+
+_EXTENSIONS = {'br': '.json.br', 'gzip': '.json.gz', 'identity': '.json'}
+
+# Every body file starts with the write time of the cache entry it renders
+_STAMP = struct.Struct('<d')
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'identity':
+        return body
+    if encoding == 'br':
+        return brotli.compress(body, quality=9)
+    # A fixed mtime keeps the bytes identical for identical bodies
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class ResponseCache:
+    def __init__(self, directory: str):
+        """Store rendered JSON responses, compressed once per cache entry version.
+
+        Each body is stored as is and once per content coding, together with
+        the write time of the cache entry it was rendered from, so a body
+        left over from an older version of the entry is never served.
+
+        Args:
+            directory (str): Directory for the body files, created if missing
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def etag(key: str, written_at: float, encoding: str) -> str:
+        """Get the strong entity tag of a cache entry version in one coding."""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return f"{digest}-{int(written_at * 1e6):x}-{encoding}"
+
+    def _path(self, key: str, encoding: str) -> str:
+        name = hashlib.md5(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + _EXTENSIONS[encoding])
+
+    def put(self, key: str, written_at: float, body: bytes) -> None:
+        """Store the body rendered from a cache entry, as is and compressed.
+
+        Args:
+            key (str): Cache key
+            written_at (float): Write time of the cache entry
+            body (bytes): Uncompressed response body
+        """
+        for encoding in _STORED:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(_STAMP.pack(written_at))
+                    f.write(_compress(body, encoding))
+                os.replace(temp_path, self._path(key, encoding))
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+    def get(self, key: str, written_at: float, encoding: str) -> Optional[bytes]:
+        """Get a stored body in a content coding.
+
+        Args:
+            key (str): Cache key
+            written_at (float): Write time of the current cache entry
+            encoding (str): One of ENCODINGS, or 'identity' for the
+                uncompressed body
+
+        Returns:
+            Optional[bytes]: The body, or None if none was stored for this
+            version of the entry
+        """
+        try:
+            with open(self._path(key, encoding), 'rb') as f:
+                stamp = f.read(_STAMP.size)
+                if len(stamp) < _STAMP.size or _STAMP.unpack(stamp)[0] != written_at:
+                    return None
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        """Remove every stored body of a key."""
+        for encoding in _STORED:
+            try:
+                os.remove(self._path(key, encoding))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,28 @@
+"""Run the app on uvicorn, the production ASGI server.
+
+    python serve.py --host 0.0.0.0 --port 5000 --workers 4
+
+Equivalent to `uvicorn asgi:application`, with the worker count taken from
+ASGI_WORKERS. The app is only imported by the worker processes.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from config import Config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the analyzer over ASGI.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind')
+    parser.add_argument('--workers', type=int, default=Config.ASGI_WORKERS,
+                        help='Server processes, 0 uses every CPU')
+    args = parser.parse_args(argv)
+    uvicorn.run('asgi:application', host=args.host, port=args.port,
+                workers=args.workers or os.cpu_count() or 1, lifespan='on', proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the process only
+    fcntl = None
+
+
+def _is_current(lock_file, path: str) -> bool:
+    """Whether an open lock file is still the one at `path`."""
+    try:
+        return os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, lock_dir: Optional[str] = None):
+        """Initialize a single-flight group.
+
+        Args:
+            lock_dir (str, optional): Directory for per-key lock files that
+                coalesce work across processes on this host. Without it only
+                threads of the current process are coalesced.
+        """
+        self.lock_dir = lock_dir
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    @contextmanager
+    def _process_lock(self, key: str):
+        """Hold an exclusive lock on the key's lock file, removing the file on release."""
+        if not self.lock_dir or fcntl is None:
+            yield
+            return
+
+        hashed_key = hashlib.md5(key.encode()).hexdigest()
+        path = os.path.join(self.lock_dir, f"{hashed_key}.lock")
+        while True:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # The previous holder may have removed the file while we waited;
+                # a lock on a removed file excludes no one, so start over
+                if _is_current(lock_file, path):
+                    break
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+        try:
+            yield
+        finally:
+            # Removed before unlocking, so no one can lock this file after us
+            os.remove(path)
+            lock_file.close()
+
+    def do(self, key: str, fn: Callable[[], Any],
+           recheck: Optional[Callable[[], Any]] = None) -> Any:
+        """Run `fn` for `key` unless a run for the same key is already in flight.
+
+        Callers that arrive while a run is in flight wait for it and receive
+        its result, or its exception. Across processes, the run happens under
+        the key's lock file, and `recheck` is called first so a process that
+        waited on the lock can pick up what the previous holder produced.
+
+        Args:
+            key (str): Key identifying the work
+            fn (callable): Produces the result
+            recheck (callable, optional): Returns an existing result, or None
+
+        Returns:
+            Any: The result shared by every caller for this run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._process_lock(key):
+                result = recheck() if recheck is not None else None
+                if result is None:
+                    result = fn()
+            call.result = result
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Get the number of keys with a run in progress in this process."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import analyze_wiki_category
+import wiki_api
+from cache_manager import CacheManager
+from category_analysis import category_cache_key
+from fake_wiki_api import FakeWikiAPI, synthetic_dataset
+
+
+class BatchModeTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.dataset = synthetic_dataset(categories=3, pages_per_category=20, words_per_page=50)
+        self.api = FakeWikiAPI(self.dataset)
+        self.api.start()
+        self.addCleanup(self.api.stop)
+        client = wiki_api.WikiClient(api_url=self.api.url, requests_per_second=0)
+        self.addCleanup(client.close)
+        patcher = mock.patch.object(wiki_api, '_client', client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_batch(self, lines, *extra):
+        categories = os.path.join(self.tmp_dir, 'categories.txt')
+        with open(categories, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        output = os.path.join(self.tmp_dir, 'results.jsonl')
+        with contextlib.redirect_stderr(io.StringIO()):
+            analyze_wiki_category.main(['--batch', categories, '--output', output,
+                                        '--cache-dir', self.cache_dir, '--top-k', '5', *extra])
+        with open(output, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_batch_writes_json_lines_through_the_cache(self):
+        results = self.run_batch(['# warm-up list', 'Synthetic category 1', '',
+                                  'synthetic_category_2', 'Synthetic category 1', 'Unknown'])
+        self.assertEqual([result['category'] for result in results],
+                         ['Synthetic category 1', 'Synthetic category 2', 'Unknown'])
+        first, second, unknown = results
+        self.assertFalse(first['cached'])
+        self.assertEqual(len(first['top_words']), 5)
+        self.assertEqual(first['pages'], 25)
+        # Pages shared with the previous category are not downloaded again
+        self.assertEqual(second['fetched_pages'], 20)
+        self.assertEqual(unknown['error'], 'No pages found in category')
+
+        # The web app's cache manager reads the same entries
+        cache = CacheManager(cache_dir=self.cache_dir)
+        top_words = cache.get_top(category_cache_key('Synthetic category 1', 0), 5)
+        self.assertEqual([count for _, count in top_words], [count for _, count in first['top_words']])
+
+        requests = self.api.requests
+        results = self.run_batch(['Synthetic category 1', 'Synthetic category 2'])
+        self.assertTrue(all(result['cached'] for result in results))
+        self.assertEqual(self.api.requests, requests)
+
+    def test_batch_keeps_entries_the_web_app_still_serves_stale(self):
+        key = category_cache_key('Synthetic category 1', 0)
+        cache = CacheManager(cache_dir=self.cache_dir)
+        with mock.patch('cache_manager.time.time', return_value=time.time() - 25 * 3600):
+            cache.set(key, {'stale': 1})
+        with mock.patch.object(CacheManager, 'delete', autospec=True,
+                               side_effect=CacheManager.delete) as delete:
+            self.run_batch(['Synthetic category 1'])
+        delete.assert_not_called()
+        # Analyzed again and replaced in place
+        self.assertNotEqual(cache.get(key), {'stale': 1})
+
+    def test_single_category_output(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            analyze_wiki_category.main(['Large language models', '1', '--cache-dir', self.cache_dir])
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], 'Analyzing category: Large language models')
+        self.assertIn('Analyzed 25 pages', lines[1])
+        self.assertEqual(len(lines), 54)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,22 @@
 import unittest
+import gzip
 import json
 import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
 from app import app
 from cache_manager import CacheManager
+from category_analysis import category_cache_key
 from config import TestingConfig
+from fake_wiki_api import FakeWikiAPI
+from jobs import JobQueueFull
+from page_store import PageStore
+from response_cache import ResponseCache
+import wiki_api
+from word_index import WordIndex
 
 class WikiAnalyzerTests(unittest.TestCase):
     def setUp(self):
@@ -35,12 +48,75 @@ class WikiAnalyzerTests(unittest.TestCase):
         self.assertIn('error', data)
 
     def test_analyze_valid_category(self):
-        response = self.app.post('/analyze',
-                               data=json.dumps({'category': 'Large language models'}),
-                               content_type='application/json')
+        # Served by the offline stand-in instead of Wikipedia
+        page_store = PageStore(os.path.join(app.config['CACHE_DIR'], 'pages.sqlite3'))
+        self.addCleanup(page_store.close)
+        with FakeWikiAPI() as api:
+            client = wiki_api.WikiClient(api_url=api.url, requests_per_second=0)
+            self.addCleanup(client.close)
+            with mock.patch.object(wiki_api, '_client', client), \
+                    mock.patch('app.cache_manager', self.cache_manager), \
+                    mock.patch('app.page_store', page_store):
+                response = self.app.post('/analyze',
+                                       data=json.dumps({'category': 'Large language models'}),
+                                       content_type='application/json')
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
         self.assertIn('frequencies', data)
+        self.assertEqual(len(data['processed_pages']), 100)
+        # The phase breakdown separates network time from CPU time
+        for phase in ('members', 'revisions', 'fetch', 'tokenize', 'merge', 'cache_lookup', 'cache_write'):
+            self.assertIn(phase, data['timings'])
+        self.assertIn('fetch;dur=', response.headers['Server-Timing'])
+
+        metrics_text = self.app.get('/metrics').get_data(as_text=True)
+        self.assertIn('wiki_analyze_phase_seconds_count{phase="tokenize"}', metrics_text)
+        self.assertIn('wiki_api_requests_total{status="200"}', metrics_text)
+        self.assertIn('wiki_pages_total{source="fetched"}', metrics_text)
+
+    def test_analyze_returns_top_words(self):
+        self.cache_manager.set(category_cache_key('Test category', 0), {
+            'alpha': 5, 'beta': 9, 'gamma': 1, 'pi': 20, 'delta': 7
+        })
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch.object(self.cache_manager, 'get_stats', side_effect=AssertionError):
+            response = self.app.post('/analyze',
+                                   data=json.dumps({'category': 'Test category',
+                                                    'top_k': 2, 'min_count': 2}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['cached'])
+        self.assertEqual(data['cache_stats']['hits'], 1)
+        # "pi" is shorter than MIN_WORD_LENGTH
+        self.assertEqual(data['top_words'], [['beta', 9], ['delta', 7]])
+        self.assertEqual(data['frequencies'], {'beta': 9, 'delta': 7})
+        self.assertEqual(data['vocabulary_size'], 5)
+
+    def test_analyze_full_vocabulary(self):
+        frequencies = {'alpha': 5, 'beta': 9, 'gamma': 1}
+        self.cache_manager.set(category_cache_key('Test category', 0), frequencies)
+        with mock.patch('app.cache_manager', self.cache_manager):
+            response = self.app.post('/analyze',
+                                   data=json.dumps({'category': 'Test category',
+                                                    'top_k': 1, 'full': True}),
+                                   content_type='application/json')
+        data = json.loads(response.data)
+        self.assertEqual(data['frequencies'], frequencies)
+        self.assertEqual(data['top_words'], [['beta', 9]])
+
+    def test_analyze_invalid_top_k(self):
+        response = self.app.post('/analyze',
+                               data=json.dumps({'category': 'Test category', 'top_k': 'many'}),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_analyze_rejects_non_object_body(self):
+        for path in ('/analyze', '/analyze/stream'):
+            for body in ([], 'x', 5):
+                response = self.app.post(path, data=json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json(), {'error': 'Request body must be a JSON object'})
 
     def test_cache_operations(self):
         # Test cache setting
@@ -55,5 +131,350 @@ class WikiAnalyzerTests(unittest.TestCase):
         self.cache_manager.delete('test_key')
         self.assertIsNone(self.cache_manager.get('test_key'))
 
+    def test_memory_tier_serves_hits_without_disk(self):
+        self.cache_manager.set('test_key', {'word': 1})
+        os.remove(self.cache_manager._get_cache_path('test_key'))
+        self.assertEqual(self.cache_manager.get('test_key'), {'word': 1})
+        self.assertEqual(self.cache_manager.get_stats()['memory']['hits'], 1)
+
+    def test_memory_tier_reads_through_from_disk(self):
+        self.cache_manager.set('test_key', {'word': 1})
+        self.cache_manager.memory.delete('test_key')
+        self.assertEqual(self.cache_manager.get('test_key'), {'word': 1})
+        self.assertEqual(self.cache_manager.get('test_key'), {'word': 1})
+        stats = self.cache_manager.get_stats()['memory']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        memory = self.cache_manager.memory
+        memory.max_entries = 2
+        self.cache_manager.set('a', {'word': 1})
+        self.cache_manager.set('b', {'word': 2})
+        self.cache_manager.get('a')
+        self.cache_manager.set('c', {'word': 3})
+        self.assertIsNone(memory.get('b'))
+        self.assertEqual(memory.get('a'), {'word': 1})
+        self.assertEqual(memory.get_stats()['evictions'], 1)
+
+    def test_memory_tier_evicts_by_size(self):
+        memory = self.cache_manager.memory
+        memory.set('a', 'x', size=60, expires_at=float('inf'))
+        memory.max_bytes = 100
+        memory.set('b', 'y', size=60, expires_at=float('inf'))
+        self.assertIsNone(memory.get('a'))
+        memory.set('huge', 'z', size=500, expires_at=float('inf'))
+        self.assertIsNone(memory.get('huge'))
+
+    def test_memory_tier_budget_bounds_decoded_values(self):
+        def footprint(value):
+            return sys.getsizeof(value) + sum(sys.getsizeof(word) + sys.getsizeof(count)
+                                              for word, count in value.items())
+        memory = self.cache_manager.memory
+        memory.max_bytes = 200 * 1024
+        for i in range(20):
+            self.cache_manager.set(f'cat{i}', {f'word{i}_{n}': n + 1000 for n in range(500)})
+        memory.delete('cat19')
+        self.cache_manager.get('cat19')
+
+        values = [value for _, value, _ in memory._entries.values()]
+        self.assertIn('cat19', memory._entries)
+        self.assertLess(len(values), 20)
+        self.assertLessEqual(sum(footprint(value) for value in values), memory.max_bytes)
+        self.assertLessEqual(memory.get_stats()['size_bytes'], memory.max_bytes)
+
+    def test_memory_tier_respects_expiration(self):
+        self.cache_manager.memory.set('old', {'word': 1}, size=10, expires_at=0)
+        self.assertIsNone(self.cache_manager.get('old'))
+
+    def test_binary_entries_and_legacy_json_are_readable(self):
+        legacy = CacheManager(cache_dir=app.config['CACHE_DIR'], cache_format='json')
+        legacy.set('old_key', {'word': 1})
+        binary = CacheManager(cache_dir=app.config['CACHE_DIR'], cache_format='binary')
+        self.assertEqual(binary.get('old_key'), {'word': 1})
+
+        binary.set('old_key', {'word': 2, 'other': 5})
+        self.assertFalse(os.path.exists(legacy._get_cache_path('old_key')))
+        binary.memory.delete('old_key')
+        self.assertEqual(binary.get('old_key'), {'word': 2, 'other': 5})
+        self.assertEqual(binary.get_stats()['total_entries'], 1)
+
+    def test_get_top_reads_sorted_entries(self):
+        manager = CacheManager(cache_dir=app.config['CACHE_DIR'], cache_format='binary',
+                               memory_max_entries=0)
+        manager.set('top_key', {'alpha': 5, 'beta': 9, 'gamma': 1, 'pi': 20})
+        top = manager.get_top('top_key', 2, predicate=lambda word, count: len(word) >= 3)
+        self.assertEqual(top, [('beta', 9), ('alpha', 5)])
+        self.assertIsNone(manager.get_top('missing', 2))
+
+    def stream(self, body):
+        response = self.app.post('/analyze/stream', data=json.dumps(body),
+                                 content_type='application/json')
+        lines = response.get_data(as_text=True).splitlines()
+        return response, [json.loads(line) for line in lines if line.strip()]
+
+    def test_stream_reports_progress_then_result(self):
+        def fake_analyze(category, depth, cache_key, store, progress=None):
+            progress({'discovered': 2, 'fetched': 1, 'analyzed': 1}, {'alpha': 3})
+            return {'frequencies': {'alpha': 3, 'beta': 2}, 'processed_pages': ['A', 'B'],
+                    'fetched_pages': 2}
+
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch('app.analyze_category', side_effect=fake_analyze):
+            response, events = self.stream({'category': 'Streamed'})
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([event['type'] for event in events], ['progress', 'snapshot', 'result'])
+        self.assertEqual(events[0]['discovered'], 2)
+        self.assertEqual(events[1]['top_words'], [['alpha', 3]])
+        self.assertEqual(events[2]['top_words'], [['alpha', 3], ['beta', 2]])
+        self.assertFalse(events[2]['cached'])
+        self.assertEqual(self.cache_manager.get(category_cache_key('Streamed', 0)), {'alpha': 3, 'beta': 2})
+
+    def test_stream_serves_cached_result_and_errors(self):
+        self.cache_manager.set(category_cache_key('Cached', 0), {'alpha': 5})
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch('app.analyze_category', return_value=None):
+            _, events = self.stream({'category': 'Cached'})
+            self.assertEqual([event['type'] for event in events], ['result'])
+            self.assertTrue(events[0]['cached'])
+
+            _, events = self.stream({'category': 'Empty'})
+            self.assertEqual(events, [{'type': 'error', 'error': 'No pages found in category',
+                                       'status': 404}])
+
+            response = self.app.post('/analyze/stream', data=json.dumps({'category': ''}),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_async_analysis_returns_job(self):
+        self.cache_manager.set(category_cache_key('Queued', 0), {'alpha': 5, 'beta': 4})
+        with mock.patch('app.cache_manager', self.cache_manager):
+            response = self.app.post('/analyze?async=1', data=json.dumps({'category': 'Queued'}),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            job_url = response.headers['Location']
+            for _ in range(100):
+                data = json.loads(self.app.get(job_url).data)
+                if data['status'] == 'done':
+                    break
+                time.sleep(0.01)
+        self.assertEqual(data['result']['top_words'], [['alpha', 5], ['beta', 4]])
+        self.assertEqual(self.app.get('/jobs/unknown').status_code, 404)
+
+    def test_async_analysis_rejected_when_queue_is_full(self):
+        with mock.patch('app.analysis_jobs.submit', side_effect=JobQueueFull('full')):
+            response = self.app.post('/analyze?async=1', data=json.dumps({'category': 'Busy'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_cleanup_route_runs_as_a_job(self):
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch.object(self.cache_manager, 'cleanup', return_value=2), \
+                mock.patch('app.page_store.prune', return_value=7):
+            response = self.app.get('/cache/cleanup')
+            self.assertEqual(response.status_code, 202)
+            job_url = response.headers['Location']
+            for _ in range(100):
+                data = json.loads(self.app.get(job_url).data)
+                if data['status'] == 'done':
+                    break
+                time.sleep(0.01)
+        self.assertEqual((data['result']['cleaned_entries'], data['result']['pruned_page_rows']), (2, 7))
+
+    def test_stats_follow_writes_from_any_manager(self):
+        writer = CacheManager(cache_dir=app.config['CACHE_DIR'])
+        self.assertEqual(self.cache_manager.get_stats()['total_entries'], 0)
+        writer.set('a', {'word': 1})
+        writer.set('a', {'word': 2})
+        writer.set('b', {'word': 3})
+        # Another manager's writes are picked up once its scan expires
+        self.cache_manager.STATS_TTL = 0
+        stats = self.cache_manager.get_stats()
+        self.assertEqual(stats['total_entries'], 2)
+        self.assertEqual(stats['size_bytes'], sum(
+            os.path.getsize(writer._get_cache_path(key)) for key in ('a', 'b')))
+
+        self.cache_manager.delete('a')
+        self.assertEqual(self.cache_manager.get_stats()['total_entries'], 1)
+
+    def test_writes_leave_no_temporary_files(self):
+        with mock.patch.object(self.cache_manager.format, 'write', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.cache_manager.set('broken', {'word': 1})
+        self.cache_manager.set('ok', {'word': 1})
+        files = [name for name in os.listdir(app.config['CACHE_DIR']) if not name.startswith('entries.sqlite3')]
+        self.assertEqual(sorted(files),
+                         sorted(['metadata.json', os.path.basename(self.cache_manager._get_cache_path('ok'))]))
+
+    def test_cleanup_uses_the_expiry_index(self):
+        for key in ('old 1', 'old 2', 'old 3', 'fresh'):
+            self.cache_manager.set(key, {'word': 1})
+        # Backdate three entries; their files are never opened by cleanup
+        with self.cache_manager.index._conn:
+            self.cache_manager.index._conn.execute(
+                "UPDATE entries SET written_at = written_at - 48 * 3600 WHERE key LIKE 'old%'")
+        fmt = self.cache_manager.format
+        with mock.patch.object(fmt, 'read', side_effect=AssertionError('cache file read')), \
+                mock.patch.object(fmt, 'read_header', side_effect=AssertionError('cache file read')):
+            self.assertEqual(self.cache_manager.cleanup(time_budget=0), 0)
+            self.assertEqual(self.cache_manager.cleanup(time_budget=1), 3)
+        self.assertIsNone(self.cache_manager.get('old 1'))
+        self.assertEqual(self.cache_manager.get('fresh'), {'word': 1})
+
+    def test_existing_entries_are_indexed_once(self):
+        self.cache_manager.set('a', {'word': 1})
+        os.remove(os.path.join(app.config['CACHE_DIR'], 'entries.sqlite3'))
+        reopened = CacheManager(cache_dir=app.config['CACHE_DIR'], expiration_hours=1)
+        self.assertEqual(reopened.index.size_bytes(), os.path.getsize(reopened._get_cache_path('a')))
+        self.assertEqual(reopened.cleanup(max_age_hours=-1), 1)
+        self.assertIsNone(reopened.get('a'))
+
+    def test_evicts_least_recently_used_entries_over_max_bytes(self):
+        cache = CacheManager(cache_dir=app.config['CACHE_DIR'], memory_max_entries=0)
+        value = {f"word{number}": number for number in range(50)}
+        for key in ('a', 'b', 'c'):
+            cache.set(key, value)
+            time.sleep(0.01)
+        entry_size = os.path.getsize(cache._get_cache_path('a'))
+        cache.get('a')
+        # Over the limit with four entries, under its 90% low-water mark with three
+        cache.max_bytes = int(entry_size * 3.4)
+        cache.set('d', value)
+        # 'b' was used least recently; one eviction brings the cache under the limit
+        self.assertIsNone(cache.get('b'))
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(cache.get(key), value)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_background_cleanup_removes_expired_entries(self):
+        cache = CacheManager(cache_dir=app.config['CACHE_DIR'], expiration_hours=0)
+        cache.set('a', {'word': 1})
+        cache.start_background_cleanup(interval=0.01, time_slice=0.01)
+        self.addCleanup(cache.stop_background_cleanup)
+        deadline = time.monotonic() + 5
+        while os.path.exists(cache._get_cache_path('a')) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(os.path.exists(cache._get_cache_path('a')))
+
+    def write_aged(self, cache, key, value, age_hours):
+        with mock.patch('cache_manager.time.time', return_value=time.time() - age_hours * 3600):
+            cache.set(key, value)
+        cache.memory.delete(key)
+
+    def test_expired_entries_are_served_stale_until_hard_expiry(self):
+        cache = CacheManager(cache_dir=app.config['CACHE_DIR'], expiration_hours=1, max_stale_hours=2)
+        self.write_aged(cache, 'stale', {'word': 1}, 2)
+        self.write_aged(cache, 'dead', {'word': 1}, 4)
+        self.assertEqual(cache.get_entry('stale'), ({'word': 1}, True))
+        self.assertIsNone(cache.get('stale'))
+        self.assertIsNone(cache.get_top('stale', 5))
+        self.assertIsNone(cache.get_entry('dead'))
+        self.assertFalse(os.path.exists(cache._get_cache_path('dead')))
+        self.assertEqual(cache.cleanup(), 0)
+        self.assertEqual(cache.cleanup(max_age_hours=1), 1)
+
+    def test_stale_analysis_is_served_while_one_refresh_runs(self):
+        cache = CacheManager(cache_dir=app.config['CACHE_DIR'], expiration_hours=1, max_stale_hours=2)
+        self.write_aged(cache, category_cache_key('Owls', 0), {'owl': 1}, 2)
+        crawls = []
+
+        def crawl(category, depth, cache_key, progress=None):
+            crawls.append(cache_key)
+            cache.set(cache_key, {'owl': 2})
+
+        with mock.patch('app.cache_manager', cache), mock.patch('app._crawl_category', crawl):
+            responses = [json.loads(self.app.post('/analyze', json={'category': 'Owls'}).data)
+                         for _ in range(2)]
+            self.assertTrue(all(response['cached'] for response in responses))
+            self.assertTrue(responses[0]['stale'])
+            self.assertEqual(responses[0]['top_words'], [['owl', 1]])
+            deadline = time.monotonic() + 5
+            while cache.get(category_cache_key('Owls', 0)) is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            data = json.loads(self.app.post('/analyze', json={'category': 'Owls'}).data)
+        self.assertFalse(data['stale'])
+        self.assertEqual(data['top_words'], [['owl', 2]])
+        self.assertEqual(crawls, [category_cache_key('Owls', 0)])
+
+    def test_word_index_follows_cache_writes(self):
+        index = WordIndex(os.path.join(app.config['CACHE_DIR'], 'index.sqlite3'))
+        self.addCleanup(index.close)
+        # Written before the listener existed, picked up by a rebuild
+        self.cache_manager.set(category_cache_key('Physics', 0), {'energy': 40, 'the': 100, 'common': 10})
+        self.cache_manager.add_listener(index.add)
+        self.cache_manager.set(category_cache_key('Biology', 0), {'cell': 50, 'the': 90, 'common': 10})
+        self.assertEqual(index.get_stats()['categories'], 1)
+
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch('app.word_index', index):
+            response = self.app.post('/index/rebuild')
+            self.assertEqual(json.loads(response.data)['indexed'], 2)
+
+            response = self.app.get('/index/distinctive?category=Physics&top_k=5')
+            data = json.loads(response.data)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([entry['word'] for entry in data['words']], ['energy'])
+
+            response = self.app.get('/index/words/the')
+            data = json.loads(response.data)
+            self.assertEqual([entry['category'] for entry in data['categories']], ['Physics', 'Biology'])
+
+            self.assertEqual(self.app.get('/index/distinctive?category=Chemistry').status_code, 404)
+            self.assertEqual(self.app.get('/index/distinctive?category=Physics&method=x').status_code, 400)
+
+    def test_get_analysis_serves_stored_bytes_with_etag(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        responses = ResponseCache(directory)
+        self.cache_manager.add_delete_listener(responses.delete)
+        self.cache_manager.set(category_cache_key('Owls', 0), {'owl': 3, 'barn': 2, 'of': 9})
+
+        with mock.patch('app.cache_manager', self.cache_manager), \
+                mock.patch('app.response_cache', responses):
+            response = self.app.get('/analyze/Owls', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+            etag = response.headers['ETag']
+            self.assertFalse(etag.startswith('W/'))
+            data = json.loads(gzip.decompress(response.data))
+            self.assertEqual(data['category'], 'Owls')
+            self.assertEqual(data['frequencies'], {'owl': 3, 'barn': 2, 'of': 9})
+            self.assertEqual(data['top_words'][0], ['owl', 3])
+
+            # Served from the stored body, with or without compression
+            with mock.patch('app._analysis_document', side_effect=AssertionError), \
+                    mock.patch('gzip.decompress', side_effect=AssertionError):
+                again = self.app.get('/analyze/Owls', headers={'Accept-Encoding': 'gzip'})
+                plain = self.app.get('/analyze/Owls')
+            self.assertEqual(again.data, response.data)
+            self.assertEqual(again.headers['ETag'], etag)
+            self.assertNotIn('Content-Encoding', plain.headers)
+            self.assertEqual(json.loads(plain.data), data)
+
+            not_modified = self.app.get('/analyze/Owls', headers={'Accept-Encoding': 'gzip',
+                                                                  'If-None-Match': etag})
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.data, b'')
+            self.assertEqual(not_modified.headers['ETag'], etag)
+
+            # A rewritten entry gets a new tag and body
+            time.sleep(0.01)
+            self.cache_manager.set(category_cache_key('Owls', 0), {'owl': 4})
+            response = self.app.get('/analyze/Owls', headers={'Accept-Encoding': 'gzip',
+                                                              'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+            self.assertEqual(json.loads(gzip.decompress(response.data))['frequencies'], {'owl': 4})
+
+        self.cache_manager.delete(category_cache_key('Owls', 0))
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_get_analysis_does_not_capture_the_stream_route(self):
+        with mock.patch('app._run_analysis', side_effect=AssertionError):
+            self.assertEqual(self.app.get('/analyze/stream').status_code, 405)
+
+
 if __name__ == '__main__':
     unittest.main()
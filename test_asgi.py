@@ -0,0 +1,131 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import asgi
+import metrics
+from cache_manager import CacheManager
+from category_analysis import category_cache_key
+from response_cache import ResponseCache
+
+
+async def call(method, path, body=b'', query=b'', headers=()):
+    """Run one request through the ASGI app, returning (status, headers, body)."""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query,
+             'root_path': '', 'client': ('127.0.0.1', 40000), 'server': ('testserver', 80),
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.application(scope, receive, send)
+    start = sent[0]
+    response_headers = {name.decode(): value.decode() for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+class AsgiTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.cache = CacheManager(cache_dir=os.path.join(self.tmp_dir, 'cache'))
+        self.responses = ResponseCache(os.path.join(self.tmp_dir, 'responses'))
+        for patcher in (mock.patch('app.cache_manager', self.cache),
+                        mock.patch('app.response_cache', self.responses)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cached_analysis_is_served_on_the_event_loop(self):
+        self.cache.set(category_cache_key('Owls', 0), {'owl': 5, 'barn': 3, 'hoot': 1})
+        status, headers, body = asyncio.run(call('POST', '/analyze',
+                                                 json.dumps({'category': 'Owls', 'top_k': 2}).encode()))
+        self.assertEqual(status, 200)
+        data = json.loads(body)
+        self.assertTrue(data['cached'])
+        self.assertEqual(data['top_words'], [['owl', 5], ['barn', 3]])
+        self.assertIn('cache_lookup', data['timings'])
+        self.assertIn('cache_lookup;dur=', headers['server-timing'])
+        self.assertEqual(headers['access-control-allow-origin'], '*')
+
+        status, _, body = asyncio.run(call('POST', '/analyze', b'{"category": ""}'))
+        self.assertEqual(status, 400)
+        self.assertIn('error', json.loads(body))
+
+    def test_concurrent_cold_requests_share_one_crawl(self):
+        crawls = []
+        threads = set()
+
+        def crawl(category, depth, cache_key, progress=None):
+            crawls.append(cache_key)
+            threads.add(threading.current_thread().name)
+            with metrics.phase('fetch'):
+                time.sleep(0.2)
+            self.cache.set(cache_key, {'owl': 2})
+            return {'frequencies': {'owl': 2}, 'processed_pages': ['Owl'], 'fetched_pages': 1,
+                    'error_bound': 0, 'cached': False}
+
+        async def many():
+            body = json.dumps({'category': 'Owls'}).encode()
+            return await asyncio.gather(*(call('POST', '/analyze', body) for _ in range(200)))
+
+        with mock.patch('app._crawl_category', crawl):
+            results = asyncio.run(many())
+        self.assertEqual(crawls, [category_cache_key('Owls', 0)])
+        self.assertTrue(all(thread.startswith('asgi-crawl') for thread in threads))
+        self.assertEqual({status for status, _, _ in results}, {200})
+        self.assertEqual(json.loads(results[-1][2])['top_words'], [['owl', 2]])
+        # Every request charges its wait to the crawl; the crawl's own phases are not any request's
+        for _, _, body in results:
+            timings = json.loads(body)['timings']
+            self.assertIn('crawl', timings)
+            self.assertNotIn('fetch', timings)
+
+    def test_get_analysis_revalidates_with_etag(self):
+        self.cache.set(category_cache_key('Owls', 0), {'owl': 5, 'barn': 3})
+        status, headers, body = asyncio.run(call('GET', '/analyze/Owls',
+                                                 headers=[('accept-encoding', 'gzip')]))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(body))['frequencies'], {'owl': 5, 'barn': 3})
+
+        status, _, body = asyncio.run(call('GET', '/analyze/Owls', headers=[
+            ('accept-encoding', 'gzip'), ('if-none-match', headers['etag'])]))
+        self.assertEqual((status, body), (304, b''))
+
+    def test_other_routes_go_through_flask(self):
+        self.cache.set(category_cache_key('Owls', 0), {'owl': 5})
+        status, headers, body = asyncio.run(call('GET', '/cache/stats'))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['total_entries'], 1)
+
+        request_body = json.dumps({'category': 'Owls'}).encode()
+        status, headers, body = asyncio.run(call(
+            'POST', '/analyze/stream', request_body,
+            headers=[('content-type', 'application/json'), ('content-length', str(len(request_body)))]))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'application/x-ndjson')
+        events = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+        self.assertEqual(events[-1]['type'], 'result')
+        self.assertEqual(events[-1]['top_words'], [['owl', 5]])
+
+        status, _, _ = asyncio.run(call('GET', '/jobs/unknown'))
+        self.assertEqual(status, 404)
+
+        status, _, _ = asyncio.run(call('GET', '/analyze/stream'))
+        self.assertEqual(status, 405)
+
+
+if __name__ == '__main__':
+    unittest.main()
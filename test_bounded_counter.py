@@ -0,0 +1,58 @@
+import pickle
+import unittest
+from collections import Counter
+from bounded_counter import BoundedCounter
+
+
+class BoundedCounterTests(unittest.TestCase):
+    def test_unbounded_counts_are_exact(self):
+        counter = BoundedCounter()
+        counter.update({'owl': 2, 'bat': 1})
+        counter.update(['owl', 'wren'])
+        self.assertEqual(counter, Counter({'owl': 3, 'bat': 1, 'wren': 1}))
+        self.assertFalse(counter.approximate)
+
+    def test_prunes_tail_and_tracks_error(self):
+        counter = BoundedCounter(max_words=4, keep_fraction=0.5)
+        counter.update({'a': 10, 'b': 8, 'c': 3, 'd': 2})
+        counter.update({'e': 1})
+        # Ranks past 2 are dropped, the third count bounds the error
+        self.assertEqual(counter, Counter({'a': 10, 'b': 8}))
+        self.assertEqual(counter.error, 3)
+        self.assertEqual(counter.pruned_words, 3)
+
+        counter.update({'c': 1, 'f': 1, 'g': 1})
+        self.assertEqual(counter.error, 4)
+        self.assertEqual(counter, Counter({'a': 10, 'b': 8}))
+        counter.update({'h': 1})
+        self.assertEqual(counter, Counter({'a': 10, 'b': 8, 'h': 1}))
+
+    def test_true_counts_stay_within_the_error(self):
+        counter = BoundedCounter(max_words=50)
+        exact = Counter()
+        for number in range(2000):
+            page = {f"w{number % 7}": 3, f"w{number % 97}": 1, f"rare{number}": 1}
+            exact.update(page)
+            counter.update(page)
+        self.assertLessEqual(len(counter), 50)
+        for word, count in exact.items():
+            self.assertLessEqual(counter[word], count)
+            self.assertLessEqual(count, counter[word] + counter.error)
+        self.assertEqual([word for word, _ in counter.most_common(7)],
+                         [word for word, _ in exact.most_common(7)])
+
+    def test_interns_new_words(self):
+        counter = BoundedCounter()
+        word = ''.join(['ow', 'ls'])
+        counter.update({word: 1})
+        self.assertIs(next(iter(counter)), 'owls')
+
+    def test_copies_and_pickles_as_counter(self):
+        counter = BoundedCounter(max_words=10)
+        counter.update({'owl': 2})
+        self.assertEqual(type(counter.copy()), Counter)
+        self.assertEqual(pickle.loads(pickle.dumps(counter)), Counter({'owl': 2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import random
+import unittest
+from cache_formats import BinaryFormat, JsonFormat, get_format
+
+
+def frequency_table(size=5000):
+    random.seed(7)
+    return {f"word{i}": random.randint(1, 10_000) for i in range(size)}
+
+
+class BinaryFormatTests(unittest.TestCase):
+    def write(self, cache_format, value):
+        f = io.BytesIO()
+        cache_format.write(f, 'Physics', 1700000000.5, value)
+        f.seek(0)
+        return f
+
+    def test_round_trip_for_every_compression(self):
+        value = frequency_table()
+        for compression in ('none', 'zlib', 'lzma'):
+            f = self.write(BinaryFormat(compression), value)
+            self.assertEqual(BinaryFormat().read(f), (1700000000.5, 'Physics', value))
+
+    def test_header_is_read_without_the_body(self):
+        f = self.write(BinaryFormat(), frequency_table())
+        self.assertEqual(BinaryFormat().read_header(f), (1700000000.5, 'Physics'))
+        self.assertLess(f.tell(), 64)
+
+    def test_items_stream_in_count_order_and_stop_early(self):
+        value = frequency_table(50_000)
+        f = self.write(BinaryFormat(), value)
+        items = BinaryFormat().iter_items(f)
+        top = [next(items) for _ in range(10)]
+        expected = sorted(value.items(), key=lambda item: (-item[1], item[0]))[:10]
+        self.assertEqual(top, expected)
+        self.assertLess(f.tell(), len(f.getvalue()))
+
+    def test_smaller_than_json(self):
+        value = frequency_table(20_000)
+        binary = self.write(BinaryFormat(), value).getvalue()
+        json_data = self.write(JsonFormat(), value).getvalue()
+        self.assertLess(len(binary) * 2, len(json_data))
+
+    def test_only_frequency_tables_are_binary(self):
+        self.assertTrue(BinaryFormat().can_store({'word': 3}))
+        self.assertFalse(BinaryFormat().can_store({'test': 'data'}))
+        self.assertFalse(BinaryFormat().can_store(['word']))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            get_format('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+import category_analysis
+from page_store import PageStore
+from text_analyzer import analyze_text, analyzer_fingerprint
+
+
+class FakeWiki:
+    """Serves categories, revision ids and extracts from dicts."""
+
+    def __init__(self, categories, pages):
+        self.categories = categories
+        self.pages = pages  # title -> (revid, text)
+        self.fetched = []
+
+    def members(self, category, max_depth=None):
+        return iter(self.categories.get(category, []))
+
+    def revisions(self, titles):
+        for title in titles:
+            yield title, self.pages.get(title, (0, ''))[0]
+
+    def contents(self, titles, revisions=None):
+        for title in titles:
+            self.fetched.append(title)
+            yield title, self.pages.get(title, (0, ''))[1]
+
+
+class IncrementalAnalysisTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = PageStore(os.path.join(self.tmp_dir, 'pages.sqlite3'))
+        self.wiki = FakeWiki(
+            categories={'Birds': ['Crow', 'Owl', 'Wren'], 'Night': ['Owl', 'Bat']},
+            pages={
+                'Crow': (1, 'crows are clever black birds'),
+                'Owl': (5, 'owls hunt at night, owls are quiet birds'),
+                'Wren': (9, 'wrens are small brown birds'),
+                'Bat': (3, 'bats fly at night'),
+            }
+        )
+        patches = [
+            mock.patch.object(category_analysis, 'iter_category_members', self.wiki.members),
+            mock.patch.object(category_analysis, 'iter_page_revisions', self.wiki.revisions),
+            mock.patch.object(category_analysis, 'iter_pages_content', self.wiki.contents),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def analyze(self, category):
+        self.wiki.fetched.clear()
+        return category_analysis.analyze_category(category, 0, category, self.store, analyzer='fast')
+
+    def expected(self, category):
+        totals = Counter()
+        for title in self.wiki.categories[category]:
+            totals.update(analyze_text(self.wiki.pages[title][1], 'fast'))
+        return dict(totals)
+
+    def test_refresh_fetches_only_changed_pages(self):
+        result = self.analyze('Birds')
+        self.assertEqual(result['frequencies'], self.expected('Birds'))
+        self.assertEqual(sorted(self.wiki.fetched), ['Crow', 'Owl', 'Wren'])
+
+        self.wiki.pages['Owl'] = (6, 'owls sleep by day')
+        result = self.analyze('Birds')
+        self.assertEqual(self.wiki.fetched, ['Owl'])
+        self.assertEqual(result['fetched_pages'], 1)
+        self.assertEqual(result['frequencies'], self.expected('Birds'))
+
+    def test_categories_share_page_counts(self):
+        self.analyze('Birds')
+        result = self.analyze('Night')
+        self.assertEqual(self.wiki.fetched, ['Bat'])
+        self.assertEqual(result['frequencies'], self.expected('Night'))
+
+    def test_removed_pages_are_subtracted(self):
+        self.analyze('Birds')
+        self.wiki.categories['Birds'] = ['Crow', 'Wren']
+        result = self.analyze('Birds')
+        self.assertEqual(self.wiki.fetched, [])
+        self.assertEqual(result['frequencies'], self.expected('Birds'))
+        self.assertNotIn('owls', result['frequencies'])
+
+    def test_rebuilds_when_old_revisions_were_pruned(self):
+        self.analyze('Birds')
+        self.wiki.pages['Owl'] = (6, 'owls sleep by day')
+        self.analyze('Night')
+        self.store.prune(max_age_hours=0)
+        result = self.analyze('Birds')
+        self.assertEqual(self.wiki.fetched, [])
+        self.assertEqual(result['frequencies'], self.expected('Birds'))
+
+    def test_empty_category(self):
+        self.assertIsNone(self.analyze('Nothing'))
+
+    def test_cache_keys_carry_the_analyzer_fingerprint(self):
+        key = category_analysis.category_cache_key('Birds', 2, 'fast')
+        self.assertEqual(key, f"Birds|depth=2|analyzer={analyzer_fingerprint('fast')}")
+        self.assertEqual(category_analysis.parse_cache_key(key), ('Birds', 2))
+        self.assertEqual(category_analysis.parse_cache_key('Birds|depth=2'), ('Birds', 2))
+        self.assertEqual(category_analysis.parse_cache_key('Birds'), ('Birds', 0))
+
+    def add_long_tail_category(self):
+        # 'common' is on every page, each page also has a few words of its own
+        titles = [f"Page {number}" for number in range(40)]
+        self.wiki.categories['Tail'] = titles
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        for number, title in enumerate(titles):
+            tag = letters[number // 26] + letters[number % 26]
+            self.wiki.pages[title] = (1, f"common common common shared{letters[number % 3]} "
+                                         f"unique{tag} other{tag}")
+
+    def test_vocabulary_budget_bounds_the_error(self):
+        self.add_long_tail_category()
+        expected = self.expected('Tail')
+        result = category_analysis.analyze_category('Tail', 0, 'Tail', self.store, analyzer='fast',
+                                                    max_words=20, tolerance=1000)
+        error = result['error_bound']
+        self.assertGreater(error, 0)
+        self.assertLessEqual(len(result['frequencies']), 20)
+        for word, count in result['frequencies'].items():
+            self.assertLessEqual(count, expected[word])
+            self.assertLessEqual(expected[word], count + error)
+        for word in set(expected) - set(result['frequencies']):
+            self.assertLessEqual(expected[word], error)
+        self.assertEqual(result['frequencies']['common'], 120)
+
+    def test_counts_above_tolerance_are_recounted(self):
+        self.add_long_tail_category()
+        expected = self.expected('Tail')
+        result = category_analysis.analyze_category('Tail', 0, 'Tail', self.store, analyzer='fast',
+                                                    max_words=20, tolerance=0)
+        self.assertGreater(result['error_bound'], 0)
+        for word, count in result['frequencies'].items():
+            self.assertEqual(count, expected[word])
+        # Pruned totals are not reused, the next run rebuilds from the page store
+        self.assertIsNone(self.store.get_manifest('Tail', analyzer_fingerprint('fast')))
+        self.wiki.fetched.clear()
+        result = category_analysis.analyze_category('Tail', 0, 'Tail', self.store, analyzer='fast',
+                                                    max_words=0)
+        self.assertEqual(self.wiki.fetched, [])
+        self.assertEqual(result['frequencies'], expected)
+        self.assertEqual(result['error_bound'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import bz2
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+from xml.sax.saxutils import escape
+import dump_ingest
+import parallel_analyzer
+from cache_manager import CacheManager
+from category_analysis import category_cache_key
+from config import Config
+from page_store import PageStore
+from text_analyzer import analyze_text, analyzer_fingerprint
+
+HEADER = ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" xml:lang="en">\n'
+          '  <siteinfo><sitename>Wikipedia</sitename></siteinfo>\n')
+
+# (id, namespace, title, revid, wikitext, redirect)
+PAGES = [
+    (1, 0, 'Owl', 101, "The '''owl''' hunts mice at night.{{Citation needed}}\n"
+                       "[[File:Owl.jpg|thumb|A [[tawny owl]] perched]]\n[[Category:Owls]]", False),
+    (2, 0, 'Barn owl', 102, "Barn owls hunt voles in open [[farmland|fields]].<ref>Smith</ref>\n"
+                            "[[Category:Owls]]\n[[Category:Farm birds]]", False),
+    (3, 14, 'Category:Owls', 103, "Owls. [[Category:Birds]]", False),
+    (4, 0, 'Owls', 104, "#REDIRECT [[Owl]]", True),
+    (5, 0, 'Sparrow', 105, "== Diet ==\nSparrows eat seeds &amp; insects.\n[[Category:Birds]]", False),
+]
+
+
+def page_xml(page_id, namespace, title, revid, text, redirect):
+    return (f"  <page>\n    <title>{escape(title)}</title>\n    <ns>{namespace}</ns>\n"
+            f"    <id>{page_id}</id>\n" + ('    <redirect title="Owl" />\n' if redirect else '')
+            + f"    <revision>\n      <id>{revid}</id>\n"
+            f'      <text xml:space="preserve">{escape(text)}</text>\n    </revision>\n  </page>\n')
+
+
+class DumpIngestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        # A multistream dump: a header stream, two pages per stream, a footer stream
+        self.dump = os.path.join(self.tmp_dir, 'pages-articles-multistream.xml.bz2')
+        self.index = os.path.join(self.tmp_dir, 'pages-articles-multistream-index.txt.bz2')
+        index_lines = []
+        with open(self.dump, 'wb') as f:
+            f.write(bz2.compress(HEADER.encode('utf-8')))
+            for start in range(0, len(PAGES), 2):
+                offset = f.tell()
+                chunk = PAGES[start:start + 2]
+                index_lines.extend(f"{offset}:{page[0]}:{page[2]}" for page in chunk)
+                f.write(bz2.compress(''.join(page_xml(*page) for page in chunk).encode('utf-8')))
+            f.write(bz2.compress(b'</mediawiki>\n'))
+        with bz2.open(self.index, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(index_lines) + '\n')
+
+    def test_strip_wikitext_keeps_prose(self):
+        text = dump_ingest.strip_wikitext(PAGES[0][4] + "\n{| class=x\n| cell\n|}\n[https://x.org the site]")
+        self.assertEqual(text.split(), ['The', 'owl', 'hunts', 'mice', 'at', 'night.', 'the', 'site'])
+        self.assertEqual(dump_ingest.strip_wikitext(PAGES[4][4]).split(),
+                         ['Diet', 'Sparrows', 'eat', 'seeds', '&', 'insects.'])
+
+    def test_multistream_and_sequential_reads_agree(self):
+        sequential = list(dump_ingest.iter_xml_pages(self.dump))
+        self.assertEqual([page.title for page in sequential], ['Owl', 'Barn owl', 'Category:Owls', 'Sparrow'])
+        self.assertEqual(sequential[1].revid, 102)
+        self.assertEqual(sequential[1].categories, ('Owls', 'Farm birds'))
+        self.assertEqual(list(dump_ingest.iter_xml_pages(self.dump, self.index, workers=1)), sequential)
+        self.assertEqual(list(dump_ingest.iter_xml_pages(self.dump, self.index, workers=2)), sequential)
+
+    def test_parsing_and_tokenizing_share_one_pool(self):
+        self.addCleanup(parallel_analyzer.shutdown)
+        get_pool, pools = parallel_analyzer.get_pool, []
+
+        def recording_get_pool(workers):
+            pools.append(get_pool(workers))
+            return pools[-1]
+
+        cache = CacheManager(cache_dir=os.path.join(self.tmp_dir, 'cache'), memory_max_entries=0)
+        store = PageStore(os.path.join(self.tmp_dir, 'pages.sqlite3'))
+        self.addCleanup(store.close)
+        with mock.patch('dump_ingest.get_pool', recording_get_pool), \
+                mock.patch('parallel_analyzer.get_pool', recording_get_pool), \
+                mock.patch.object(Config, 'PARALLEL_ANALYSIS_THRESHOLD', 1), \
+                dump_ingest.DumpIngester(cache, store) as ingester:
+            loaded = ingester.load_pages(dump_ingest.iter_xml_pages(self.dump, self.index, workers=2),
+                                         workers=2)
+        self.assertEqual(loaded['analyzed'], 3)
+        self.assertEqual(len(pools), 2)
+        self.assertIs(pools[0], pools[1])
+
+    def test_reads_categorylinks_sql_and_tsv(self):
+        sql = os.path.join(self.tmp_dir, 'categorylinks.sql')
+        with open(sql, 'w', encoding='utf-8') as f:
+            f.write("CREATE TABLE `categorylinks` (...);\n"
+                    "INSERT INTO `categorylinks` VALUES (1,'Owls','OWL','2020-01-01 00:00:00','',"
+                    "'uca-default-u-kn','page'),(3,'Birds','OWLS\\'S (1,\\'X\\')','2020-01-01 00:00:00',"
+                    "'','uca-default-u-kn','subcat'),(2,'Farm_birds','BARN OWL','2020-01-01 00:00:00',"
+                    "'','uca-default-u-kn','page');\n")
+        self.assertEqual(list(dump_ingest.iter_categorylinks(sql)),
+                         [(1, 'Owls'), (3, 'Birds'), (2, 'Farm birds')])
+
+        tsv = os.path.join(self.tmp_dir, 'categorylinks.tsv')
+        with open(tsv, 'w', encoding='utf-8') as f:
+            f.write("page_id\tcategory\n1\tOwls\n5\tBirds\tpage\n")
+        self.assertEqual(list(dump_ingest.iter_categorylinks(tsv)), [(1, 'Owls'), (5, 'Birds')])
+
+    def test_ingest_fills_cache_and_page_store(self):
+        cache = CacheManager(cache_dir=os.path.join(self.tmp_dir, 'cache'), memory_max_entries=0)
+        store = PageStore(os.path.join(self.tmp_dir, 'pages.sqlite3'))
+        self.addCleanup(store.close)
+        with dump_ingest.DumpIngester(cache, store) as ingester:
+            loaded = ingester.load_pages(dump_ingest.iter_xml_pages(self.dump, self.index, workers=1))
+            self.assertEqual(loaded, {'pages': 4, 'analyzed': 3, 'skipped': 0})
+            self.assertEqual(list(ingester.categories()), ['Birds', 'Farm birds', 'Owls'])
+            self.assertEqual(ingester.write_categories(), {'written': 3, 'empty': 0})
+            self.assertEqual(ingester.write_categories(depth=1, categories=['Birds']),
+                             {'written': 1, 'empty': 0})
+        self.assertFalse([name for name in os.listdir(self.tmp_dir) if name.startswith('.dump-')])
+
+        counts = {page[2]: analyze_text(dump_ingest.strip_wikitext(page[4])) for page in PAGES}
+        self.assertEqual(cache.get(category_cache_key('Owls', 0)), counts['Owl'] + counts['Barn owl'])
+        self.assertEqual(cache.get(category_cache_key('Birds', 0)), counts['Sparrow'])
+        self.assertEqual(cache.get(category_cache_key('Birds', 1)),
+                         counts['Sparrow'] + counts['Owl'] + counts['Barn owl'])
+        # Stored like a live crawl, so a refresh only downloads changed pages
+        self.assertEqual(store.get_pages({'Owl': 101}, analyzer_fingerprint())['Owl'], counts['Owl'])
+        pages, totals = store.get_manifest(category_cache_key('Owls', 0), analyzer_fingerprint())
+        self.assertEqual(pages, {'Owl': 101, 'Barn owl': 102})
+        self.assertEqual(Counter(totals), cache.get(category_cache_key('Owls', 0)))
+
+    def test_main_uses_categorylinks_and_jsonl_dump(self):
+        dump = os.path.join(self.tmp_dir, 'extracts.jsonl')
+        with open(dump, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'id': 1, 'revid': 11, 'title': 'Owl', 'text': 'Owls hunt mice.'}) + '\n')
+            f.write(json.dumps({'id': 2, 'title': 'Unversioned', 'text': 'Never stored.'}) + '\n')
+        links = os.path.join(self.tmp_dir, 'categorylinks.tsv')
+        with open(links, 'w', encoding='utf-8') as f:
+            f.write("1\tNight_birds\n2\tNight_birds\n")
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            dump_ingest.main([dump, '--categorylinks', links, '--cache-dir', cache_dir])
+        self.assertIn('1 categories cached', stderr.getvalue())
+        cache = CacheManager(cache_dir=cache_dir)
+        self.assertEqual(cache.get(category_cache_key('Night birds', 0)), analyze_text('Owls hunt mice.'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+from jobs import JobQueue, JobQueueFull
+
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class JobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocking(self, result):
+        def run(job):
+            job.progress['step'] = 1
+            self.release.wait(5)
+            return result
+        return run
+
+    def test_runs_job_and_reports_result(self):
+        queue = JobQueue(workers=1, max_queued=2)
+        job, created = queue.submit('a', lambda job: 42)
+        self.assertTrue(created)
+        wait_for(job)
+        self.assertEqual(queue.get(job.id).to_dict()['result'], 42)
+        self.assertEqual(job.status, 'done')
+
+    def test_deduplicates_active_jobs(self):
+        queue = JobQueue(workers=1, max_queued=2)
+        first, _ = queue.submit('a', self.blocking(1))
+        second, created = queue.submit('a', self.blocking(2))
+        self.assertFalse(created)
+        self.assertIs(first, second)
+        self.release.set()
+        wait_for(first)
+        # A finished job is not reused
+        third, created = queue.submit('a', lambda job: 3)
+        self.assertTrue(created)
+        self.assertEqual(wait_for(third).result, 3)
+
+    def test_refuses_jobs_when_queue_is_full(self):
+        queue = JobQueue(workers=1, max_queued=1)
+        running, _ = queue.submit('a', self.blocking(1))
+        while running.status != 'running':
+            time.sleep(0.01)
+        queue.submit('b', self.blocking(2))
+        with self.assertRaises(JobQueueFull):
+            queue.submit('c', self.blocking(3))
+        self.assertEqual(queue.get_stats()['queued'], 1)
+
+    def test_failed_jobs_keep_error(self):
+        queue = JobQueue(workers=1)
+
+        def fail(job):
+            raise LookupError('No pages found in category')
+
+        job, _ = queue.submit('a', fail)
+        data = wait_for(job).to_dict()
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['error'], 'No pages found in category')
+
+    def test_finished_jobs_expire(self):
+        queue = JobQueue(workers=1, result_ttl=0)
+        job, _ = queue.submit('a', lambda job: 1)
+        wait_for(job)
+        time.sleep(0.01)
+        self.assertIsNone(queue.get(job.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
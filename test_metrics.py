@@ -0,0 +1,36 @@
+import unittest
+import metrics
+
+
+class MetricsTests(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram('test_seconds', 'Test latency', ('phase',), buckets=(0.1, 1))
+        histogram.observe(0.05, phase='a')
+        histogram.observe(0.5, phase='a')
+        histogram.observe(5, phase='a')
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{phase="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{phase="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{phase="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{phase="a"} 3', lines)
+
+    def test_nested_phases_are_charged_exclusively(self):
+        timings, token = metrics.start_request()
+        try:
+            with metrics.phase('tokenize'):
+                for _ in metrics.timed_iter('fetch', iter(range(3))):
+                    pass
+        finally:
+            metrics.finish_request(timings, token)
+        self.assertEqual(set(timings.phases), {'tokenize', 'fetch'})
+        self.assertLessEqual(sum(timings.phases.values()), timings.total())
+        self.assertIsNone(metrics.current())
+
+    def test_phases_are_free_outside_requests(self):
+        with metrics.phase('cache_lookup'):
+            pass
+        self.assertEqual(list(metrics.timed_iter('fetch', [1, 2])), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
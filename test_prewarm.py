@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+import metrics
+from cache_manager import CacheManager
+from prewarm import PrewarmScheduler
+
+
+class PrewarmSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.cache = CacheManager(cache_dir=os.path.join(self.tmp_dir, 'cache'), expiration_hours=30,
+                                  memory_max_entries=0)
+        self.refreshed = []
+
+    def refresh(self, key):
+        self.refreshed.append(key)
+        # Each refresh makes two API requests
+        metrics.API_REQUESTS.inc(2, status='200')
+        self.cache.set(key, {'word': 1})
+
+    def write(self, key, age_hours, reads):
+        with mock.patch('cache_manager.time.time', return_value=time.time() - age_hours * 3600):
+            self.cache.set(key, {'word': 1})
+        for _ in range(reads):
+            self.cache.get(key)
+
+    def test_window(self):
+        scheduler = PrewarmScheduler(self.cache, self.refresh, start_hour=23, end_hour=3)
+        self.assertEqual(scheduler.window_start(datetime(2024, 5, 2, 1, 30)), datetime(2024, 5, 1, 23))
+        self.assertEqual(scheduler.window_start(datetime(2024, 5, 1, 23, 0)), datetime(2024, 5, 1, 23))
+        self.assertIsNone(scheduler.window_start(datetime(2024, 5, 2, 3, 0)))
+        self.assertIsNone(scheduler.window_start(datetime(2024, 5, 2, 12, 0)))
+
+    def test_refreshes_popular_entries_within_budget(self):
+        self.write('Popular', age_hours=20, reads=5)
+        self.write('Also popular', age_hours=10, reads=3)
+        self.write('Fresh', age_hours=0, reads=10)
+        self.write('Rare', age_hours=20, reads=1)
+        self.write('Unread', age_hours=20, reads=0)
+        scheduler = PrewarmScheduler(self.cache, self.refresh, top_n=3, request_budget=2)
+
+        summary = scheduler.run_once()
+        # 'Fresh' outlives the next window, 'Rare' is not in the top 3
+        self.assertEqual(self.refreshed, ['Popular'])
+        self.assertEqual(summary, {'refreshed': 1, 'failed': 0, 'deferred': 1, 'requests': 2})
+        # Hits were halved
+        self.assertEqual([(key, hits) for key, _, hits in self.cache.index.popular(2)],
+                         [('Fresh', 5), ('Popular', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from singleflight import SingleFlight, fcntl
+from wiki_api import normalize_category
+
+
+class SingleFlightTests(unittest.TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir)
+
+    def run_concurrently(self, flight, count, fn, **kwargs):
+        results = [None] * count
+        errors = [None] * count
+
+        def call(index):
+            try:
+                results[index] = flight.do('Physics', fn, **kwargs)
+            except Exception as e:
+                errors[index] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_run(self):
+        calls = []
+
+        def crawl():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'frequencies': {'atom': 3}}
+
+        results, errors = self.run_concurrently(SingleFlight(self.lock_dir), 8, crawl)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 8)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_errors_reach_every_waiter(self):
+        def crawl():
+            time.sleep(0.1)
+            raise RuntimeError('upstream failed')
+
+        flight = SingleFlight(self.lock_dir)
+        _, errors = self.run_concurrently(flight, 4, crawl)
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+        self.assertEqual(flight.in_flight(), 0)
+
+    @unittest.skipIf(fcntl is None, 'file locks need fcntl')
+    def test_lock_file_coalesces_separate_groups(self):
+        # Two groups stand in for two worker processes sharing the lock directory
+        store = {}
+        calls = []
+
+        def crawl():
+            calls.append(1)
+            time.sleep(0.1)
+            store['Physics'] = 'result'
+            return 'result'
+
+        first, second = SingleFlight(self.lock_dir), SingleFlight(self.lock_dir)
+        results = []
+        threads = [
+            threading.Thread(target=lambda group=group: results.append(
+                group.do('Physics', crawl, recheck=lambda: store.get('Physics'))))
+            for group in (first, second)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result', 'result'])
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    @unittest.skipIf(fcntl is None, 'file locks need fcntl')
+    def test_removed_lock_files_still_exclude(self):
+        active, overlaps = [], []
+
+        def crawl():
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.001)
+            active.pop()
+            return 'result'
+
+        def run(group):
+            for _ in range(25):
+                group.do('Physics', crawl)
+
+        threads = [threading.Thread(target=run, args=(SingleFlight(self.lock_dir),)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(overlaps), 150)
+        self.assertEqual(max(overlaps), 1)
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+
+class NormalizeCategoryTests(unittest.TestCase):
+    def test_spellings_map_to_one_key(self):
+        for spelling in ('large language models', ' Large_language  models ',
+                         'Category:Large language models', 'category: large_language_models'):
+            self.assertEqual(normalize_category(spelling), 'Large language models')
+
+
+if __name__ == '__main__':
+    unittest.main()
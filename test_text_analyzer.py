@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import unittest
+from collections import Counter
+from unittest import mock
+import nltk
+from nltk.tokenize.destructive import NLTKWordTokenizer
+import text_analyzer
+import parallel_analyzer
+from parallel_analyzer import iter_text_frequencies
+
+REFERENCE_CORPUS = """\
+Albert Einstein (14 March 1879 – 18 April 1955) was a German-born theoretical physicist \
+who is widely held to be one of the greatest scientists of all time. His mass–energy \
+equivalence formula E = mc2 has been called "the world's most famous equation".
+In 1880, the family moved to Munich's borough of Ludwigsvorstadt-Isarvorstadt; there \
+Einstein's father founded Elektrotechnische Fabrik J. Einstein & Cie, a company.
+Einstein didn't like the school's regimen — he said it was "rote learning"; he couldn't \
+stand it... Later, he wrote: 'I can't believe it'. They're sure he'd've left anyway.
+Large language models (LLMs) such as GPT-3.5 and BERT: encoder-only; T5: encoder–decoder. \
+The players' union said, "We cannot accept this," and the U.S. government agreed.
+Résumé: naïve café owners in São Paulo sold crème brûlée at 3,50 € each; prices rose \
+10% in 2020/21. See also: [[List of physicists]] {{cite}} <ref>note</ref>.
+Q&A sessions @ conferences #1: what's gonna happen? Wanna know! Gotta go -- now.
+“Quoted text” and ‘single quotes’ appear in documents’ titles. Rock'n'roll and the '90s.
+'Tis the season, 'twas said; d'ye want more'n that?
+"""
+
+# NLTK's alphabetic tokens of REFERENCE_CORPUS, so the comparison runs without NLTK data
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reference_corpus_tokens.json'),
+          encoding='utf-8') as f:
+    REFERENCE_TOKENS = json.load(f)
+
+
+def nltk_available(resource):
+    try:
+        nltk.data.find(resource)
+        return True
+    except LookupError:
+        return False
+
+
+class FastAnalyzerTests(unittest.TestCase):
+    def test_matches_nltk_tokenizer_sentence_by_sentence(self):
+        # Sentences are split by hand so this runs without the Punkt model
+        tokenizer = NLTKWordTokenizer()
+        for line in REFERENCE_CORPUS.lower().splitlines():
+            sentences = line.replace('. ', '.\n').replace('? ', '?\n').replace('! ', '!\n')
+            for sentence in sentences.splitlines():
+                expected = [token for token in tokenizer.tokenize(sentence) if token.isalpha()]
+                # "j." is an initial, which Punkt keeps inside the sentence
+                if sentence.endswith('fabrik j.'):
+                    expected.remove('j')
+                self.assertEqual(list(text_analyzer.fast_tokenize(sentence)), expected, sentence)
+
+    def test_matches_recorded_nltk_tokens_on_reference_corpus(self):
+        self.assertEqual(REFERENCE_TOKENS['corpus_sha1'],
+                         hashlib.sha1(REFERENCE_CORPUS.encode('utf-8')).hexdigest(),
+                         'REFERENCE_CORPUS changed; re-record reference_corpus_tokens.json')
+        tokens = REFERENCE_TOKENS['tokens']
+        self.assertEqual(list(text_analyzer.fast_tokenize(REFERENCE_CORPUS)), tokens)
+        self.assertEqual(text_analyzer.analyze_text(REFERENCE_CORPUS, analyzer='fast'),
+                         Counter(token for token in tokens if token not in text_analyzer.STOP_WORDS))
+
+    @unittest.skipUnless(nltk_available('tokenizers/punkt') and nltk_available('corpora/stopwords'),
+                         'NLTK punkt and stopwords data not installed')
+    def test_matches_nltk_analyzer_on_reference_corpus(self):
+        tokens = [token for token in nltk.word_tokenize(REFERENCE_CORPUS.lower()) if token.isalpha()]
+        self.assertEqual(tokens, REFERENCE_TOKENS['tokens'])
+        self.assertEqual(text_analyzer.analyze_text(REFERENCE_CORPUS, analyzer='fast'),
+                         text_analyzer.analyze_text(REFERENCE_CORPUS, analyzer='nltk'))
+
+    @unittest.skipUnless(nltk_available('corpora/stopwords'), 'NLTK stopwords data not installed')
+    def test_bundled_stopwords_match_nltk(self):
+        self.assertEqual(text_analyzer.STOP_WORDS, text_analyzer._nltk_stop_words())
+
+    def test_counts_words_without_stopwords(self):
+        frequencies = text_analyzer.analyze_text("The cat and the hat. The cat's hat!", analyzer='fast')
+        self.assertEqual(frequencies, Counter({'cat': 2, 'hat': 2}))
+
+    def test_unknown_analyzer(self):
+        with self.assertRaises(ValueError):
+            text_analyzer.analyze_text('text', analyzer='spacy')
+
+    def test_fingerprint_changes_with_the_configuration(self):
+        fingerprint = text_analyzer.analyzer_fingerprint('fast')
+        self.assertTrue(fingerprint.startswith('fast-'))
+        self.addCleanup(text_analyzer._analyzer_fingerprint.cache_clear)
+        text_analyzer._analyzer_fingerprint.cache_clear()
+        with mock.patch.object(text_analyzer, 'STOP_WORDS', text_analyzer.STOP_WORDS | {'cat'}):
+            self.assertNotEqual(text_analyzer.analyzer_fingerprint('fast'), fingerprint)
+
+
+class NltkReadinessTests(unittest.TestCase):
+    def setUp(self):
+        text_analyzer._prepare_analyzer.cache_clear()
+        self.addCleanup(text_analyzer._prepare_analyzer.cache_clear)
+
+    def test_fast_analyzer_does_not_import_nltk(self):
+        code = "import sys, app; sys.exit('nltk' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env={**os.environ, 'TEXT_ANALYZER': 'fast'})
+        self.assertEqual(result.returncode, 0)
+
+    def test_readiness_is_checked_once(self):
+        with mock.patch.object(text_analyzer, 'download_nltk_data') as download:
+            text_analyzer.prepare_analyzer('nltk')
+            text_analyzer.prepare_analyzer('nltk')
+            text_analyzer.prepare_analyzer('fast')
+        self.assertEqual(download.call_count, 1)
+
+    def test_missing_resources_raise_when_downloads_are_disabled(self):
+        with mock.patch.object(nltk.data, 'find', side_effect=LookupError), \
+                mock.patch.object(nltk, 'download') as download:
+            with self.assertRaises(LookupError):
+                text_analyzer.download_nltk_data(download=False)
+        download.assert_not_called()
+
+    def test_unknown_analyzer_fails_the_check(self):
+        with self.assertRaises(ValueError):
+            text_analyzer.prepare_analyzer('spacy')
+
+
+class TextFrequencyTests(unittest.TestCase):
+    TEXTS = [f"{REFERENCE_CORPUS} page {i} mentions topic{i % 7}." for i in range(40)]
+
+    @classmethod
+    def tearDownClass(cls):
+        parallel_analyzer.shutdown()
+
+    def test_per_text_frequencies_through_process_pool(self):
+        results = dict(iter_text_frequencies(enumerate(self.TEXTS), 'fast',
+                                             parallel_threshold=len(REFERENCE_CORPUS) * 5,
+                                             workers=3, chunk_chars=len(REFERENCE_CORPUS) * 4))
+        self.assertEqual(sorted(results), list(range(len(self.TEXTS))))
+        for index, text in enumerate(self.TEXTS):
+            self.assertEqual(results[index], text_analyzer.analyze_text(text, analyzer='fast'))
+
+    def test_crawls_share_one_process_pool(self):
+        options = dict(parallel_threshold=len(REFERENCE_CORPUS), workers=2,
+                       chunk_chars=len(REFERENCE_CORPUS) * 4)
+        dict(iter_text_frequencies(enumerate(self.TEXTS), 'fast', **options))
+        pool = parallel_analyzer.get_pool(2)
+        dict(iter_text_frequencies(enumerate(self.TEXTS), 'fast', **options))
+        self.assertIs(parallel_analyzer.get_pool(2), pool)
+
+    def test_stays_inline_below_threshold(self):
+        with mock.patch.object(parallel_analyzer, 'get_pool') as get_pool:
+            results = dict(iter_text_frequencies(enumerate(self.TEXTS), 'fast',
+                                                 parallel_threshold=10 ** 9, workers=3))
+        get_pool.assert_not_called()
+        self.assertEqual(len(results), len(self.TEXTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
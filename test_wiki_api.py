@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import wiki_api
+from api_cache import ApiCache
+from fake_wiki_api import FakeWikiAPI, synthetic_dataset
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200, headers=None):
+        self._data = data
+        self.content = json.dumps(data).encode('utf-8')
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise wiki_api.requests.HTTPError(f"{self.status_code} error")
+
+
+def page_with_text(title, text, revid=7):
+    """Build a page object as `prop=revisions` with content returns it."""
+    return {'title': title, 'revisions': [{'revid': revid, 'slots': {'main': {'*': text}}}]}
+
+
+def texts_response(params):
+    """Build a revisions response that the API splits through rvcontinue every 25 pages."""
+    batch = params['titles'].split('|')
+    offset = int(params.get('rvcontinue', 0))
+    data = {'query': {'pages': {
+        str(i): page_with_text(title, f"text of [[{title}]]") if offset <= i < offset + 25 else {'title': title}
+        for i, title in enumerate(batch)
+    }}}
+    if offset + 25 < len(batch):
+        data['continue'] = {'rvcontinue': offset + 25, 'continue': '||'}
+    return FakeResponse(data)
+
+
+class WikiClientTests(unittest.TestCase):
+    def setUp(self):
+        self.client = wiki_api.WikiClient(api_url='http://wiki.test/w/api.php',
+                                          max_workers=4, requests_per_second=0,
+                                          backoff_factor=0)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_batches_titles_and_follows_continue(self):
+        titles = [f"Page {i}" for i in range(60)]
+        calls = []
+
+        def fake_get(url, params, **kwargs):
+            calls.append(dict(params))
+            return texts_response(params)
+
+        with mock.patch.object(self.client.session, 'get', side_effect=fake_get):
+            contents = self.client.get_pages_content(titles)
+
+        self.assertEqual(len(contents), 60)
+        self.assertEqual(contents['Page 59'], 'text of Page 59')
+        # Two queries, the first split in two by rvcontinue
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[0]['prop'], 'revisions')
+        self.assertEqual(max(len(call['titles'].split('|')) for call in calls), 50)
+
+    def test_missing_pages_and_normalized_titles(self):
+        data = {'query': {
+            'normalized': [{'from': 'foo bar', 'to': 'Foo bar'}],
+            'pages': {
+                '1': page_with_text('Foo bar', "'''Hello''' {{cite}}"),
+                '-1': {'title': 'Missing', 'missing': ''},
+            },
+        }}
+        with mock.patch.object(self.client.session, 'get', return_value=FakeResponse(data)):
+            contents = self.client.get_pages_content(['foo bar', 'Missing'])
+
+        self.assertEqual(contents, {'foo bar': 'Hello ', 'Missing': ''})
+
+    def test_fetch_revisions(self):
+        data = {'query': {
+            'normalized': [{'from': 'foo bar', 'to': 'Foo bar'}],
+            'pages': {
+                '1': {'title': 'Foo bar', 'lastrevid': 123},
+                '-1': {'title': 'Missing', 'missing': ''},
+            },
+        }}
+        with mock.patch.object(self.client.session, 'get', return_value=FakeResponse(data)) as get:
+            revisions = dict(self.client.iter_page_revisions(['foo bar', 'Missing']))
+
+        self.assertEqual(revisions, {'foo bar': 123, 'Missing': 0})
+        self.assertEqual(get.call_args.kwargs['params']['prop'], 'info')
+
+    def test_retries_throttled_and_server_errors(self):
+        responses = [
+            FakeResponse({}, status_code=429, headers={'Retry-After': '0'}),
+            FakeResponse({}, status_code=503),
+            FakeResponse({'query': {'pages': {'1': page_with_text('A', 'ok')}}}),
+        ]
+        with mock.patch.object(self.client.session, 'get', side_effect=responses) as get:
+            contents = self.client.get_pages_content(['A'])
+
+        self.assertEqual(contents, {'A': 'ok'})
+        self.assertEqual(get.call_count, 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.client.max_retries = 1
+        with mock.patch.object(self.client.session, 'get',
+                               return_value=FakeResponse({}, status_code=500)):
+            with self.assertRaises(wiki_api.requests.HTTPError):
+                self.client.get_pages_content(['A'])
+
+    def test_batches_are_fetched_concurrently(self):
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def slow_get(url, params, **kwargs):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight -= 1
+            return texts_response(params)
+
+        titles = [f"Page {i}" for i in range(8 * 20)]
+        with mock.patch.object(self.client.session, 'get', side_effect=slow_get):
+            with mock.patch.object(wiki_api, 'MAX_TITLES_PER_REQUEST', 20):
+                results = list(self.client.iter_pages_content(titles))
+
+        self.assertEqual(len(results), len(titles))
+        self.assertEqual(peak, 4)
+
+
+class FakeApiLimitsTests(unittest.TestCase):
+    def test_texts_come_in_one_query_but_full_extracts_one_at_a_time(self):
+        dataset = synthetic_dataset(categories=1, pages_per_category=40, words_per_page=20)
+        titles = list(dataset['pages'])[:40]
+        with FakeWikiAPI(dataset) as api:
+            client = wiki_api.WikiClient(api_url=api.url, requests_per_second=0)
+            self.addCleanup(client.close)
+            texts = client.get_pages_content(titles)
+            self.assertEqual(api.requests, 1)
+            self.assertEqual(texts[titles[0]], dataset['pages'][titles[0]]['extract'])
+
+            data = client.request({'action': 'query', 'prop': 'extracts', 'explaintext': '1',
+                                   'exlimit': '20', 'titles': '|'.join(titles[:3]), 'format': 'json'})
+            self.assertEqual(sum('extract' in page for page in data['query']['pages'].values()), 1)
+            self.assertIn('excontinue', data['continue'])
+            self.assertIn('lowered to 1', data['warnings']['extracts']['*'])
+
+
+class CategoryMembersTests(unittest.TestCase):
+    TREE = {
+        'Category:Root': [('A', 0), ('Category:Sub', 14), ('B', 0), ('Category:Other', 14)],
+        'Category:Sub': [('B', 0), ('C', 0), ('Category:Root', 14), ('Category:Deep', 14)],
+        'Category:Other': [('D', 0)],
+        'Category:Deep': [('E', 0)],
+    }
+
+    def setUp(self):
+        self.client = wiki_api.WikiClient(api_url='http://wiki.test/w/api.php',
+                                          requests_per_second=0)
+        self.requested = []
+
+    def tearDown(self):
+        self.client.close()
+
+    def fake_get(self, url, params, **kwargs):
+        """Serve TREE two members at a time through cmcontinue."""
+        self.requested.append(params['cmtitle'])
+        namespaces = params['cmnamespace'].split('|')
+        members = [(title, ns) for title, ns in self.TREE.get(params['cmtitle'], [])
+                   if str(ns) in namespaces]
+        offset = int(params.get('cmcontinue', 0))
+        data = {'query': {'categorymembers': [
+            {'title': title, 'ns': ns} for title, ns in members[offset:offset + 2]
+        ]}}
+        if offset + 2 < len(members):
+            data['continue'] = {'cmcontinue': str(offset + 2), 'continue': '-||'}
+        return FakeResponse(data)
+
+    def members(self, **kwargs):
+        with mock.patch.object(self.client.session, 'get', side_effect=self.fake_get):
+            return list(self.client.iter_category_members('Root', **kwargs))
+
+    def test_follows_cmcontinue(self):
+        self.assertEqual(self.members(max_depth=0), ['A', 'B'])
+
+    def test_walks_subcategories_breadth_first_once(self):
+        self.assertEqual(self.members(max_depth=1), ['A', 'B', 'C', 'D'])
+        self.requested.clear()
+        self.assertEqual(self.members(max_depth=2), ['A', 'B', 'C', 'D', 'E'])
+        # Root is listed again inside Sub but is only walked once (two result pages)
+        self.assertEqual(self.requested.count('Category:Root'), 2)
+
+    def test_stops_at_page_budget(self):
+        self.assertEqual(self.members(max_depth=2, max_pages=3), ['A', 'B', 'C'])
+        self.assertNotIn('Category:Deep', self.requested)
+
+
+class ApiCacheTests(unittest.TestCase):
+    URL = 'http://wiki.test/w/api.php'
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.cache = ApiCache(os.path.join(self.tmp_dir, 'api.sqlite3'), ttl_hours=1)
+        self.addCleanup(self.cache.close)
+        self.calls = []
+
+    def client(self, offline=False):
+        client = wiki_api.WikiClient(api_url=self.URL, requests_per_second=0, cache=self.cache,
+                                     offline=offline)
+        self.addCleanup(client.close)
+        return client
+
+    def fake_get(self, url, params, **kwargs):
+        self.calls.append(dict(params))
+        if params.get('list') == 'categorymembers':
+            return FakeResponse({'query': {'categorymembers': [{'title': 'A', 'ns': 0},
+                                                               {'title': 'B', 'ns': 0}]}})
+        if params['prop'] == 'info':
+            return FakeResponse({'query': {'pages': {
+                str(i): {'title': title, 'lastrevid': 7} for i, title in enumerate(params['titles'].split('|'))
+            }}})
+        return texts_response(params)
+
+    def test_payloads_are_reused_and_served_offline(self):
+        online = self.client()
+        with mock.patch.object(online.session, 'get', side_effect=self.fake_get):
+            self.assertEqual(online.get_category_members('Root'), ['A', 'B'])
+            revisions = dict(online.iter_page_revisions(['A', 'B']))
+            self.assertEqual(online.fetch_texts(['A', 'B'], revisions),
+                             {'A': 'text of A', 'B': 'text of B'})
+            self.assertEqual(len(self.calls), 3)
+
+            # Texts are found whatever the batch; revision ids are always fetched
+            self.assertEqual(online.get_category_members('Root'), ['A', 'B'])
+            self.assertEqual(online.fetch_texts(['B'], revisions), {'B': 'text of B'})
+            self.assertEqual(dict(online.iter_page_revisions(['A', 'B'])), revisions)
+            self.assertEqual(len(self.calls), 4)
+
+            # Listings are fetched again once past the TTL, texts of a revision are not
+            with mock.patch('api_cache.time.time', return_value=time.time() + 7200):
+                online.get_category_members('Root')
+                online.fetch_texts(['A'], revisions)
+            self.assertEqual(len(self.calls), 5)
+
+        offline = self.client(offline=True)
+        with mock.patch.object(offline.session, 'get', side_effect=AssertionError):
+            self.assertEqual(offline.get_category_members('Root'), ['A', 'B'])
+            self.assertEqual(dict(offline.iter_page_revisions(['A', 'B'])), revisions)
+            self.assertEqual(dict(offline.iter_pages_content(['A'], revisions)), {'A': 'text of A'})
+            with self.assertRaises(wiki_api.NotCachedError):
+                offline.get_category_members('Other')
+            with self.assertRaises(wiki_api.NotCachedError):
+                offline.fetch_texts(['C'])
+
+    def test_evicts_least_recently_used_payloads_over_the_cap(self):
+        self.cache.put(self.URL, {'page': 1}, {'text': os.urandom(2000).hex()})
+        self.cache.max_bytes = int(self.cache.stats()['bytes'] * 2.5)
+        self.cache.put(self.URL, {'page': 2}, {'text': os.urandom(2000).hex()})
+        self.assertIsNotNone(self.cache.get(self.URL, {'page': 1}))
+        self.cache.put(self.URL, {'page': 3}, {'text': os.urandom(2000).hex()})
+
+        self.assertIsNone(self.cache.get(self.URL, {'page': 2}))
+        self.assertIsNotNone(self.cache.get(self.URL, {'page': 1}))
+        self.assertIsNotNone(self.cache.get(self.URL, {'page': 3}))
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        self.assertLessEqual(self.cache.stats()['bytes'], self.cache.max_bytes)
+
+    def test_hits_are_written_in_batches_and_size_includes_other_processes(self):
+        self.cache.put(self.URL, {'page': 1}, {'text': 'one'})
+
+        def accessed_at():
+            return self.cache._conn.execute("SELECT accessed_at FROM responses").fetchone()[0]
+
+        before = accessed_at()
+        with mock.patch('api_cache.time.time', return_value=time.time() + 60):
+            self.assertIsNotNone(self.cache.get(self.URL, {'page': 1}))
+        self.assertEqual(accessed_at(), before)
+        self.cache.flush()
+        self.assertGreater(accessed_at(), before)
+
+        other = ApiCache(self.cache.path, ttl_hours=1)
+        self.addCleanup(other.close)
+        other.put(self.URL, {'page': 2}, {'text': os.urandom(2000).hex()})
+        self.cache.flush()
+        self.assertEqual(self.cache._size, self.cache.stats()['bytes'])
+
+
+class RateLimiterTests(unittest.TestCase):
+    def test_spaces_requests_after_burst(self):
+        limiter = wiki_api.RateLimiter(requests_per_second=50, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire('wiki.test')
+        self.assertGreaterEqual(time.monotonic() - start, 4 / 50 * 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from word_index import WordIndex
+
+
+class WordIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.index = WordIndex(os.path.join(self.tmp_dir, 'index.sqlite3'))
+        self.addCleanup(self.index.close)
+        self.index.add('Physics', {'the': 100, 'energy': 40, 'particle': 20, 'cell': 1})
+        self.index.add('Biology', {'the': 90, 'cell': 50, 'energy': 5})
+        self.index.add('Chemistry', {'the': 80, 'energy': 10, 'molecule': 30})
+
+    def test_tfidf_ignores_words_in_every_category(self):
+        words = self.index.distinctive_words('Physics', top_k=10)
+        self.assertEqual([word for word, _, _ in words], ['particle', 'cell'])
+        self.assertEqual(words[0][1], 20)
+
+    def test_loglik_ranks_over_represented_words(self):
+        words = self.index.distinctive_words('Physics', top_k=10, method='loglik')
+        ranked = [word for word, _, _ in words]
+        self.assertEqual(sorted(ranked[:2]), ['energy', 'particle'])
+        # Biology uses 'cell' far more, so it is not distinctive of Physics
+        self.assertNotIn('cell', ranked)
+        self.assertNotIn('the', ranked)
+
+    def test_top_categories_for_word(self):
+        self.assertEqual(self.index.top_categories('energy', limit=2),
+                         [('Physics', 40, round(40 / 161, 6)), ('Chemistry', 10, round(10 / 120, 6))])
+        self.assertEqual(self.index.top_categories('unknown'), [])
+
+    def test_reindexing_replaces_counts(self):
+        self.index.add('Physics', {'the': 10, 'quark': 5})
+        self.assertEqual(self.index.top_categories('energy'), [('Chemistry', 10, round(10 / 120, 6)),
+                                                               ('Biology', 5, round(5 / 145, 6))])
+        self.assertEqual([word for word, _, _ in self.index.distinctive_words('Physics')], ['quark'])
+        self.assertEqual(self.index.get_stats(), {'categories': 3, 'words': 5})
+
+    def test_new_analyzer_fingerprint_replaces_old_version(self):
+        self.index.add('Geology|analyzer=fast-1', {'rock': 7, 'the': 10})
+        self.index.add('Geology|depth=1|analyzer=fast-1', {'rock': 9})
+        self.index.add('Geology|analyzer=fast-2', {'rock': 5, 'the': 10})
+        self.assertEqual(self.index.top_categories('rock'),
+                         [('Geology|depth=1|analyzer=fast-1', 9, 1.0),
+                          ('Geology|analyzer=fast-2', 5, round(5 / 15, 6))])
+        self.assertEqual(self.index.get_stats()['categories'], 5)
+        self.assertEqual(self.index.top_categories('rock', limit=1, fingerprint='fast-2'),
+                         [('Geology|analyzer=fast-2', 5, round(5 / 15, 6))])
+
+    def test_remove_and_unknown_category(self):
+        self.assertTrue(self.index.remove('Biology'))
+        self.assertFalse(self.index.remove('Biology'))
+        self.assertIsNone(self.index.distinctive_words('Biology'))
+        self.assertEqual(self.index.top_categories('cell'), [('Physics', 1, round(1 / 161, 6))])
+        with self.assertRaises(ValueError):
+            self.index.distinctive_words('Physics', method='bm25')
+
+    def test_index_is_shared_across_connections(self):
+        other = WordIndex(self.index.path)
+        self.addCleanup(other.close)
+        self.assertEqual(len(other.distinctive_words('Physics')), 2)
+        other.add('Geology', {'rock': 7, 'energy': 1})
+        # The first connection picks up the new document frequencies
+        self.assertEqual(self.index.top_categories('rock'), [('Geology', 7, 0.875)])
+        # 'the' is no longer in every category, so it now has a score
+        self.assertIn('the', [word for word, _, _ in self.index.distinctive_words('Physics')])
+
+    def test_queries_are_fast(self):
+        vocabulary = [f"word{number}" for number in range(20000)]
+        for category in range(5):
+            self.index.add(f"Large {category}", {word: (number % 50) + category + 1
+                                                 for number, word in enumerate(vocabulary)})
+        self.index.distinctive_words('Large 0')
+        start = time.perf_counter()
+        self.index.distinctive_words('Large 0', method='loglik')
+        self.index.top_categories('word7')
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
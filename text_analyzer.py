@@ -0,0 +1,283 @@
+import hashlib
+import heapq
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Iterator, List, Mapping, Optional, Tuple
+
+from config import Config
+
+ANALYZERS = ('fast', 'nltk')
+
+# Bump whenever a tokenizer change alters the counts either analyzer produces
+ANALYZER_VERSION = 1
+
+# NLTK's English stopword list (nltk_data `corpora/stopwords/english`), bundled
+# so the fast analyzer needs neither the corpus download nor a per-call rebuild.
+STOP_WORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours
+yourself yourselves he him his himself she she's her hers herself it it's its
+itself they them their theirs themselves what which who whom this that that'll
+these those am is are was were be been being have has had having do does did
+doing a an the and but if or because as until while of at by for with about
+against between into through during before after above below to from up down
+in out on off over under again further then once here there when where why how
+all any both each few more most other some such no nor not only own same so
+than too very s t can will just don don't should should've now d ll m o re ve
+y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn
+hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't
+shan shan't shouldn shouldn't wasn wasn't weren weren't won won't wouldn
+wouldn't
+""".split())
+
+# Characters the NLTK word tokenizer always splits on (quotes, brackets and
+# symbols), runs of dots or dashes, and commas/colons not followed by a digit.
+# Whatever lies between them is a candidate token, which only counts if it is
+# purely alphabetic, so hyphens, apostrophes, digits and inner periods make a
+# candidate drop out exactly as they do after `word_tokenize`.
+_SEPARATORS = re.compile(r"[\s«»“”‘’„`\";@#$%&?!*()\[\]{}<>]+|\.{2,}|-{2,}|[:,](?!\d)")
+
+# Clitics the NLTK tokenizer splits off the end of a token.
+_CLITIC_SUFFIXES = ("n't", "'ll", "'re", "'ve", "'s", "'m", "'d", "'")
+
+# Resources the NLTK analyzer needs, as (nltk.data path, download name)
+NLTK_RESOURCES = (('tokenizers/punkt', 'punkt'), ('corpora/stopwords', 'stopwords'))
+
+# Whole words the NLTK tokenizer splits in two (MacIntyre contractions).
+_SPLIT_WORDS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
+
+# Contractions the NLTK tokenizer splits at the apostrophe, by their
+# alphabetic parts ("'tis" becomes "'t" and "is").
+_SPLIT_CONTRACTIONS = {
+    "'tis": ('is',),
+    "'twas": ('was',),
+    "d'ye": ('d',),
+    "more'n": ('more',),
+}
+
+
+@lru_cache(maxsize=None)
+def _nltk():
+    """Import NLTK on first use, so the fast analyzer never loads it."""
+    import nltk
+    # Bundled resources take precedence over the user and system locations
+    if Config.NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, Config.NLTK_DATA_DIR)
+    return nltk
+
+
+def download_nltk_data(download: Optional[bool] = None):
+    """Make sure the NLTK resources are installed.
+
+    Args:
+        download (bool, optional): Download missing resources, defaults to
+            Config.NLTK_DOWNLOAD. When false, a missing resource raises.
+
+    Raises:
+        LookupError: If a resource is missing and may not be downloaded
+    """
+    nltk = _nltk()
+    download = Config.NLTK_DOWNLOAD if download is None else download
+    for path, name in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            if not download:
+                raise LookupError(
+                    f"NLTK resource {name!r} is not installed and downloads are disabled; "
+                    f"bundle it with bundle_nltk_data()") from None
+            nltk.download(name, quiet=True)
+
+
+def bundle_nltk_data(directory: Optional[str] = None) -> str:
+    """Download the NLTK resources into a directory shipped with the app.
+
+    Point Config.NLTK_DATA_DIR at it and set NLTK_DOWNLOAD=false so workers
+    never download anything at runtime.
+
+    Args:
+        directory (str, optional): Target directory, defaults to Config.NLTK_DATA_DIR
+
+    Returns:
+        str: The directory the resources were written to
+    """
+    directory = directory or Config.NLTK_DATA_DIR
+    os.makedirs(directory, exist_ok=True)
+    nltk = _nltk()
+    for _, name in NLTK_RESOURCES:
+        if not nltk.download(name, download_dir=directory, quiet=True):
+            raise RuntimeError(f"Could not download NLTK resource {name!r}")
+    return directory
+
+
+@lru_cache(maxsize=None)
+def _nltk_stop_words():
+    _nltk()
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+def _split_candidate(candidate: str) -> Iterator[str]:
+    """Recover the alphabetic tokens NLTK would find in a non-alphabetic candidate."""
+    # A trailing period is split off at the end of a sentence, except after
+    # single-letter initials, which Punkt does not treat as sentence ends
+    if candidate.endswith('.') and not candidate.endswith('..'):
+        if len(candidate) == 2:
+            return
+        candidate = candidate[:-1]
+    for suffix in _CLITIC_SUFFIXES:
+        if candidate.endswith(suffix) and len(candidate) > len(suffix):
+            head = candidate[:-len(suffix)]
+            if not head.endswith("'"):
+                candidate = head
+            break
+    if candidate in _SPLIT_CONTRACTIONS:
+        yield from _SPLIT_CONTRACTIONS[candidate]
+        return
+    # An opening quote is only split off a single-letter word
+    if len(candidate) == 2 and candidate[0] == "'" and candidate[1] not in 'mtsdn':
+        candidate = candidate[1]
+    if candidate.isalpha():
+        yield from _SPLIT_WORDS.get(candidate, (candidate,))
+
+
+def fast_tokenize(text: str) -> Iterator[str]:
+    """Tokenize text into lowercase alphabetic words.
+
+    This reproduces `word_tokenize` followed by the `isalpha()` filter with a
+    single precompiled regex split. The one known difference is that
+    multi-letter abbreviations Punkt recognizes mid-sentence (e.g. "mr.")
+    keep their period under NLTK and are dropped there, while they are
+    counted here.
+
+    Args:
+        text (str): Text to tokenize
+
+    Yields:
+        str: Alphabetic lowercase tokens
+    """
+    for candidate in _SEPARATORS.split(text.lower()):
+        if candidate.isalpha():
+            if candidate in _SPLIT_WORDS:
+                yield from _SPLIT_WORDS[candidate]
+            else:
+                yield candidate
+        elif candidate:
+            yield from _split_candidate(candidate)
+
+
+def _analyze_fast(text: str) -> Counter:
+    # Count raw candidates first so each distinct one is classified only once
+    frequencies = Counter()
+    for candidate, count in Counter(_SEPARATORS.split(text.lower())).items():
+        if candidate.isalpha():
+            words = _SPLIT_WORDS.get(candidate, (candidate,))
+        elif candidate:
+            words = _split_candidate(candidate)
+        else:
+            continue
+        for word in words:
+            if word not in STOP_WORDS:
+                frequencies[word] += count
+    return frequencies
+
+
+def _analyze_nltk(text: str) -> Counter:
+    # Tokenize and convert to lowercase
+    tokens = _nltk().word_tokenize(text.lower())
+
+    # Remove stopwords and non-alphabetic tokens
+    stop_words = _nltk_stop_words()
+    words = [word for word in tokens if word.isalpha() and word not in stop_words]
+
+    # Count frequencies
+    return Counter(words)
+
+
+def analyze_text(text: str, analyzer: Optional[str] = None) -> Counter:
+    """Count the non-stopword words in a text.
+
+    Args:
+        text (str): Text to analyze
+        analyzer (str, optional): 'fast' or 'nltk', defaults to Config.TEXT_ANALYZER
+
+    Returns:
+        Counter: Word frequencies
+    """
+    analyzer = analyzer or Config.TEXT_ANALYZER
+    if analyzer == 'fast':
+        return _analyze_fast(text)
+    if analyzer == 'nltk':
+        return _analyze_nltk(text)
+    raise ValueError(f"Unknown analyzer {analyzer!r}, expected one of {ANALYZERS}")
+
+
+def prepare_analyzer(analyzer: Optional[str] = None) -> None:
+    """Make sure the resources an analyzer needs are available.
+
+    The check runs once per process and analyzer; later calls return
+    immediately. A failed check is retried on the next call.
+
+    Args:
+        analyzer (str, optional): 'fast' or 'nltk', defaults to Config.TEXT_ANALYZER
+    """
+    _prepare_analyzer(analyzer or Config.TEXT_ANALYZER)
+
+
+@lru_cache(maxsize=None)
+def _prepare_analyzer(analyzer: str) -> None:
+    if analyzer not in ANALYZERS:
+        raise ValueError(f"Unknown analyzer {analyzer!r}, expected one of {ANALYZERS}")
+    if analyzer == 'nltk':
+        download_nltk_data()
+
+
+def analyzer_fingerprint(analyzer: Optional[str] = None) -> str:
+    """Identify the configuration of an analyzer, for keying the counts it produces.
+
+    The fingerprint covers the analyzer, its stopword list and
+    ANALYZER_VERSION, so stored counts and analyses are never reused after
+    any of them changes. Config.MIN_WORD_LENGTH is not part of it, since it
+    filters results as they are served rather than the counts.
+
+    Args:
+        analyzer (str, optional): 'fast' or 'nltk', defaults to Config.TEXT_ANALYZER
+
+    Returns:
+        str: The analyzer name and a digest of its configuration, like 'fast-1c9e4a07'
+    """
+    return _analyzer_fingerprint(analyzer or Config.TEXT_ANALYZER)
+
+
+@lru_cache(maxsize=None)
+def _analyzer_fingerprint(analyzer: str) -> str:
+    prepare_analyzer(analyzer)
+    stop_words = STOP_WORDS if analyzer == 'fast' else _nltk_stop_words()
+    digest = hashlib.sha1(f"{ANALYZER_VERSION}\n{' '.join(sorted(stop_words))}".encode('utf-8'))
+    return f"{analyzer}-{digest.hexdigest()[:8]}"
+
+
+def select_top_words(frequencies: Mapping[str, int], top_k: int, min_count: int = 1,
+                     min_length: int = 1) -> List[Tuple[str, int]]:
+    """Select the most frequent words without sorting the whole vocabulary.
+
+    Args:
+        frequencies (Mapping[str, int]): Word frequencies
+        top_k (int): Number of words to return
+        min_count (int): Ignore words seen fewer times than this
+        min_length (int): Ignore words shorter than this
+
+    Returns:
+        list: Up to `top_k` (word, count) pairs, most frequent first
+    """
+    candidates = ((word, count) for word, count in frequencies.items()
+                  if count >= min_count and len(word) >= min_length)
+    return heapq.nlargest(top_k, candidates, key=lambda item: item[1])
@@ -0,0 +1,504 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from api_cache import ApiCache
+from config import Config
+from wikitext import strip_wikitext
+
+# MediaWiki accepts at most 50 titles per query for non-bot clients.
+MAX_TITLES_PER_REQUEST = 50
+
+# Page text is fetched as wikitext through `prop=revisions`, which returns the
+# current revision of every title in a query. TextExtracts would return only
+# one whole-article extract per request (several only with `exintro`), so a
+# batch of titles would cost one `excontinue` round-trip per page.
+TEXT_PARAMS = {"prop": "revisions", "rvprop": "ids|content", "rvslots": "main"}
+
+# Responses worth retrying: throttling and transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class NotCachedError(LookupError):
+    """A request was needed whose payload is not cached, and the client is offline."""
+
+
+def normalize_category(category: str) -> str:
+    """Normalize a category name the way MediaWiki does for titles.
+
+    Surrounding whitespace and a `Category:` prefix are dropped, underscores
+    and runs of whitespace become single spaces, and the first letter is
+    upper-cased, so every spelling of a category maps to one name.
+
+    Args:
+        category (str): Category name as entered by a user
+
+    Returns:
+        str: Canonical category name without the `Category:` prefix
+    """
+    name = re.sub(r'[\s_]+', ' ', category).strip()
+    if name[:9].lower() == 'category:':
+        name = name[9:].lstrip()
+    return name[:1].upper() + name[1:]
+
+
+def _batched(titles: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Group titles into lists of `size`, dropping duplicates as they stream by."""
+    seen = set()
+    batch = []
+    for title in titles:
+        if title in seen:
+            continue
+        seen.add(title)
+        batch.append(title)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        """Initialize a token bucket rate limiter with one bucket per host.
+
+        Args:
+            requests_per_second (float): Sustained request rate, 0 disables limiting
+            burst (int): Number of requests allowed back to back
+        """
+        self.rate = requests_per_second
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> None:
+        """Block until a request to `host` is allowed.
+
+        Args:
+            host (str): Host the request is sent to
+        """
+        if self.rate <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+
+        # A negative balance is a reservation: wait until it has been paid off
+        if tokens < 0:
+            time.sleep(-tokens / self.rate)
+
+
+class WikiClient:
+    def __init__(self, api_url: Optional[str] = None, max_workers: Optional[int] = None,
+                 requests_per_second: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None, timeout: Optional[float] = None,
+                 cache: Optional[ApiCache] = None, offline: Optional[bool] = None):
+        """Initialize a Wikipedia API client.
+
+        The client keeps one pooled HTTP session and one bounded thread pool,
+        so it should be created once and shared.
+
+        With a cache, category listings and page texts are served from it
+        while fresh, and a text fetched for a known revision is reused for
+        as long as it is stored. Revision ids are always fetched, so changed
+        pages are noticed, but stored too. Offline, every request is answered
+        from the cache whatever its age, and nothing is sent to the network.
+
+        Args:
+            api_url (str, optional): MediaWiki API endpoint
+            max_workers (int, optional): Maximum number of concurrent requests
+            requests_per_second (float, optional): Per-host request rate limit
+            max_retries (int, optional): Retries for 429 and 5xx responses
+            backoff_factor (float, optional): Base delay in seconds between retries
+            timeout (float, optional): Timeout in seconds for a single request
+            cache (ApiCache, optional): Store of raw API payloads
+            offline (bool, optional): Never use the network, Config.WIKI_OFFLINE by default
+        """
+        self.api_url = api_url or Config.WIKI_API_URL
+        self.max_workers = max_workers or Config.WIKI_FETCH_WORKERS
+        self.max_retries = Config.WIKI_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = Config.WIKI_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.timeout = timeout or Config.WIKI_TIMEOUT
+        self.cache = cache
+        self.offline = Config.WIKI_OFFLINE if offline is None else offline
+        self.rate_limiter = RateLimiter(
+            Config.WIKI_REQUESTS_PER_SECOND if requests_per_second is None else requests_per_second,
+            burst=self.max_workers
+        )
+        self.session = self._create_session()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='wiki-fetch')
+
+    def _create_session(self) -> requests.Session:
+        """Create an HTTP session with a connection pool sized to the worker count."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['User-Agent'] = Config.WIKI_USER_AGENT
+        return session
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Get the delay before retry number `attempt`, honoring Retry-After."""
+        delay = self.backoff_factor * (2 ** attempt)
+        delay += random.uniform(0, delay / 10)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a single API request from the cache or the network.
+
+        Page texts are cached per page by `fetch_texts`, every other
+        response as a whole.
+
+        Args:
+            params (dict): Query string parameters
+
+        Returns:
+            dict: Decoded JSON response
+
+        Raises:
+            NotCachedError: If the client is offline and the response is not cached
+        """
+        if self.cache is not None and (self.offline or 'list' in params):
+            data = self.cache.get(self.api_url, params, fresh=not self.offline)
+            metrics.API_CACHE_LOOKUPS.inc(result='miss' if data is None else 'hit')
+            if data is not None:
+                return data
+        if self.offline:
+            raise NotCachedError(f"No cached response for {params}, and the client is offline")
+
+        data = self._send(params)
+        if self.cache is not None and params.get('prop') != TEXT_PARAMS['prop']:
+            self.cache.put(self.api_url, params, data)
+        return data
+
+    def _send(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a single API request, retrying throttled and failed responses."""
+        host = urlparse(self.api_url).netloc
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(host)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.API_REQUESTS.inc(status='error')
+                if attempt >= self.max_retries:
+                    raise
+                metrics.API_RETRIES.inc(reason='connection')
+                response = None
+            else:
+                metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - started)
+                metrics.API_REQUESTS.inc(status=response.status_code)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    metrics.API_RESPONSE_BYTES.inc(len(response.content))
+                    return response.json()
+                metrics.API_RETRIES.inc(reason=response.status_code)
+
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def query(self, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Send a query and follow its `continue` tokens.
+
+        Args:
+            params (dict): Query string parameters for the first request
+
+        Yields:
+            dict: Each decoded response in turn
+        """
+        request_params = params
+        while True:
+            data = self.request(request_params)
+            yield data
+            if 'continue' not in data:
+                return
+            request_params = {**params, **data['continue']}
+
+    def iter_category_members(self, category: str, max_depth: Optional[int] = None,
+                              max_pages: Optional[int] = None) -> Iterator[str]:
+        """Yield the articles in a category, following pagination and subcategories.
+
+        Subcategories (namespace 14) are walked breadth-first up to `max_depth`
+        levels below `category`. Every article and subcategory is visited at
+        most once, and titles are yielded as each page of results arrives so
+        callers can start fetching before enumeration has finished.
+
+        Args:
+            category (str): Category name without the `Category:` prefix
+            max_depth (int, optional): Subcategory levels to descend, 0 for none
+            max_pages (int, optional): Stop after this many articles
+
+        Yields:
+            str: Article titles
+        """
+        max_depth = Config.CATEGORY_DEPTH if max_depth is None else max_depth
+        max_pages = Config.CATEGORY_MAX_PAGES if max_pages is None else max_pages
+
+        root = f"Category:{category}"
+        queue = deque([(root, 0)])
+        visited_categories = {root}
+        visited_pages = set()
+
+        while queue:
+            cmtitle, depth = queue.popleft()
+            params = {
+                "action": "query",
+                "list": "categorymembers",
+                "cmtitle": cmtitle,
+                "cmnamespace": "0|14" if depth < max_depth else "0",
+                "cmprop": "title",
+                "cmlimit": str(Config.WIKI_API_LIMIT),
+                "format": "json"
+            }
+            for data in self.query(params):
+                for member in data.get('query', {}).get('categorymembers', []):
+                    title = member['title']
+                    if member['ns'] == 14:
+                        if title not in visited_categories:
+                            visited_categories.add(title)
+                            queue.append((title, depth + 1))
+                    elif member['ns'] == 0 and title not in visited_pages:
+                        visited_pages.add(title)
+                        yield title
+                        if max_pages and len(visited_pages) >= max_pages:
+                            return
+
+    def get_category_members(self, category: str) -> List[str]:
+        """Get the titles of the articles directly in a category.
+
+        Args:
+            category (str): Category name without the `Category:` prefix
+
+        Returns:
+            list: Article titles
+        """
+        return list(self.iter_category_members(category, max_depth=0))
+
+    def fetch_texts(self, titles: List[str], revisions: Optional[Dict[str, int]] = None
+                    ) -> Dict[str, str]:
+        """Fetch the plain text of up to `MAX_TITLES_PER_REQUEST` pages.
+
+        The current wikitext of every page comes back in one query (large
+        batches are split by the API through `rvcontinue`, which is followed)
+        and is reduced to plain text with `strip_wikitext`. With a cache,
+        pages are looked up and stored one by one, so a page is found however
+        the titles were batched.
+
+        Args:
+            titles (list): Page titles to fetch
+            revisions (dict, optional): Current revision id of some of the titles;
+                a cached text of that revision is used whatever its age
+
+        Returns:
+            dict: Mapping of each requested title to its text ('' if missing)
+        """
+        revisions = revisions or {}
+        texts = {title: '' for title in titles}
+        missing = titles
+        if self.cache is not None:
+            missing = []
+            for title in titles:
+                page = self.cache.get(self.api_url, _text_key(title, revisions.get(title)),
+                                      fresh=not (self.offline or revisions.get(title)))
+                metrics.API_CACHE_LOOKUPS.inc(result='miss' if page is None else 'hit')
+                if page is None:
+                    missing.append(title)
+                else:
+                    texts[title] = _page_text(page)
+            if not missing:
+                return texts
+
+        for title, page in self._query_pages(missing, TEXT_PARAMS):
+            # Pages cut off by `rvcontinue` come back without revisions until their turn
+            if 'revisions' not in page and 'missing' not in page and 'invalid' not in page:
+                continue
+            texts[title] = _page_text(page)
+            if self.cache is not None:
+                revid = page['revisions'][0].get('revid') if 'revisions' in page else None
+                self.cache.put(self.api_url, _text_key(title, revid or revisions.get(title)), page)
+        return texts
+
+    def fetch_revisions(self, titles: List[str]) -> Dict[str, int]:
+        """Fetch the current revision ids of up to `MAX_TITLES_PER_REQUEST` pages.
+
+        Only page info is requested, which is far cheaper than the page texts,
+        so callers can tell which pages changed before downloading them.
+
+        Args:
+            titles (list): Page titles to look up
+
+        Returns:
+            dict: Mapping of each requested title to its `lastrevid` (0 if missing)
+        """
+        revisions = {title: 0 for title in titles}
+        for title, page in self._query_pages(titles, {"prop": "info"}):
+            if 'lastrevid' in page:
+                revisions[title] = page['lastrevid']
+        return revisions
+
+    def _query_pages(self, titles: List[str], params: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Run a `prop` query for a batch of titles, following `continue` tokens.
+
+        Args:
+            titles (list): Page titles to query
+            params (dict): Query parameters besides action, titles and format
+
+        Yields:
+            tuple: (requested title, page object) pairs
+        """
+        base_params = {
+            "action": "query",
+            **params,
+            "titles": "|".join(titles),
+            "format": "json"
+        }
+
+        for data in self.query(base_params):
+            query = data.get('query', {})
+
+            # Map normalized titles back to the titles we were asked for
+            requested = {item['to']: item['from'] for item in query.get('normalized', [])}
+            for page in query.get('pages', {}).values():
+                yield requested.get(page['title'], page['title']), page
+
+    def iter_pages_content(self, titles: Iterable[str], revisions: Optional[Dict[str, int]] = None
+                           ) -> Iterator[Tuple[str, str]]:
+        """Fetch page texts concurrently and yield them as soon as they arrive.
+
+        Titles are consumed lazily and grouped into batched queries that run on
+        the client's thread pool, so callers can process early pages while
+        later batches are still downloading. At most twice `max_workers`
+        batches are in flight at once.
+
+        Args:
+            titles (Iterable[str]): Page titles to fetch
+            revisions (dict, optional): Current revision ids, see `fetch_texts`;
+                read as batches are sent, so it may be filled while titles stream in
+
+        Yields:
+            tuple: (title, text) pairs in completion order
+        """
+        return self._iter_batches(lambda batch: self.fetch_texts(batch, revisions), titles)
+
+    def iter_page_revisions(self, titles: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Fetch revision ids concurrently, like `iter_pages_content`.
+
+        Args:
+            titles (Iterable[str]): Page titles to look up
+
+        Yields:
+            tuple: (title, lastrevid) pairs in completion order
+        """
+        return self._iter_batches(self.fetch_revisions, titles)
+
+    def _iter_batches(self, fetch, titles: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """Run `fetch` over batches of titles on the thread pool, yielding results as they complete."""
+        pending = set()
+        max_pending = self.max_workers * 2
+        try:
+            for batch in _batched(titles, MAX_TITLES_PER_REQUEST):
+                pending.add(self._executor.submit(fetch, batch))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                else:
+                    done = {future for future in pending if future.done()}
+                    pending -= done
+                for future in done:
+                    yield from future.result().items()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result().items()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def get_pages_content(self, titles: Iterable[str]) -> Dict[str, str]:
+        """Fetch the text of many pages concurrently.
+
+        Args:
+            titles (Iterable[str]): Page titles to fetch
+
+        Returns:
+            dict: Mapping of each requested title to its text ('' if missing)
+        """
+        return dict(self.iter_pages_content(titles))
+
+    def close(self) -> None:
+        """Shut down the thread pool and close pooled connections."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+def _text_key(title: str, revid: Optional[int] = None) -> Dict[str, Any]:
+    """Get the parameters one page's text is cached under, pinned to a revision if known."""
+    params = {"action": "query", **TEXT_PARAMS, "titles": title, "format": "json"}
+    if revid:
+        params["revids"] = revid
+    return params
+
+
+def _page_text(page: Dict[str, Any]) -> str:
+    """Get the plain text of a page object from a `prop=revisions` query."""
+    if not page.get('revisions'):
+        return ''
+    main = page['revisions'][0].get('slots', {}).get('main', {})
+    return strip_wikitext(main.get('*', ''))
+
+
+_client: Optional[WikiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> WikiClient:
+    """Get the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = (ApiCache(Config.API_CACHE_PATH, Config.API_CACHE_TTL_HOURS, Config.API_CACHE_MAX_BYTES)
+                     if Config.API_CACHE_PATH else None)
+            _client = WikiClient(cache=cache)
+        return _client
+
+
+def get_category_members(category):
+    return get_client().get_category_members(category)
+
+
+def iter_category_members(category: str, max_depth: Optional[int] = None,
+                          max_pages: Optional[int] = None) -> Iterator[str]:
+    return get_client().iter_category_members(category, max_depth, max_pages)
+
+
+def get_pages_content(titles: Iterable[str]) -> Dict[str, str]:
+    return get_client().get_pages_content(titles)
+
+
+def iter_pages_content(titles: Iterable[str], revisions: Optional[Dict[str, int]] = None
+                       ) -> Iterator[Tuple[str, str]]:
+    return get_client().iter_pages_content(titles, revisions)
+
+
+def iter_page_revisions(titles: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    return get_client().iter_page_revisions(titles)
+
+
+def get_page_content(title):
+    return get_client().fetch_texts([title])[title]
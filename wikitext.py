@@ -0,0 +1,66 @@
+"""Reduce MediaWiki wikitext to the plain text that is analyzed.
+
+Live crawls and dump ingestion both count words in wikitext reduced by
+`strip_wikitext`, so a page counts the same whichever way it arrived.
+"""
+import html
+import re
+
+# Wikitext constructs that carry no prose, removed outright
+_COMMENTS = re.compile(r'<!--.*?-->', re.S)
+_REFS = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>', re.S | re.I)
+_BLOCK_TAGS = re.compile(r'<(math|chem|gallery|timeline|syntaxhighlight|source|pre|score|graph)\b'
+                         r'[^>]*>.*?</\1>', re.S | re.I)
+_TEMPLATES = re.compile(r'\{\{[^{}]*\}\}')
+_TABLES = re.compile(r'\{\|[^{}]*?\|\}', re.S)
+_LINKS = re.compile(r'\[\[([^\[\]]*)\]\]')
+_EXTERNAL_LINKS = re.compile(r'\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]')
+_TAGS = re.compile(r'<[^>]+>')
+_EMPHASIS = re.compile(r"'{2,}")
+_HEADINGS = re.compile(r'^=+\s*(.*?)\s*=+\s*$', re.M)
+_LIST_MARKERS = re.compile(r'^[*#:;]+\s*', re.M)
+# Link targets that render as something other than their label
+_HIDDEN_LINK = re.compile(r'^\s*(file|image|media|category|[a-z]{2,3}(-[a-z]+)?)\s*:', re.I)
+
+
+def _repeat(pattern: re.Pattern, replacement, text: str) -> str:
+    """Apply a substitution until nothing changes, unwrapping nested constructs."""
+    while True:
+        text, count = pattern.subn(replacement, text)
+        if not count:
+            return text
+
+
+def _link_label(match: re.Match) -> str:
+    target, _, label = match.group(1).partition('|')
+    if target.startswith(':'):
+        return label or target[1:]
+    if _HIDDEN_LINK.match(target):
+        return ''
+    return label or target
+
+
+def strip_wikitext(text: str) -> str:
+    """Reduce wikitext to roughly the plain text the TextExtracts API returns.
+
+    Templates, tables, references, comments, files and category links are
+    dropped; links and external links keep their labels.
+
+    Args:
+        text (str): Page source
+
+    Returns:
+        str: Plain text
+    """
+    text = _COMMENTS.sub('', text)
+    text = _REFS.sub('', text)
+    text = _BLOCK_TAGS.sub('', text)
+    text = _repeat(_TEMPLATES, '', text)
+    text = _repeat(_TABLES, '', text)
+    text = _repeat(_LINKS, _link_label, text)
+    text = _EXTERNAL_LINKS.sub(r'\1', text)
+    text = _TAGS.sub('', text)
+    text = _EMPHASIS.sub('', text)
+    text = _HEADINGS.sub(r'\1', text)
+    text = _LIST_MARKERS.sub('', text)
+    return html.unescape(text)
@@ -0,0 +1,284 @@
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Mapping, Optional, Tuple
+
+METHODS = ('tfidf', 'loglik')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vocabulary (
+    id INTEGER PRIMARY KEY,
+    word TEXT NOT NULL UNIQUE,
+    df INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    total INTEGER NOT NULL,
+    word_ids BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    word_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (word_id, category_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_count ON postings (word_id, count DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('generation', 0);
+"""
+
+# Stay well below SQLite's bound parameter limit
+_CHUNK = 500
+# Cache keys end in this and the analyzer fingerprint (see category_cache_key)
+_ANALYZER_SEPARATOR = '|analyzer='
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(data: bytes) -> array:
+    values = array('I', data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class WordIndex:
+    def __init__(self, path: str):
+        """Open the cross-category word index.
+
+        Words get integer ids. Each category is stored as a sparse count
+        vector (parallel uint32 arrays of word ids and counts), and the
+        vocabulary keeps each word's document frequency and corpus total,
+        so distinctive-word and per-word queries read a single row or index
+        range instead of any cache file.
+
+        Args:
+            path (str): SQLite database file, created if missing
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+        self._word_ids: Dict[str, int] = {}
+        # (generation, df by word id, total by word id, categories, corpus total)
+        self._stats: Optional[Tuple[int, array, array, int, int]] = None
+
+    def _generation(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _ids_for(self, words: List[str]) -> Dict[str, int]:
+        """Get ids for words, adding unknown ones to the vocabulary; the lock must be held."""
+        missing = [word for word in words if word not in self._word_ids]
+        if missing:
+            self._conn.executemany("INSERT OR IGNORE INTO vocabulary (word) VALUES (?)",
+                                   ((word,) for word in missing))
+            for start in range(0, len(missing), _CHUNK):
+                chunk = missing[start:start + _CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT word, id FROM vocabulary WHERE word IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                self._word_ids.update(rows)
+        return {word: self._word_ids[word] for word in words}
+
+    def _remove_locked(self, key: str) -> bool:
+        row = self._conn.execute("SELECT id, word_ids, counts FROM categories WHERE key = ?",
+                                 (key,)).fetchone()
+        if row is None:
+            return False
+        category_id, word_ids, counts = row
+        self._conn.executemany(
+            "UPDATE vocabulary SET df = df - 1, total = total - ? WHERE id = ?",
+            zip(_from_bytes(counts), _from_bytes(word_ids)))
+        self._conn.execute("DELETE FROM postings WHERE category_id = ?", (category_id,))
+        self._conn.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+        return True
+
+    def _superseded_keys(self, key: str) -> List[str]:
+        """Get the indexed keys of the same analysis under other analyzer fingerprints."""
+        base, separator, _ = key.rpartition(_ANALYZER_SEPARATOR)
+        if not separator:
+            return []
+        prefix = base + separator
+        rows = self._conn.execute("SELECT key FROM categories WHERE substr(key, 1, ?) = ? AND key != ?",
+                                  (len(prefix), prefix, key))
+        return [row[0] for row in rows]
+
+    def add(self, key: str, frequencies: Mapping[str, int]) -> None:
+        """Index a category's word frequencies, replacing an earlier version.
+
+        Versions counted under another analyzer fingerprint are replaced too,
+        so a category is never counted twice in the corpus statistics.
+
+        Args:
+            key (str): Category (cache) key
+            frequencies (Mapping[str, int]): Word counts
+        """
+        with self._lock, self._conn:
+            for old_key in [key] + self._superseded_keys(key):
+                self._remove_locked(old_key)
+            ids = self._ids_for(list(frequencies))
+            pairs = sorted((ids[word], count) for word, count in frequencies.items() if count > 0)
+            word_ids = array('I', (word_id for word_id, _ in pairs))
+            counts = array('I', (count for _, count in pairs))
+            cursor = self._conn.execute(
+                "INSERT INTO categories (key, total, word_ids, counts, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, sum(counts), _to_bytes(word_ids), _to_bytes(counts), time.time()))
+            category_id = cursor.lastrowid
+            self._conn.executemany(
+                "UPDATE vocabulary SET df = df + 1, total = total + ? WHERE id = ?",
+                ((count, word_id) for word_id, count in pairs))
+            self._conn.executemany(
+                "INSERT INTO postings (word_id, category_id, count) VALUES (?, ?, ?)",
+                ((word_id, category_id, count) for word_id, count in pairs))
+            self._conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+
+    def remove(self, key: str) -> bool:
+        """Drop a category from the index.
+
+        Returns:
+            bool: True if the category was indexed
+        """
+        with self._lock, self._conn:
+            removed = self._remove_locked(key)
+            if removed:
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            return removed
+
+    def _corpus_stats(self) -> Tuple[array, array, int, int]:
+        """Get document frequencies and totals by word id, reloaded only after changes."""
+        generation = self._generation()
+        if self._stats is None or self._stats[0] != generation:
+            size = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM vocabulary").fetchone()[0] + 1
+            df = array('I', bytes(4 * size))
+            totals = array('Q', bytes(8 * size))
+            for word_id, word_df, word_total in self._conn.execute(
+                    "SELECT id, df, total FROM vocabulary"):
+                df[word_id] = word_df
+                totals[word_id] = word_total
+            categories, corpus_total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total), 0) FROM categories").fetchone()
+            self._stats = (generation, df, totals, categories, corpus_total)
+        return self._stats[1:]
+
+    def distinctive_words(self, key: str, top_k: int = 50, method: str = 'tfidf',
+                          min_count: int = 1) -> Optional[List[Tuple[str, int, float]]]:
+        """Rank the words that set a category apart from the other indexed ones.
+
+        'tfidf' scores count * log(N / df), so words found in every category
+        score zero. 'loglik' is Dunning's log-likelihood (G2) of the word's
+        count in the category against the rest of the corpus, keeping only
+        over-represented words.
+
+        Args:
+            key (str): Category (cache) key
+            top_k (int): Number of words to return
+            method (str): 'tfidf' or 'loglik'
+            min_count (int): Ignore words seen fewer times in the category
+
+        Returns:
+            Optional[list]: (word, count, score) triples, highest score first,
+            or None if the category is not indexed
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+        with self._lock:
+            row = self._conn.execute("SELECT total, word_ids, counts FROM categories WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            df, totals, categories, corpus_total = self._corpus_stats()
+
+        category_total, word_ids, counts = row[0], _from_bytes(row[1]), _from_bytes(row[2])
+        scored = []
+        if method == 'tfidf':
+            for word_id, count in zip(word_ids, counts):
+                if count >= min_count:
+                    score = count * math.log(categories / df[word_id])
+                    if score > 0:
+                        scored.append((score, word_id, count))
+        else:
+            rest_total = corpus_total - category_total
+            for word_id, count in zip(word_ids, counts):
+                if count < min_count:
+                    continue
+                rest = totals[word_id] - count
+                if rest_total and rest / rest_total >= count / category_total:
+                    continue
+                expected = category_total * totals[word_id] / corpus_total
+                score = count * math.log(count / expected)
+                if rest:
+                    score += rest * math.log(rest / (rest_total * totals[word_id] / corpus_total))
+                scored.append((2 * score, word_id, count))
+
+        scored.sort(reverse=True)
+        top = scored[:top_k]
+        words = self._words_for([word_id for _, word_id, _ in top])
+        return [(words[word_id], count, round(score, 4)) for score, word_id, count in top]
+
+    def _words_for(self, word_ids: List[int]) -> Dict[int, str]:
+        if not word_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, word FROM vocabulary WHERE id IN ({','.join('?' * len(word_ids))})",
+                word_ids)
+            return dict(rows)
+
+    def top_categories(self, word: str, limit: int = 10,
+                       fingerprint: Optional[str] = None) -> List[Tuple[str, int, float]]:
+        """Find the categories that use a word most.
+
+        Args:
+            word (str): Word to look up
+            limit (int): Number of categories to return
+            fingerprint (str, optional): Only count keys analyzed under this analyzer fingerprint
+
+        Returns:
+            list: (category key, count, share of the category's words) triples, highest count first
+        """
+        where, params = "v.word = ?", [word]
+        if fingerprint:
+            suffix = _ANALYZER_SEPARATOR + fingerprint
+            where += " AND substr(c.key, ?) = ?"
+            params += [-len(suffix), suffix]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.key, p.count, c.total FROM postings AS p "
+                "JOIN vocabulary AS v ON v.id = p.word_id "
+                "JOIN categories AS c ON c.id = p.category_id "
+                f"WHERE {where} ORDER BY p.count DESC LIMIT ?",
+                params + [limit]).fetchall()
+        return [(key, count, round(count / total, 6)) for key, count, total in rows]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of indexed categories and vocabulary words."""
+        with self._lock:
+            categories = self._conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+            words = self._conn.execute("SELECT COUNT(*) FROM vocabulary WHERE df > 0").fetchone()[0]
+        return {'categories': categories, 'words': words}
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()